@@ -1,82 +1,134 @@
+import os
 import numpy as np
 import pandas as pd
 
-from tqdm import tqdm # for progress bar
-from AEB_SIM_LOOP import run_aeb_simulation  # Import the AEB simulation function
+from sweep import run_sweep, configs_from_samples, to_kph  # Process pool sweep runner
+from result_cache import ResultCache  # Persistent simulation result cache
+from screening import OUTCOMES, CERTAIN_COLLISION  # Pre-simulation screening outcomes of LHS_filter
 
 
 # check sim result to see if the simulator is working as expected
 
+# number of worker processes for the sanity check simulations (None = all cores)
+sim_workers = None
+# reuse results of scenarios simulated before (result_cache.cache_path), rerunning the sanity check costs nothing
+use_result_cache = True
+# filtered-out scenarios per run_sweep call, results are appended to the output file block by block
+sanity_block_size = 10000
+results_path = 'filtered_out_simulation_results.csv'
+
+
+def filtered_out_samples(df_initial, df_filtered):
+    """
+    Rows of the initial sample set that are not in the filtered set, in their original order.
+
+    Sample files of LHS_filter carry a scenario_id, the complement is then an id lookup (linear time, exact
+    provenance, duplicate parameter rows stay separate scenarios). Older files without ids fall back to
+    matching the parameter values.
+    """
+    if 'scenario_id' in df_initial and 'scenario_id' in df_filtered:
+        return df_initial[~df_initial['scenario_id'].isin(df_filtered['scenario_id'].to_numpy())]
+    merged = df_initial.merge(df_filtered[df_initial.columns].drop_duplicates(), how='left', indicator=True)
+    return df_initial[(merged['_merge'] == 'left_only').to_numpy()]
+
+
+def dropped_by(df_filtered_out, screened_path='lhs_screened_samples.csv'):
+    """Which step dropped each filtered-out sample: the pre-simulation screening outcome, or 'filters'"""
+    dropped = pd.Series('filters', index=df_filtered_out.index)
+    if 'scenario_id' in df_filtered_out and os.path.exists(screened_path):
+        df_screened = pd.read_csv(screened_path)
+        if 'scenario_id' in df_screened:
+            outcome = df_filtered_out['scenario_id'].map(df_screened.set_index('scenario_id')['screening'])
+            dropped = outcome.fillna(dropped)
+    return dropped
+
+
+def simulate_block(df_block, cache):
+    """Simulate a block of filtered-out samples (AEB only loop) on a process pool, results in sample order"""
+    configs = configs_from_samples(df_block)
+    results = run_sweep(configs, sim_module='AEB_SIM_LOOP', workers=sim_workers,
+                        desc="Simulating filtered-out scenarios", cache=cache)
+
+    failed = np.array(['error' in result for result in results], dtype=bool)
+    for config, result in zip(configs, results):
+        if 'error' in result:
+            print(f"Simulation failed for {config}: {result['error']}")
+    ok = [result for result in results if 'error' not in result]
+    df_block = df_block[~failed]
+    df_results = pd.DataFrame({
+        'ego_start_x': df_block['ego_start_x'].round(2),
+        'ego_speed': df_block['ego_start_speed'].round(2),
+        'target_start_x': df_block['target_start_x'].round(2),
+        'target_speed': df_block['target_start_speed'].round(2),
+        'target_decel': df_block['target_decel'].round(2),
+        'target_decel_trigger': df_block['target_decel_trigger'].round(2),
+        'collision_occurred': [result['collision_occurred'] for result in ok],
+        'impact_speed': [round(to_kph(result['impact_speed']), 2) for result in ok],
+        'aeb_triggered': [result['aeb_triggered'] for result in ok],
+        'dropped_by': df_block['dropped_by'],
+    })
+    if 'scenario_id' in df_block:
+        df_results.insert(0, 'scenario_id', df_block['scenario_id'])
+    return df_results
+
 
 ### STEP 4: Sanity Check. ###
 # check the filters by simulating the configs that were filtered out and see if there are any collisions.
-# Load the initial and filtered sample sets
-df_filtered_samples = pd.read_csv('lhs_filtered_samples.csv')
-df_initial_samples = pd.read_csv('lhs_initial_samples.csv')
-
-
-filtered_set = set(map(tuple, df_filtered_samples.values))
-initial_set = set(map(tuple, df_initial_samples.values))
-
-# Get scenarios that were filtered out using set difference
-filtered_out_set = initial_set - filtered_set
-
-# Convert back to DataFrame with original column names
-filtered_out_scenarios = pd.DataFrame(list(filtered_out_set), columns=df_initial_samples.columns)
-
-# Save filtered-out scenarios
-filtered_out_scenarios.to_csv('lhs_filtered_out_samples.csv', index=False)
-
-print(f"\nSanity Check:")
-print(f"Initial scenarios: {len(initial_set)}")
-print(f"Filtered scenarios: {len(filtered_set)}")
-print(f"Filtered-out scenarios: {len(filtered_out_set)}")
-
-# Simulate filtered-out scenarios
-filtered_out_results = []
-for index, row in tqdm(filtered_out_scenarios.iterrows(), total=len(filtered_out_scenarios), desc="Simulating filtered-out scenarios"):
-    config = {
-        'ego_start_x': row['ego_start_x'],
-        'ego_speed': row['ego_start_speed'] / 3.6,  # Convert from kph to m/s
-        'target_start_x': row['target_start_x'],
-        'target_speed': row['target_start_speed'] / 3.6,  # Convert from kph to m/s
-        'target_decel': row['target_decel'],
-        'target_decel_trigger': row['target_decel_trigger']
-    }
-
-    result = run_aeb_simulation(config)
-    
-    simulation_result = {
-        'ego_start_x': round(config['ego_start_x'], 2),
-        'ego_speed': round(config['ego_speed'] * 3.6, 2),
-        'target_start_x': round(config['target_start_x'], 2),
-        'target_speed': round(config['target_speed'] * 3.6, 2),
-        'target_decel': round(config['target_decel'], 2),
-        'target_decel_trigger': round(config['target_decel_trigger'], 2),
-        'collision_occurred': result['collision_occurred'],
-        'impact_speed': round(result['impact_speed'], 2),
-        'aeb_triggered': result['aeb_triggered']
-    }
-    filtered_out_results.append(simulation_result)
-
-# Convert results to DataFrame and save
-df_filtered_out_results = pd.DataFrame(filtered_out_results)
-df_filtered_out_results.to_csv('filtered_out_simulation_results.csv', index=False)
-
-# Count collisions in filtered-out scenarios
-num_collisions_filtered_out = df_filtered_out_results['collision_occurred'].sum()
-total_filtered_out = len(df_filtered_out_results)
-
-print("\nSanity Check Results:")
-print(f"Number of collisions in filtered-out scenarios: {num_collisions_filtered_out} out of {total_filtered_out}")
-if num_collisions_filtered_out > 0:
-    print("WARNING: Some filtered-out scenarios resulted in collisions! Filters may need adjustment.")
-else:
-    print("Sanity check passed: No collisions in filtered-out scenarios.")
-
-# After running simulations
-aeb_triggers = df_filtered_out_results['aeb_triggered'].sum()
-total_scenarios = len(df_filtered_out_results)
-
-print(f"\nAEB Statistics:")
-print(f"AEB triggered in {aeb_triggers} out of {total_scenarios} scenarios ({(aeb_triggers/total_scenarios)*100:.1f}%)")
\ No newline at end of file
+def main():
+    # Load the initial and filtered sample sets
+    df_filtered_samples = pd.read_csv('lhs_filtered_samples.csv')
+    df_initial_samples = pd.read_csv('lhs_initial_samples.csv')
+
+    # Get scenarios that were filtered out (by the filters or the pre-simulation screening)
+    filtered_out_scenarios = filtered_out_samples(df_initial_samples, df_filtered_samples)
+    filtered_out_scenarios = filtered_out_scenarios.assign(dropped_by=dropped_by(filtered_out_scenarios))
+
+    # Save filtered-out scenarios
+    filtered_out_scenarios.to_csv('lhs_filtered_out_samples.csv', index=False)
+
+    print(f"\nSanity Check:")
+    print(f"Initial scenarios: {len(df_initial_samples)}")
+    print(f"Filtered scenarios: {len(df_filtered_samples)}")
+    print(f"Filtered-out scenarios: {len(filtered_out_scenarios)} {filtered_out_scenarios['dropped_by'].value_counts().to_dict()}")
+    if filtered_out_scenarios.empty:
+        print("Nothing to check: no scenarios were filtered out.")
+        return
+
+    # Simulate filtered-out scenarios block by block, the results are appended to results_path as they come in
+    cache = ResultCache() if use_result_cache else None
+    counts = pd.DataFrame(0, index=pd.Index([], name='dropped_by'), columns=['scenarios', 'collisions', 'aeb_triggers'])
+    for start in range(0, len(filtered_out_scenarios), sanity_block_size):
+        df_block = simulate_block(filtered_out_scenarios.iloc[start:start + sanity_block_size], cache)
+        df_block.to_csv(results_path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+        block_counts = df_block.groupby('dropped_by').agg(scenarios=('collision_occurred', 'size'),
+                                                          collisions=('collision_occurred', 'sum'),
+                                                          aeb_triggers=('aeb_triggered', 'sum'))
+        counts = counts.add(block_counts, fill_value=0).astype(int)
+    if cache is not None:
+        print(f"Result cache: {cache.hits} hits, {cache.misses} misses, {len(cache)} results cached")
+        cache.close()
+
+    # Count collisions in filtered-out scenarios
+    num_collisions_filtered_out = counts['collisions'].sum()
+    total_filtered_out = counts['scenarios'].sum()
+
+    print("\nSanity Check Results:")
+    print(f"Number of collisions in filtered-out scenarios: {num_collisions_filtered_out} out of {total_filtered_out}")
+    print(counts.to_string())
+    # the screening drops unavoidable collisions on purpose, only collisions in the other groups are unexpected
+    unexpected = counts.drop(index=OUTCOMES[CERTAIN_COLLISION], errors='ignore')['collisions'].sum()
+    if unexpected > 0:
+        print("WARNING: Some filtered-out scenarios resulted in collisions! Filters may need adjustment.")
+    else:
+        print("Sanity check passed: No collisions in filtered-out scenarios.")
+
+    # After running simulations
+    aeb_triggers = counts['aeb_triggers'].sum()
+    total_scenarios = total_filtered_out
+
+    print(f"\nAEB Statistics:")
+    print(f"AEB triggered in {aeb_triggers} out of {total_scenarios} scenarios ({(aeb_triggers/total_scenarios)*100:.1f}%)")
+
+
+if __name__ == '__main__':
+    main()
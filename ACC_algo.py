@@ -1,4 +1,5 @@
 import numpy as np
+from controller_params import ControllerParams
 
 # ACC Constants
 DESIRED_TIME_GAP = 1.8         # Time gap to maintain (seconds)
@@ -7,29 +8,45 @@ MAX_DECEL = -3.0               # Maximum deceleration allowed (m/s²)
 MIN_FOLLOWING_DISTANCE = 2.0   # Minimum safe distance (meters)
 DETECTION_RANGE = 100          # Maximum distance to detect and follow a lead vehicle (meters)
 
+
+class ACCParams(ControllerParams):
+    """ACC calibration, the module constants by default (entries may be per-scenario arrays, like AEBParams)"""
+    FIELDS = ('desired_time_gap', 'max_accel', 'max_decel', 'min_following_distance', 'detection_range')
+
+    def __init__(self, desired_time_gap=DESIRED_TIME_GAP, max_accel=MAX_ACCEL, max_decel=MAX_DECEL,
+                 min_following_distance=MIN_FOLLOWING_DISTANCE, detection_range=DETECTION_RANGE):
+        self.desired_time_gap = desired_time_gap
+        self.max_accel = max_accel
+        self.max_decel = max_decel
+        self.min_following_distance = min_following_distance
+        self.detection_range = detection_range
+
+
 class ACCController:
-    def __init__(self):
+    def __init__(self, params=None):
         self.desired_cruise_speed = 30  # Default cruise speed in km/h
+        self.params = params if params is not None else ACCParams()
         
     def set_desired_cruise_speed(self, speed_kph):
         """Set the desired cruise speed in km/h"""
         self.desired_cruise_speed = speed_kph
         
-    def target_follow_control(self, ego_car, target_car):
+    def target_follow_control(self, ego_car, target_car, distance=None):
         """Calculate acceleration command to follow target vehicle"""
         # Calculate current distance and desired following distance
-        current_distance = ego_car.distanceTo(target_car)
-        desired_distance = ego_car.velocity.x * DESIRED_TIME_GAP + MIN_FOLLOWING_DISTANCE
+        p = self.params
+        current_distance = ego_car.distanceTo(target_car) if distance is None else distance
+        desired_distance = ego_car.velocity.x * p.desired_time_gap + p.min_following_distance
 
         # Determine acceleration based on distance error
         distance_error = current_distance - desired_distance
-        acceleration = distance_error / DESIRED_TIME_GAP
+        acceleration = distance_error / p.desired_time_gap
         
         # Limit acceleration between max deceleration and acceleration
-        if acceleration < MAX_DECEL:
-            return MAX_DECEL
-        elif acceleration > MAX_ACCEL:
-            return MAX_ACCEL
+        if acceleration < p.max_decel:
+            return p.max_decel
+        elif acceleration > p.max_accel:
+            return p.max_accel
         return acceleration
     
     def cruise_control(self, ego_car):
@@ -38,19 +55,53 @@ class ACCController:
         target_speed_ms = self.desired_cruise_speed / 3.6
             
         # Determine acceleration based on speed error
+        p = self.params
         speed_error = target_speed_ms - ego_car.velocity.x
-        acceleration = speed_error / DESIRED_TIME_GAP
+        acceleration = speed_error / p.desired_time_gap
         
         # Limit acceleration to vehicle constraints
-        if acceleration < MAX_DECEL:
-            return MAX_DECEL
-        elif acceleration > MAX_ACCEL:
-            return MAX_ACCEL
+        if acceleration < p.max_decel:
+            return p.max_decel
+        elif acceleration > p.max_accel:
+            return p.max_accel
         return acceleration
     
-    def acc_control_loop(self, ego_car, target_car=None):
+    def acc_control_loop(self, ego_car, target_car=None, distance=None):
         """Main ACC control loop that switches between following and cruising"""
-        if target_car and ego_car.distanceTo(target_car) < DETECTION_RANGE:
-            return self.target_follow_control(ego_car, target_car)
+        if target_car and distance is None:
+            distance = ego_car.distanceTo(target_car)  # measured once, shared with target_follow_control
+        if target_car and distance < self.params.detection_range:
+            return self.target_follow_control(ego_car, target_car, distance)
         else:
-            return self.cruise_control(ego_car)
\ No newline at end of file
+            return self.cruise_control(ego_car)
+
+class BatchACCController:
+    """
+    ACCController for N scenarios at once: arrays of gap and ego speed in, array of acceleration commands out.
+    params is an ACCParams whose entries are single values or per-scenario arrays.
+    """
+    def __init__(self, cruise_speed_kph, params=None):
+        self.desired_cruise_speed = np.asarray(cruise_speed_kph, dtype=float)  # km/h, one per scenario
+        self.params = params if params is not None else ACCParams()
+
+    def target_follow_control(self, distance, ego_speed):
+        """Acceleration commands to follow the target vehicles"""
+        p = self.params
+        desired_distance = ego_speed * p.desired_time_gap + p.min_following_distance
+        return np.clip((distance - desired_distance) / p.desired_time_gap, p.max_decel, p.max_accel)
+
+    def cruise_control(self, ego_speed):
+        """Acceleration commands to hold the cruise speeds"""
+        p = self.params
+        target_speed_ms = self.desired_cruise_speed / 3.6
+        return np.clip((target_speed_ms - ego_speed) / p.desired_time_gap, p.max_decel, p.max_accel)
+
+    def acc_control_loop(self, distance, ego_speed):
+        """Follow the target inside the detection range, cruise otherwise"""
+        return np.where(distance < self.params.detection_range, self.target_follow_control(distance, ego_speed),
+                        self.cruise_control(ego_speed))
+
+    def take(self, index):
+        """Keep the scenarios selected by a boolean mask or index array"""
+        self.desired_cruise_speed = self.desired_cruise_speed[index]
+        self.params = self.params.take(index)
@@ -3,8 +3,8 @@ from world import World
 from agents import Car, Painting
 from geometry import Point
 import time
-from ACC_algo import ACCController, DETECTION_RANGE
-from AEB_algo import AEBController, SYSTEM_LATENCY
+from ACC_algo import ACCController
+from AEB_algo import AEBController
 import os
 
 ### Initialize simulation ###
@@ -104,7 +104,7 @@ for k in range(300):  # 30 seconds at 0.1s timestep
         final_command = acc_command
     
     # Apply control after latency
-    if k * dt >= aeb.command_time + SYSTEM_LATENCY:
+    if k * dt >= aeb.command_time + aeb.params.system_latency:
         ego_car.set_control(0, final_command)
     
     # Collect data
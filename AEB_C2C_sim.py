@@ -12,19 +12,11 @@ from world import World
 from agents import Car, RectangleBuilding, Pedestrian, Painting
 from geometry import Point
 import time
-from AEB_algo import (
-    AEBController, TARGET_FINAL_DISTANCE, 
-    FCW_TTC, SOFT_BRAKE_TTC, FULL_BRAKE_TTC,
-    MAX_SOFT_BRAKE, MAX_FULL_BRAKE, SYSTEM_LATENCY
-)
+from AEB_algo import AEBController
 from plots import create_aeb_plots
 import os
 import json  # Add to imports at top
-from ACC_algo import (
-    DESIRED_TIME_GAP, MAX_ACCEL, MAX_DECEL,
-    MIN_FOLLOWING_DISTANCE, DETECTION_RANGE,
-    ACCController
-)
+from ACC_algo import ACCController
 
 ### Initialize data collection lists for plotting
 dt = 0.1  # time steps in terms of seconds
@@ -131,7 +123,7 @@ for k in range(200):
         target_car.set_control(0, config['target_decel'])
     
     # Always get control info for data collection
-    control = aeb.calculate_control(ego_car, target_car, current_time)
+    control = aeb.calculate_control(ego_car, target_car, current_time, distance)
     
     # Calculate TTC for speed maintenance
     relative_speed = ego_car.velocity.x - target_car.velocity.x
@@ -139,7 +131,7 @@ for k in range(200):
     
 
     # Apply control after latency
-    if k * dt >= aeb.command_time + SYSTEM_LATENCY:
+    if k * dt >= aeb.command_time + aeb.params.system_latency:
         aeb.current_deceleration = aeb.commanded_deceleration
         ego_car.set_control(0, aeb.current_deceleration)
     
@@ -163,7 +155,7 @@ for k in range(200):
     w.visualizer.draw_text(status_text, (550, 30))  
     
     # Handle FCW warning display
-    if ttc <= FCW_TTC:
+    if ttc <= aeb.params.fcw_ttc:
         if not warning_visible:
             if warning_square:
                 warning_square.undraw()
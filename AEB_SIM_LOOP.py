@@ -3,33 +3,30 @@ from world import World
 from agents import Car, RectangleBuilding, Pedestrian, Painting
 from geometry import Point
 import time
-from AEB_algo import (
-    AEBController, TARGET_FINAL_DISTANCE, 
-    FCW_TTC, SOFT_BRAKE_TTC, FULL_BRAKE_TTC,
-    MAX_SOFT_BRAKE, MAX_FULL_BRAKE, SYSTEM_LATENCY
-)
-from plots import create_aeb_plots
+from termination import TerminationCriteria, adaptive_steps
+from trajectory import TrajectoryRecorder
+from AEB_algo import AEBController
 import os
 
 # Function to run AEB simulation
-def run_aeb_simulation(config):
+# early_termination: stop as soon as the outcome is settled (see termination.TerminationCriteria)
+# adaptive_dt: take up to max_dt_steps time steps at once while no event is near (approximate, see termination.adaptive_steps)
+# record: keep the per-step signals in a trajectory.TrajectoryRecorder, returned as result['trajectory']
+# aeb_params: AEB calibration (AEB_algo.AEBParams), the module constants by default
+def run_aeb_simulation(config, early_termination=False, adaptive_dt=False, max_dt_steps=10, record=False,
+                       aeb_params=None):
     dt = 0.1  # time steps in seconds
-    time_data, speed_data, distance_data = [], [], []
-    ttc_data, required_decel_data, applied_decel_data = [], [], []
-    target_speed_data = []
 
     # Initialize collision flags
     collision_occurred = False
     impact_speed = 0
 
     # Create AEB controller
-    aeb = AEBController()
+    aeb = AEBController(aeb_params)
+    criteria = TerminationCriteria()  # no ACC, the ego never accelerates
 
     # Set up simulation environment
-    w = World(dt, width=400, height=40, ppm=6)
-
-    # Configure road and visual elements (optional; can be removed if running headless)
-    # Road setup code here...
+    w = World(dt, width=400, height=40, ppm=6, headless=True)
 
     # Set up ego and target vehicles
     ego_car = Car(Point(config['ego_start_x'], 18.15), 0, 'blue')
@@ -44,7 +41,10 @@ def run_aeb_simulation(config):
     aeb_was_triggered = False
 
     # Simulation loop
-    for k in range(250):
+    num_steps = 250
+    k = 0
+    trajectory = TrajectoryRecorder(num_steps, enabled=record)
+    while k < num_steps:
         current_time = k * dt
         distance = ego_car.distanceTo(target_car)
 
@@ -52,11 +52,17 @@ def run_aeb_simulation(config):
         if distance <= config['target_decel_trigger']:
             target_car.set_control(0, config['target_decel'])
 
+        # Stop once the outcome can no longer change
+        if early_termination and criteria.check(distance, ego_car.velocity.x, target_car.velocity.x,
+                                                ego_car.inputAcceleration, target_car.inputAcceleration,
+                                                target_car.x >= ego_car.x):
+            break
+
         # Calculate control info
-        control = aeb.calculate_control(ego_car, target_car, current_time)
+        control = aeb.calculate_control(ego_car, target_car, current_time, distance)
         
         # Apply AEB control after latency
-        if k * dt >= aeb.command_time + SYSTEM_LATENCY:
+        if k * dt >= aeb.command_time + aeb.params.system_latency:
             aeb.current_deceleration = aeb.commanded_deceleration
             ego_car.set_control(0, aeb.current_deceleration)
         
@@ -64,8 +70,25 @@ def run_aeb_simulation(config):
         if aeb.current_deceleration < 0:
             aeb_was_triggered = True
 
+        # Collect data
+        if trajectory.enabled:
+            trajectory.record(time=current_time, distance=distance,
+                              speed=ego_car.velocity.x * 2.237,  # Convert to mph
+                              ttc=min(control['ttc'], 10),
+                              required_decel=control['required_decel'],
+                              applied_decel=aeb.current_deceleration,
+                              target_speed=target_car.velocity.x * 3.6)  # Convert m/s to kph
+
         # Tick the world
-        w.tick()
+        steps = 1
+        if adaptive_dt:
+            steps = adaptive_steps(distance, ego_car.velocity.x - target_car.velocity.x,
+                                   ego_car.inputAcceleration - target_car.inputAcceleration,
+                                   config['target_decel_trigger'],
+                                   latency_pending=current_time < aeb.command_time + aeb.params.system_latency,
+                                   max_steps=min(max_dt_steps, num_steps - k), dt=dt, fcw_ttc=aeb.params.fcw_ttc)
+        w.tick(steps * dt)
+        k += steps
 
         # Check for collision
         if w.collision_exists():
@@ -86,23 +109,27 @@ def run_aeb_simulation(config):
         'aeb_triggered': aeb_was_triggered,
         'speed_reduction': round(speed_reduction, 2)  # Add speed reduction to result
     }
+    if trajectory.enabled:
+        result['trajectory'] = trajectory
 
     return result
 
 
-# Example configuration
-config = {
-    "initial_gap": 100,
-    "ego_start_speed": 55,  # kph
-    "target_start_speed": 0,  # kph
-    "target_decel": 0,
-    "target_decel_trigger": 0  # Trigger distance
-}
+if __name__ == '__main__':
+    # Example configuration
+    config = {
+        "ego_start_x": 0,
+        "ego_start_speed": 55,  # kph
+        "target_start_x": 100,
+        "target_start_speed": 0,  # kph
+        "target_decel": 0,
+        "target_decel_trigger": 0  # Trigger distance
+    }
 
-# Convert speeds from kph to m/s
-config['ego_speed'] = config.pop('ego_start_speed') / 3.6
-config['target_speed'] = config.pop('target_start_speed') / 3.6
+    # Convert speeds from kph to m/s
+    config['ego_speed'] = config.pop('ego_start_speed') / 3.6
+    config['target_speed'] = config.pop('target_start_speed') / 3.6
 
-# Run simulation
-result = run_aeb_simulation(config)
-print(result)
\ No newline at end of file
+    # Run simulation
+    result = run_aeb_simulation(config)
+    print(result)
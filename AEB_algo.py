@@ -1,4 +1,5 @@
 import numpy as np
+from controller_params import ControllerParams
 
 # AEB constants
 FCW_TTC = 2.3        # Forward Collision Warning Time-to-Collision threshold (seconds)
@@ -9,8 +10,30 @@ MAX_FULL_BRAKE = -8.5  # Maximum emergency braking deceleration (m/s²)
 SYSTEM_LATENCY = 0.3     # System response delay (seconds)
 TARGET_FINAL_DISTANCE = 3.0  # Desired final distance between vehicles (meters)
 
+
+class AEBParams(ControllerParams):
+    """
+    AEB calibration, the module constants by default. In the batch controllers every entry may also be an array
+    with one value per scenario, e.g. to run several calibrations side by side (see controllers.py).
+    """
+    FIELDS = ('fcw_ttc', 'soft_brake_ttc', 'full_brake_ttc', 'max_soft_brake', 'max_full_brake',
+              'system_latency', 'target_final_distance')
+
+    def __init__(self, fcw_ttc=FCW_TTC, soft_brake_ttc=SOFT_BRAKE_TTC, full_brake_ttc=FULL_BRAKE_TTC,
+                 max_soft_brake=MAX_SOFT_BRAKE, max_full_brake=MAX_FULL_BRAKE, system_latency=SYSTEM_LATENCY,
+                 target_final_distance=TARGET_FINAL_DISTANCE):
+        self.fcw_ttc = fcw_ttc
+        self.soft_brake_ttc = soft_brake_ttc
+        self.full_brake_ttc = full_brake_ttc
+        self.max_soft_brake = max_soft_brake
+        self.max_full_brake = max_full_brake
+        self.system_latency = system_latency
+        self.target_final_distance = target_final_distance
+
+
 class AEBController:
-    def __init__(self):
+    def __init__(self, params=None):
+        self.params = params if params is not None else AEBParams()
         self.command_time = float('-inf')
         self.commanded_deceleration = 0
         self.current_deceleration = 0
@@ -18,23 +41,25 @@ class AEBController:
         self.soft_brake_activation = None
         self.hard_brake_activation = None
         
-    def calculate_control(self, ego_car, target_car, current_time):
-        # Calculate distances and speeds
-        distance = ego_car.distanceTo(target_car)
+    def calculate_control(self, ego_car, target_car, current_time, distance=None):
+        # Calculate distances and speeds (the caller may pass the distance it already computed for this step)
+        if distance is None:
+            distance = ego_car.distanceTo(target_car)
         relative_speed = ego_car.velocity.x - target_car.velocity.x
         ttc = distance / relative_speed if relative_speed > 0 else float('inf')
+        p = self.params
         
         # Calculate required deceleration
         required_decel = 0
-        if distance > TARGET_FINAL_DISTANCE and relative_speed > 0:
-            stopping_distance = distance - TARGET_FINAL_DISTANCE
+        if distance > p.target_final_distance and relative_speed > 0:
+            stopping_distance = distance - p.target_final_distance
             required_decel = -(relative_speed ** 2) / (2 * stopping_distance)
         
         # Determine AEB command based on TTC thresholds
-        if ttc <= FULL_BRAKE_TTC:
-            max_allowed_decel = MAX_FULL_BRAKE
-        elif ttc <= SOFT_BRAKE_TTC:
-            max_allowed_decel = MAX_SOFT_BRAKE
+        if ttc <= p.full_brake_ttc:
+            max_allowed_decel = p.max_full_brake
+        elif ttc <= p.soft_brake_ttc:
+            max_allowed_decel = p.max_soft_brake
         else:
             max_allowed_decel = 0
             
@@ -50,11 +75,11 @@ class AEBController:
             self.command_time = current_time
             
         # Check activation events
-        if ttc <= FCW_TTC and self.fcw_activation is None:
+        if ttc <= p.fcw_ttc and self.fcw_activation is None:
             self.fcw_activation = (current_time, distance)
-        if ttc <= SOFT_BRAKE_TTC and self.soft_brake_activation is None:
+        if ttc <= p.soft_brake_ttc and self.soft_brake_activation is None:
             self.soft_brake_activation = (current_time, distance)
-        if ttc <= FULL_BRAKE_TTC and self.hard_brake_activation is None:
+        if ttc <= p.full_brake_ttc and self.hard_brake_activation is None:
             self.hard_brake_activation = (current_time, distance)
             
         return {
@@ -64,3 +89,83 @@ class AEBController:
             'applied_decel': applied_decel,
             'speed_mph': ego_car.velocity.x * 2.237
         }
+
+
+class BatchAEBController:
+    """
+    AEBController for N scenarios at once: calculate_control takes arrays of gap, ego speed and target speed
+    and returns arrays, with the same stateful semantics per scenario (command_time and commanded_deceleration
+    change only when the applied deceleration changes, each activation is recorded once).
+
+    Activation events are kept as times and distances (nan until the event): fcw_time, fcw_distance,
+    soft_brake_time, soft_brake_distance, hard_brake_time, hard_brake_distance.
+    params is an AEBParams whose entries are single values or per-scenario arrays.
+    """
+    # Per-scenario state arrays, see get_state / set_state / take
+    STATE_KEYS = ('command_time', 'commanded_deceleration', 'current_deceleration',
+                  'fcw_time', 'fcw_distance', 'soft_brake_time', 'soft_brake_distance',
+                  'hard_brake_time', 'hard_brake_distance')
+    # (event, AEBParams entry of its TTC threshold) of the activation events
+    EVENTS = (('fcw', 'fcw_ttc'), ('soft_brake', 'soft_brake_ttc'), ('hard_brake', 'full_brake_ttc'))
+
+    def __init__(self, n, params=None):
+        self.params = params if params is not None else AEBParams()
+        self.command_time = np.full(n, -np.inf)
+        self.commanded_deceleration = np.zeros(n)
+        self.current_deceleration = np.zeros(n)
+        for event, _ in self.EVENTS:
+            setattr(self, f"{event}_time", np.full(n, np.nan))
+            setattr(self, f"{event}_distance", np.full(n, np.nan))
+
+    def commands(self, distance, relative_speed):
+        """TTC, required and applied deceleration (the formulas of AEBController.calculate_control, no state)"""
+        p = self.params
+        distance = np.asarray(distance, dtype=float)
+        closing = relative_speed > 0
+        ttc = np.divide(distance, relative_speed, out=np.full(distance.shape, np.inf), where=closing)
+
+        braking = closing & (distance > p.target_final_distance)
+        required_decel = np.divide(-(relative_speed ** 2), 2 * (distance - p.target_final_distance),
+                                   out=np.zeros(distance.shape), where=braking)
+
+        max_allowed_decel = np.where(ttc <= p.full_brake_ttc, p.max_full_brake,
+                                     np.where(ttc <= p.soft_brake_ttc, p.max_soft_brake, 0.))
+        applied_decel = np.where(required_decel < 0, np.maximum(required_decel, max_allowed_decel), max_allowed_decel)
+        return ttc, required_decel, applied_decel
+
+    def calculate_control(self, distance, ego_speed, target_speed, current_time):
+        """
+        One control step for all scenarios (current_time: scalar or per-scenario array). Returns a dict of arrays:
+        ttc, required_decel, applied_decel and the masks fcw, soft_brake, hard_brake of the scenarios whose
+        activation event happened in this step.
+        """
+        ttc, required_decel, applied_decel = self.commands(distance, ego_speed - target_speed)
+
+        # Update brake command if changed
+        changed = applied_decel != self.commanded_deceleration
+        self.commanded_deceleration = np.where(changed, applied_decel, self.commanded_deceleration)
+        self.command_time = np.where(changed, current_time, self.command_time)
+
+        # Check activation events
+        control = {'ttc': ttc, 'required_decel': required_decel, 'applied_decel': applied_decel}
+        for event, threshold in self.EVENTS:
+            times = getattr(self, f"{event}_time")
+            activated = (ttc <= getattr(self.params, threshold)) & np.isnan(times)
+            if activated.any():
+                times[activated] = np.broadcast_to(current_time, ttc.shape)[activated]
+                getattr(self, f"{event}_distance")[activated] = distance[activated]
+            control[event] = activated
+        return control
+
+    def get_state(self):
+        return {key: getattr(self, key).copy() for key in self.STATE_KEYS}
+
+    def set_state(self, state):
+        for key in self.STATE_KEYS:
+            setattr(self, key, np.asarray(state[key], dtype=float).copy())
+
+    def take(self, index):
+        """Keep the scenarios selected by a boolean mask or index array (e.g. drop the finished ones)"""
+        self.params = self.params.take(index)
+        for key in self.STATE_KEYS:
+            setattr(self, key, getattr(self, key)[index])
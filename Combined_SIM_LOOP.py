@@ -1,59 +1,41 @@
 import numpy as np
-from world import World
-from agents import Car, RectangleBuilding, Pedestrian, Painting
+from agents import Car
+from scenes import scene_pool
 from geometry import Point
 import time
-from AEB_algo import (
-    AEBController, TARGET_FINAL_DISTANCE, 
-    FCW_TTC, SOFT_BRAKE_TTC, FULL_BRAKE_TTC,
-    MAX_SOFT_BRAKE, MAX_FULL_BRAKE, SYSTEM_LATENCY
-)
+from AEB_algo import AEBController
 from ACC_algo import ACCController
-from plots import create_aeb_plots
+from termination import TerminationCriteria, adaptive_steps
+from trajectory import TrajectoryRecorder
 import os
 
 
 
 # Function to run AEB simulation
-def run_aeb_simulation(config, visualize=True):
-    # Initialize data collection lists for plotting
+# early_termination: stop as soon as the outcome is settled (see termination.TerminationCriteria)
+# adaptive_dt: take up to max_dt_steps time steps at once while no event is near (approximate, see termination.adaptive_steps)
+# record: keep the per-step signals in a trajectory.TrajectoryRecorder, returned as result['trajectory'] (default: only when visualizing)
+# aeb_params, acc_params: controller calibration (AEB_algo.AEBParams, ACC_algo.ACCParams, e.g. of a controllers.ControllerVariant),
+#   the module constants by default
+def run_aeb_simulation(config, visualize=True, early_termination=False, adaptive_dt=False, max_dt_steps=10, record=None,
+                       aeb_params=None, acc_params=None):
     dt = 0.1  # time steps in seconds
-    time_data, speed_data, distance_data = [], [], []
-    ttc_data, required_decel_data, applied_decel_data = [], [], []
-    target_speed_data = []
 
     # Initialize collision flags
     collision_occurred = False
     impact_speed = 0
     
     # Create controllers
-    acc = ACCController()
+    acc = ACCController(acc_params)
     acc.set_desired_cruise_speed(config['ego_speed'] * 3.6)  # Convert m/s to kph
-    aeb = AEBController()
+    aeb = AEBController(aeb_params)
+    criteria = TerminationCriteria(acc.desired_cruise_speed / 3.6, aeb.params.system_latency,
+                                   acc.params.min_following_distance, acc.params.detection_range)
 
-    # Set up simulation environment
-    w = World(dt, width=400, height=40, ppm=6)
-    w.visualizer.window_title = os.path.basename(__file__)
-
-    # Road configuration plot
-    w.add(Painting(Point(60, 33.7), Point(800, 20), 'dark green'))  # Upper grass
-    w.add(Painting(Point(60, 6.3), Point(800, 20), 'dark green'))   # Lower grass
-    w.add(Painting(Point(60, 20), Point(800, 7.4), 'gray80'))  # Main road surface
-    w.add(Painting(Point(60, 23.7), Point(800, 0.3), 'white'))  # Upper road edge
-    w.add(Painting(Point(60, 16.3), Point(800, 0.3), 'white'))  # Lower road edge
-
-    for i in range(40):  # yellow dashed lane markings   
-        x_pos = 10 + (i * 12)  # 12m total spacing (3m dash + 9m gap)
-        w.add(Painting(Point(x_pos, 20), Point(2, 0.2), 'yellow'))  # 3m long dashes
-
-    # Add pedestrian crosswalk
-    crosswalk_x = 124
-    crosswalk_width = 2  # 2m wide crosswalk
-    crosswalk_stripes = 6  # Number of stripes
-
-    for i in range(crosswalk_stripes):
-        stripe_y = 17 + (i * 1.23)  # Evenly space stripes across road width (7.4m)
-        w.add(Painting(Point(crosswalk_x, stripe_y), Point(crosswalk_width, 0.5), 'white'))
+    # Set up simulation environment: the road layout comes from the scene pool (scenes.py), built once per process
+    w = scene_pool.acquire('straight_road', dt, width=400, height=40, ppm=6, headless=not visualize)
+    if visualize:
+        w.visualizer.window_title = os.path.basename(__file__)
 
     # Use ego and target start positions from config
     ego_start_x = config['ego_start_x']
@@ -76,7 +58,10 @@ def run_aeb_simulation(config, visualize=True):
     aeb_was_triggered = False
 
     # Simulation loop
-    for k in range(200):
+    num_steps = 200
+    k = 0
+    trajectory = TrajectoryRecorder(num_steps, enabled=visualize if record is None else record)
+    while k < num_steps:
         current_time = k * dt
         distance = ego_car.distanceTo(target_car)
 
@@ -84,9 +69,15 @@ def run_aeb_simulation(config, visualize=True):
         if distance <= config['target_decel_trigger']:
             target_car.set_control(0, config['target_decel'])
 
+        # Stop once the outcome can no longer change
+        if early_termination and criteria.check(distance, ego_car.velocity.x, target_car.velocity.x,
+                                                ego_car.inputAcceleration, target_car.inputAcceleration,
+                                                target_car.x >= ego_car.x):
+            break
+
         # Get ACC and AEB commands
-        acc_command = acc.acc_control_loop(ego_car, target_car)
-        aeb_command = aeb.calculate_control(ego_car, target_car, current_time)
+        acc_command = acc.acc_control_loop(ego_car, target_car, distance)
+        aeb_command = aeb.calculate_control(ego_car, target_car, current_time, distance)
         
         # Extract the deceleration value from AEB command dictionary
         aeb_decel = aeb_command['applied_decel']
@@ -101,17 +92,17 @@ def run_aeb_simulation(config, visualize=True):
             final_command = acc_command
 
         # Apply control after latency
-        if k * dt >= aeb.command_time + SYSTEM_LATENCY:
+        if k * dt >= aeb.command_time + aeb.params.system_latency:
             ego_car.set_control(0, final_command)
         
         # Collect data
-        time_data.append(current_time)
-        distance_data.append(distance)
-        speed_data.append(ego_car.velocity.x * 2.237)  # Convert to mph
-        ttc_data.append(min(aeb_command['ttc'], 10))
-        required_decel_data.append(aeb_command['required_decel'])
-        applied_decel_data.append(final_command)
-        target_speed_data.append(target_car.velocity.x * 3.6)  # Convert m/s to kph
+        if trajectory.enabled:
+            trajectory.record(time=current_time, distance=distance,
+                              speed=ego_car.velocity.x * 2.237,  # Convert to mph
+                              ttc=min(aeb_command['ttc'], 10),
+                              required_decel=aeb_command['required_decel'],
+                              applied_decel=final_command,
+                              target_speed=target_car.velocity.x * 3.6)  # Convert m/s to kph
 
         # Update visualization
         if visualize:
@@ -126,7 +117,7 @@ def run_aeb_simulation(config, visualize=True):
             w.visualizer.draw_text(status_text, (550, 30))
 
             # Handle FCW warning display
-            if aeb_command['ttc'] <= FCW_TTC:
+            if aeb_command['ttc'] <= aeb.params.fcw_ttc:
                 if not warning_visible:
                     if warning_square:
                         warning_square.undraw()
@@ -150,7 +141,17 @@ def run_aeb_simulation(config, visualize=True):
             time.sleep(dt/4)  # Slow down visualization
 
         # Tick the world
-        w.tick()
+        steps = 1
+        if adaptive_dt:
+            steps = adaptive_steps(distance, ego_car.velocity.x - target_car.velocity.x,
+                                   ego_car.inputAcceleration - target_car.inputAcceleration,
+                                   config['target_decel_trigger'],
+                                   latency_pending=current_time < aeb.command_time + aeb.params.system_latency,
+                                   acc_following=distance < acc.params.detection_range,
+                                   max_steps=min(max_dt_steps, num_steps - k), dt=dt,
+                                   fcw_ttc=aeb.params.fcw_ttc, detection_range=acc.params.detection_range)
+        w.tick(steps * dt)
+        k += steps
 
         # Check for collision
         if w.collision_exists():
@@ -158,12 +159,13 @@ def run_aeb_simulation(config, visualize=True):
             impact_speed = abs(ego_car.velocity.x - target_car.velocity.x) * 3.6  # Convert to kph
             break
 
-    w.close()
+    scene_pool.release(w)  # reset for the next run (closed when visualizing)
 
     # Create plots after simulation
-    if visualize:
-        create_aeb_plots(time_data, distance_data, speed_data, ttc_data, 
-                        required_decel_data, applied_decel_data, aeb, target_speed_data)
+    if visualize and trajectory.enabled:
+        from plots import create_aeb_plots  # matplotlib is only needed when plotting
+        create_aeb_plots(trajectory['time'], trajectory['distance'], trajectory['speed'], trajectory['ttc'],
+                        trajectory['required_decel'], trajectory['applied_decel'], aeb, trajectory['target_speed'])
 
     # Return result in dictionary format
     initial_speed = config['ego_speed'] * 3.6  # Convert to kph
@@ -176,6 +178,8 @@ def run_aeb_simulation(config, visualize=True):
         'aeb_triggered': aeb_was_triggered,
         'speed_reduction': f"{round(speed_reduction, 2)} kph"
     }
+    if trajectory.enabled:
+        result['trajectory'] = trajectory
 
     return result
 
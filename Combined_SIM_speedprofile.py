@@ -1,60 +1,35 @@
 import numpy as np
-from world import World
-from agents import Car, RectangleBuilding, Pedestrian, Painting
+from agents import Car
+from scenes import scene_pool
 from geometry import Point
 import time
-from AEB_algo import (
-    AEBController, TARGET_FINAL_DISTANCE, 
-    FCW_TTC, SOFT_BRAKE_TTC, FULL_BRAKE_TTC,
-    MAX_SOFT_BRAKE, MAX_FULL_BRAKE, SYSTEM_LATENCY
-)
+from AEB_algo import AEBController
 from ACC_algo import ACCController
-from plots import create_aeb_plots
+from trajectory import TrajectoryRecorder
 import os
 from scipy.interpolate import interp1d
 
 
 
 # Function to run AEB simulation
-def run_aeb_simulation(config, visualize=True):
-    # Initialize data collection lists for plotting
+# record: collect the per-step signals returned in result['plot_data'] (see trajectory.TrajectoryRecorder)
+# aeb_params, acc_params: controller calibration (AEB_algo.AEBParams, ACC_algo.ACCParams), the module constants by default
+def run_aeb_simulation(config, visualize=True, record=True, aeb_params=None, acc_params=None):
     dt = 0.1  # time steps in seconds
-    time_data, speed_data, distance_data = [], [], []
-    ttc_data, required_decel_data, applied_decel_data = [], [], []
-    target_speed_data = []
 
     # Initialize collision flags
     collision_occurred = False
     impact_speed = 0
     
     # Create controllers
-    acc = ACCController()
+    acc = ACCController(acc_params)
     acc.set_desired_cruise_speed(config['ego_speed'] * 3.6)  # Convert m/s to kph
-    aeb = AEBController()
+    aeb = AEBController(aeb_params)
 
-    # Set up simulation environment
-    w = World(dt, width=400, height=40, ppm=6)
-    w.visualizer.window_title = os.path.basename(__file__)
-
-    # Road configuration plot
-    w.add(Painting(Point(60, 33.7), Point(800, 20), 'dark green'))  # Upper grass
-    w.add(Painting(Point(60, 6.3), Point(800, 20), 'dark green'))   # Lower grass
-    w.add(Painting(Point(60, 20), Point(800, 7.4), 'gray80'))  # Main road surface
-    w.add(Painting(Point(60, 23.7), Point(800, 0.3), 'white'))  # Upper road edge
-    w.add(Painting(Point(60, 16.3), Point(800, 0.3), 'white'))  # Lower road edge
-
-    for i in range(40):  # yellow dashed lane markings   
-        x_pos = 10 + (i * 12)  # 12m total spacing (3m dash + 9m gap)
-        w.add(Painting(Point(x_pos, 20), Point(2, 0.2), 'yellow'))  # 3m long dashes
-
-    # Add pedestrian crosswalk
-    crosswalk_x = 124
-    crosswalk_width = 2  # 2m wide crosswalk
-    crosswalk_stripes = 6  # Number of stripes
-
-    for i in range(crosswalk_stripes):
-        stripe_y = 17 + (i * 1.23)  # Evenly space stripes across road width (7.4m)
-        w.add(Painting(Point(crosswalk_x, stripe_y), Point(crosswalk_width, 0.5), 'white'))
+    # Set up simulation environment: the road layout comes from the scene pool (scenes.py), built once per process
+    w = scene_pool.acquire('straight_road', dt, width=400, height=40, ppm=6, headless=not visualize)
+    if visualize:
+        w.visualizer.window_title = os.path.basename(__file__)
 
     # Use ego and target start positions from config
     ego_start_x = config['ego_start_x']
@@ -86,6 +61,7 @@ def run_aeb_simulation(config, visualize=True):
     aeb_was_triggered = False
 
     # Simulation loop
+    trajectory = TrajectoryRecorder(200, enabled=record)
     for k in range(200):
         current_time = k * dt
         distance = ego_car.distanceTo(target_car)
@@ -103,8 +79,8 @@ def run_aeb_simulation(config, visualize=True):
         target_car.velocity = Point(target_speed, 0)
 
         # Get ACC and AEB commands
-        acc_command = acc.acc_control_loop(ego_car, target_car)
-        aeb_command = aeb.calculate_control(ego_car, target_car, current_time)
+        acc_command = acc.acc_control_loop(ego_car, target_car, distance)
+        aeb_command = aeb.calculate_control(ego_car, target_car, current_time, distance)
         
         # Extract the deceleration value from AEB command dictionary
         aeb_decel = aeb_command['applied_decel']
@@ -119,17 +95,17 @@ def run_aeb_simulation(config, visualize=True):
             final_command = acc_command
 
         # Apply control after latency
-        if k * dt >= aeb.command_time + SYSTEM_LATENCY:
+        if k * dt >= aeb.command_time + aeb.params.system_latency:
             ego_car.set_control(0, final_command)
         
         # Collect data
-        time_data.append(current_time)
-        distance_data.append(distance)
-        speed_data.append(ego_car.velocity.x * 2.237)  # Convert to mph
-        ttc_data.append(min(aeb_command['ttc'], 10))
-        required_decel_data.append(aeb_command['required_decel'])
-        applied_decel_data.append(final_command)
-        target_speed_data.append(target_car.velocity.x * 3.6)  # Convert m/s to kph
+        if trajectory.enabled:
+            trajectory.record(time=current_time, distance=distance,
+                              speed=ego_car.velocity.x * 2.237,  # Convert to mph
+                              ttc=min(aeb_command['ttc'], 10),
+                              required_decel=aeb_command['required_decel'],
+                              applied_decel=final_command,
+                              target_speed=target_car.velocity.x * 3.6)  # Convert m/s to kph
 
         # Update visualization
         if visualize:
@@ -144,7 +120,7 @@ def run_aeb_simulation(config, visualize=True):
             w.visualizer.draw_text(status_text, (550, 30))
 
             # Handle FCW warning display
-            if aeb_command['ttc'] <= FCW_TTC:
+            if aeb_command['ttc'] <= aeb.params.fcw_ttc:
                 if not warning_visible:
                     if warning_square:
                         warning_square.undraw()
@@ -176,12 +152,13 @@ def run_aeb_simulation(config, visualize=True):
             impact_speed = abs(ego_car.velocity.x - target_car.velocity.x) * 3.6  # Convert to kph
             break
 
-    w.close()
+    scene_pool.release(w)  # reset for the next run (closed when visualizing)
 
     # # Create plots after simulation, commented out to test passing data to LLM_scn_gen.py
     # if visualize:
-    #     create_aeb_plots(time_data, distance_data, speed_data, ttc_data, 
-    #                     required_decel_data, applied_decel_data, aeb, target_speed_data)
+    #     from plots import create_aeb_plots
+    #     create_aeb_plots(trajectory['time'], trajectory['distance'], trajectory['speed'], trajectory['ttc'],
+    #                     trajectory['required_decel'], trajectory['applied_decel'], aeb, trajectory['target_speed'])
 
     # # Return result in dictionary format
     initial_speed = config['ego_speed'] * 3.6  # Convert to kph
@@ -193,18 +170,10 @@ def run_aeb_simulation(config, visualize=True):
         'impact_speed': f"{round(impact_speed, 2)} kph",
         'aeb_triggered': aeb_was_triggered,
         'speed_reduction': f"{round(speed_reduction, 2)} kph",
-        # Add plotting data
-        'plot_data': {
-            'time_data': time_data,
-            'distance_data': distance_data,
-            'speed_data': speed_data,
-            'ttc_data': ttc_data,
-            'required_decel_data': required_decel_data,
-            'applied_decel_data': applied_decel_data,
-            'target_speed_data': target_speed_data,
-            'aeb_controller': aeb
-        }
     }
+    if trajectory.enabled:
+        # Add plotting data (time_data, distance_data, ... lists)
+        result['plot_data'] = dict(trajectory.as_lists(), aeb_controller=aeb)
 
     return result
 
@@ -32,13 +32,20 @@ target_decel_trigger = [0, 40, 1] m # based on distance to ego
 # step 1: use Latin Hypercube Sampling (LHS) to build a probabilistic model of the parameter space. LHS divides each parameter range into evenly spaced intervals and picks one from each interval, ensuring that every part of each parameter range is represented at least once. giving us a well distributed sample. LHS is selected because it is a good balance between coverage and computational efficiency. output: initial sample set
 
  
+import os
 import numpy as np
 import pandas as pd
-from scipy.stats import qmc # Import qmc (Quasi-Monte Carlo) module from scipy.stats to use Latin Hypercube Sampling
 
 from tqdm import tqdm # for progress bar
 # from AEB_SIM_LOOP import run_aeb_simulation  # Import the AEB simulation function (AEB ONLY)
 from Combined_SIM_LOOP import run_aeb_simulation  # Import the AEB simulation function (AEB + ACC)
+from batch_sim import run_aeb_batch, params_from_samples  # Vectorized version of Combined_SIM_LOOP.run_aeb_simulation
+from prefix_tree import run_prefix_tree  # Batch engine that simulates shared scenario prefixes once
+from sweep import run_sweep, configs_from_samples, to_kph  # Process pool sweep runner for the scalar simulation loop
+from result_sink import ResultSink, RESULT_COLUMNS, read_results, scenario_key, scenario_keys  # Streaming result files
+from samplers import ScenarioSampler, scenario_constraints  # Space filling designs with constraint rejection
+from result_cache import ResultCache  # Persistent simulation result cache
+from screening import screen_samples, SIMULATE, OUTCOMES  # Analytic TTC reachability screening
 
 
 # Parameter ranges based on your input
@@ -51,43 +58,58 @@ param_ranges = {
     'target_decel_trigger': (12, 40, 1),     # Range for target deceleration trigger distance (meters)
 }
 
-# Extract min and max values from parameter ranges for LHS
-lower_bounds = []
-upper_bounds = []
-
-for range_tuple in param_ranges.values():
-    lower_bounds.append(range_tuple[0])
-    upper_bounds.append(range_tuple[1])
-
 # set sample size based on computational resources
 num_samples = 2000
 
-# Function to create the Latin Hypercube Sampler and Generate Samples
-def generate_lhs_samples(num_samples):
-    # Number of parameters
-    num_params = len(param_ranges)
-
-    # Create Latin Hypercube Sampler
-    sampler = qmc.LatinHypercube(d=num_params)
-
-    # Generate samples in the unit cube
-    unit_samples = sampler.random(n=num_samples)
-
-    # Scale samples to actual parameter ranges
-    scaled_samples = qmc.scale(unit_samples, lower_bounds, upper_bounds)
-
-    # Round each column to the nearest valid step size
-    for i, (param, (low, high, step)) in enumerate(param_ranges.items()):
-        # Scale each sample to the nearest valid step size
-        scaled_samples[:, i] = np.round((scaled_samples[:, i] - low) / step) * step + low
+# sampling design for step 1, see samplers.METHODS: 'lhs', 'lhs-maximin', 'lhs-cd', 'sobol', 'halton' or 'random'
+sampling_method = 'lhs'
+# True: draw only scenarios that pass the step 2 filters (vectorized rejection), so num_samples scenarios are simulated
+# False: draw num_samples scenarios over the whole parameter box, the step 2 filters drop ~75-80% of them
+constrained_sampling = True
+sampling_seed = None  # None = new samples on every run
+# drop samples whose outcome is known without simulation (screening.py: AEB can never brake, or the collision is
+# unavoidable), they are saved to lhs_screened_samples.csv instead
+presim_screening = True
+
+# simulation engine for step 3:
+# 'batch' - all filtered samples at once with the vectorized batch engine
+# 'prefix_tree' - like 'batch', but scenarios with the same initial state share the steps before their target decel
+#                 trigger (prefix_tree.py), for grid sweeps over target_decel and target_decel_trigger
+# 'parallel' - scalar simulation loop fanned out over a process pool
+# 'serial' - scalar simulation loop, one sample at a time
+sim_engine = 'batch'
+sim_workers = None  # number of worker processes for the 'parallel' engine (None = all cores)
+sim_block_size = 10000  # samples per call of the 'batch' and 'prefix_tree' engines
+use_result_cache = True  # 'parallel' engine: reuse results of scenarios simulated in earlier sweeps (result_cache.py)
+
+# raw results are streamed to this file while step 3 runs ('.parquet' needs pyarrow), see result_sink.ResultSink
+raw_results_path = 'simulation_results_raw.csv'
+# rerunning after an interruption continues on lhs_filtered_samples.csv and skips the scenarios already in raw_results_path
+resume_sweep = True
 
-    # Convert to DataFrame 
-    df_samples = pd.DataFrame(scaled_samples, columns=param_ranges.keys())
-
-    # Save to CSV for inspection or future use
-    df_samples.to_csv('lhs_initial_samples.csv', index=False)
-
-    print(f"Initial sample set ({num_samples} samples) saved to 'lhs_initial_samples.csv'")
+# Function to create the Latin Hypercube Sampler and Generate Samples
+# Every sample gets a scenario_id (its draw number in the design) that stays with it through the filters, the
+# screening and the saved sample files, so 1_evaluate_sim_results can tell exactly which samples were dropped.
+# save_csv=False skips writing lhs_initial_samples.csv and the printout (e.g. for candidate pools of the active learning loop)
+def generate_lhs_samples(num_samples, save_csv=True):
+    # Draw the samples from the configured design, scaled to the parameter ranges and rounded to the valid step sizes
+    sampler = ScenarioSampler(param_ranges, method=sampling_method, seed=sampling_seed,
+                              constraints=scenario_constraints if constrained_sampling else None)
+    df_samples = sampler.sample(num_samples, keep_rejected=save_csv)
+    df_samples = df_samples.rename_axis('scenario_id').reset_index()
+
+    if not save_csv:
+        return df_samples
+
+    # Save to CSV for inspection or future use. With constrained sampling the draws rejected by the filters are
+    # saved too, so the file holds the whole initial sample set, ordered by scenario_id
+    df_rejected = sampler.rejected_.rename_axis('scenario_id').reset_index()
+    df_initial = pd.concat([df_samples, df_rejected]).sort_values('scenario_id', kind='stable')
+    df_initial.to_csv('lhs_initial_samples.csv', index=False)
+
+    print(f"Initial sample set ({len(df_initial)} samples) saved to 'lhs_initial_samples.csv'")
+    print(f"Sampling: {sampling_method}, {sampler.draws} draws, {sampler.acceptance_rate:.1%} accepted, "
+          f"centered discrepancy {sampler.discrepancy_:.4f}")
     print(f"Parameter ranges:")
     for param, (low, high, step) in param_ranges.items():
         print(f"  {param}: {low} to {high} (step size: {step})")
@@ -96,92 +118,151 @@ def generate_lhs_samples(num_samples):
 
 
 
-### STEP 2: Filtering our LHS sample set to remove undesirable scenarios ###
-# after obtaining the inital sample set, we apply filters to remove unrealistic scenarios or non-critical scenarios. output: filtered sample set
-
-def main():
-    # Read the initial LHS samples from CSV
-    df_samples = generate_lhs_samples(num_samples)
-    
-    # Filter 1: remove scenarios where the ego vehicle is ahead of the target vehicle, these scenarios do not make sense.
-
-    df_samples = df_samples[df_samples['ego_start_x'] <= df_samples['target_start_x']]
+def simulate_batch(df_samples, sink, engine=run_aeb_batch):
+    """Simulate the samples block by block with a vectorized engine (run_aeb_batch or run_prefix_tree)"""
+    params = params_from_samples(df_samples)
+    keys = np.array(scenario_keys(params))
+    todo = np.array([key not in sink.completed for key in keys], dtype=bool)
+    params, keys = params[todo], keys[todo]
+
+    for start in tqdm(range(0, len(params), sim_block_size), desc="Running simulation blocks"):
+        block = params[start:start + sim_block_size]
+        result = engine(block)
+
+        # Format the results the same way as the scalar loop
+        sink.add_frame(pd.DataFrame({
+            'ego_start_x': np.round(block[:, 0], 2),              # meters, 2 decimal
+            'ego_speed': np.round(block[:, 1] * 3.6, 2),          # convert back to km/h, 2 decimal
+            'target_start_x': np.round(block[:, 2], 2),           # meters, 2 decimal
+            'target_speed': np.round(block[:, 3] * 3.6, 2),       # convert back to km/h, 2 decimal
+            'target_decel': np.round(block[:, 4], 2),             # m/s², 2 decimal
+            'target_decel_trigger': np.round(block[:, 5], 2),     # meters, 2 decimal
+            'collision_occurred': result['collision_occurred'],   # boolean
+            'impact_speed': np.round(result['impact_speed'], 2),  # km/h, 2 decimal
+            'aeb_triggered': result['aeb_triggered'],             # boolean, indicating if AEB was activated
+            'speed_reduction': np.round(result['speed_reduction'], 2)  # km/h, 2 decimal
+        }), keys[start:start + sim_block_size])
+
+
+def format_result(config, result):
+    """Format a scalar simulation result before saving"""
+    return {
+        'ego_start_x': round(config['ego_start_x'], 2),      # meters, 2 decimal
+        'ego_speed': round(config['ego_speed'] * 3.6, 2),    # convert back to km/h, 2 decimal
+        'target_start_x': round(config['target_start_x'], 2), # meters, 2 decimal
+        'target_speed': round(config['target_speed'] * 3.6, 2), # convert back to km/h, 2 decimal
+        'target_decel': round(config['target_decel'], 2),     # m/s², 2 decimal
+        'target_decel_trigger': round(config['target_decel_trigger'], 2), # meters, 2 decimal
+        'collision_occurred': result['collision_occurred'],    # boolean, no change needed
+        'impact_speed': round(to_kph(result['impact_speed']), 2),     # km/h, 2 decimal
+        'aeb_triggered': result['aeb_triggered'],             # boolean, indicating if AEB was activated
+        'speed_reduction': round(to_kph(result['speed_reduction']), 2)  # km/h, 2 decimal
+    }
+
+
+def simulate_serial(df_samples, sink):
+    """Simulate the samples one at a time with the scalar simulation loop"""
+    configs = [config for config in configs_from_samples(df_samples) if not sink.done(config)]
+
+    # Loop through each configuration with progress bar
+    for config in tqdm(configs, desc="Running simulations"):
+        # Run simulation and capture result
+        result = run_aeb_simulation(config, visualize=False)
+        sink.add(format_result(config, result), config)
 
 
-    # Filter 2: if the target speed is greater than the ego speed, then the ego will never catch up to trigger AEB UNLESS the target is also decelerating. So then we want to keep scenarios where either the ego speed is greater than or equal to the target speed, or the target vehicle is decelerating
-    df_samples = df_samples[
-        (df_samples['ego_start_speed'] >= df_samples['target_start_speed']) |
-        (df_samples['target_decel'] < 0)
-    ]
+def simulate_parallel(df_samples, sink):
+    """Simulate the samples with the scalar simulation loop on a process pool"""
+    configs = [config for config in configs_from_samples(df_samples) if not sink.done(config)]
 
-    # Filter 3: TTC based filter: remove scenarios where the initial TTC is greater than 20 seconds.
-    # Calculate initial distance and relative speed
-    df_samples['initial_gap'] = df_samples['target_start_x'] - df_samples['ego_start_x']
-    # Convert speeds from kph to m/s for TTC calculation
-    df_samples['relative_speed'] = (df_samples['ego_start_speed'] - df_samples['target_start_speed']) / 3.6
+    def save_result(index, result):
+        # Results are written as the work units finish, not when the whole sweep is done
+        if 'error' in result:
+            print(f"Simulation failed for {configs[index]}: {result['error']}")
+            return
+        sink.add(format_result(configs[index], result), configs[index])
 
-    # Avoid division by zero for relative speed
-    df_samples['TTC'] = np.where(df_samples['relative_speed'] > 0,
-                                 df_samples['initial_gap'] / df_samples['relative_speed'],
-                                 np.inf)  # Set TTC to infinity if relative speed is <= 0
+    cache = ResultCache() if use_result_cache else None
+    run_sweep(configs, sim_module='Combined_SIM_LOOP', sim_kwargs={'visualize': False}, workers=sim_workers,
+              on_result=save_result, cache=cache)
+    if cache is not None:
+        print(f"Result cache: {cache.hits} hits, {cache.misses} misses")
+        cache.close()
 
-    # Apply the TTC filter (keep scenarios with TTC between 3 and 15 seconds)
-    df_samples = df_samples[(df_samples['TTC'] >= 3) & (df_samples['TTC'] <= 20)]
 
-    # Filter 4: remove scenarios where the relative speed is > 65 kph, we are trying to find scnearios where AEB barely avoids a collision
-    df_samples = df_samples[df_samples['relative_speed'] <= 65]
+def filter_results(df_samples):
+    """Read the raw results of the current sample set back from raw_results_path, chunk by chunk"""
+    keys = set(scenario_key(config) for config in configs_from_samples(df_samples))
+    # nothing simulated (e.g. an empty sample set) leaves no result file, or a Parquet directory without parts
+    chunks = []
+    if os.path.exists(raw_results_path):
+        chunks = [chunk[chunk['scenario_key'].isin(keys)] for chunk in read_results(raw_results_path, chunksize=100000)]
+    if not chunks:
+        chunks = [pd.DataFrame(columns=list(RESULT_COLUMNS)).astype(RESULT_COLUMNS)]
+    return pd.concat(chunks, ignore_index=True).drop(columns=['scenario_key'])
 
-    # Remove temporary columns
-    df_samples = df_samples.drop(columns=['initial_gap', 'relative_speed', 'TTC'])
 
+### STEP 2: Filtering our LHS sample set to remove undesirable scenarios ###
+# after obtaining the inital sample set, we apply filters to remove unrealistic scenarios or non-critical scenarios. output: filtered sample set
 
+def filter_samples(df_samples):
+    # Filters 1-4 (samplers.scenario_constraints):
+    # 1. remove scenarios where the ego vehicle is ahead of the target vehicle, these scenarios do not make sense.
+    # 2. if the target speed is greater than the ego speed, then the ego will never catch up to trigger AEB UNLESS the target is also decelerating. So then we want to keep scenarios where either the ego speed is greater than or equal to the target speed, or the target vehicle is decelerating
+    # 3. TTC based filter: remove scenarios where the initial TTC is not between 3 and 20 seconds.
+    # 4. remove scenarios where the relative speed is > 65, we are trying to find scnearios where AEB barely avoids a collision
+    # With constrained_sampling the samples already pass these filters
+    return df_samples[scenario_constraints(df_samples)]
 
 
+def screen_out(df_samples):
+    """Pre-simulation screening: keep the samples that need a simulation, save the others with their outcome"""
+    outcome = screen_samples(df_samples)
+    df_screened = df_samples[outcome != SIMULATE].assign(screening=[OUTCOMES[o] for o in outcome[outcome != SIMULATE]])
+    df_screened.to_csv('lhs_screened_samples.csv', index=False)
+    counts = df_screened['screening'].value_counts().to_dict()
+    print(f"Screening: {len(df_screened)} of {len(df_samples)} samples need no simulation {counts}")
+    return df_samples[outcome == SIMULATE]
 
-    # Print number of remaining samples after filtering
-    # The result was ~200 out of 1k scenarios remaining, so the filters eliminate ~75-80% of the scenarios.
-    # Save filtered samples to CSV for inspection or future use
-    df_samples.to_csv('lhs_filtered_samples.csv', index=False)
 
-    print(f"Filtered sample set ({len(df_samples)} samples) saved to 'lhs_filtered_samples.csv'")
+def main():
+    # An interrupted sweep continues on the same filtered sample set, a finished one starts over with new samples
+    resuming = False
+    if resume_sweep and os.path.exists(raw_results_path) and os.path.exists('lhs_filtered_samples.csv'):
+        df_samples = pd.read_csv('lhs_filtered_samples.csv')
+        with ResultSink(raw_results_path) as sink:
+            remaining = sum(not sink.done(config) for config in configs_from_samples(df_samples))
+        resuming = remaining > 0
+        if resuming:
+            print(f"Resuming the sweep of 'lhs_filtered_samples.csv': {remaining} of {len(df_samples)} samples left")
+
+    if not resuming:
+        # Generate the initial LHS samples and filter them
+        df_samples = filter_samples(generate_lhs_samples(num_samples))
+        if presim_screening:
+            df_samples = screen_out(df_samples)
+
+        # Print number of remaining samples after filtering
+        # The result was ~200 out of 1k scenarios remaining, so the filters eliminate ~75-80% of the scenarios.
+        # Save filtered samples to CSV for inspection or future use
+        df_samples.to_csv('lhs_filtered_samples.csv', index=False)
+
+        print(f"Filtered sample set ({len(df_samples)} samples) saved to 'lhs_filtered_samples.csv'")
 
 
     ### STEP 3:Simulate the filtered LHS sample set and obtain results ###
-    # List to store results
-    simulation_results = []
-
-    # Loop through each configuration row with progress bar
-    for index, row in tqdm(df_samples.iterrows(), total=len(df_samples), desc="Running simulations"):
-        # Convert row to configuration dictionary
-        config = {
-            'ego_start_x': row['ego_start_x'],
-            'ego_speed': row['ego_start_speed'] / 3.6,  # Convert from kph to m/s
-            'target_start_x': row['target_start_x'],
-            'target_speed': row['target_start_speed'] / 3.6,  # Convert from kph to m/s
-            'target_decel': row['target_decel'],
-            'target_decel_trigger': row['target_decel_trigger']
-        }
-
-        # Run simulation and capture result
-        result = run_aeb_simulation(config)
-        
-        # Format the results before saving
-        simulation_result = {
-            'ego_start_x': round(config['ego_start_x'], 2),      # meters, 2 decimal
-            'ego_speed': round(config['ego_speed'] * 3.6, 2),    # convert back to km/h, 2 decimal
-            'target_start_x': round(config['target_start_x'], 2), # meters, 2 decimal
-            'target_speed': round(config['target_speed'] * 3.6, 2), # convert back to km/h, 2 decimal
-            'target_decel': round(config['target_decel'], 2),     # m/s², 2 decimal
-            'target_decel_trigger': round(config['target_decel_trigger'], 2), # meters, 2 decimal
-            'collision_occurred': result['collision_occurred'],    # boolean, no change needed
-            'impact_speed': round(result['impact_speed'], 2),     # km/h, 2 decimal
-            'aeb_triggered': result['aeb_triggered'],             # boolean, indicating if AEB was activated
-            'speed_reduction': result['speed_reduction']          # km/h, 2 decimal
-        }
-        simulation_results.append(simulation_result)
-
-    # Convert the results list to a DataFrame
-    df_results = pd.DataFrame(simulation_results)
+    # Results are streamed to raw_results_path, so an interrupted sweep keeps what it finished
+    with ResultSink(raw_results_path, resume=resuming) as sink:
+        if sim_engine == 'batch':
+            simulate_batch(df_samples, sink)
+        elif sim_engine == 'prefix_tree':
+            simulate_batch(df_samples, sink, engine=run_prefix_tree)
+        elif sim_engine == 'parallel':
+            simulate_parallel(df_samples, sink)
+        else:
+            simulate_serial(df_samples, sink)
+
+    df_results = filter_results(df_samples)
 
 
     # post simulation filtering for AEB scenarios that was on the borderline of passing and failing
@@ -54,11 +54,13 @@ class SimulatorGUI:
                             required_decel_data, applied_decel_data, aeb_controller, target_speed_data):
         # Clear previous plots
         self.fig.clear()
+        params = aeb_controller.params  # thresholds of the controller that ran the scenario
 
         # Distance plot
         ax1 = self.fig.add_subplot(511)
         ax1.plot(time_data, distance_data, label="Distance to Target (m)")
-        ax1.axhline(y=3, color='r', linestyle='--', label="Target Stopping Distance (3m)")
+        ax1.axhline(y=params.target_final_distance, color='r', linestyle='--',
+                    label=f"Target Stopping Distance ({params.target_final_distance:g}m)")
         if aeb_controller.fcw_activation:
             ax1.scatter(aeb_controller.fcw_activation[0], aeb_controller.fcw_activation[1], 
                        color='blue', label="FCW Activated", zorder=5)
@@ -86,9 +88,9 @@ class SimulatorGUI:
         # TTC plot
         ax3 = self.fig.add_subplot(513)
         ax3.plot(time_data, ttc_data, color="green", label="TTC (s)")
-        ax3.axhline(y=2.5, color='blue', linestyle='--', label="FCW Threshold")
-        ax3.axhline(y=1.7, color='orange', linestyle='--', label="Soft Brake Threshold")
-        ax3.axhline(y=1.0, color='red', linestyle='--', label="Hard Brake Threshold")
+        ax3.axhline(y=params.fcw_ttc, color='blue', linestyle='--', label="FCW Threshold")
+        ax3.axhline(y=params.soft_brake_ttc, color='orange', linestyle='--', label="Soft Brake Threshold")
+        ax3.axhline(y=params.full_brake_ttc, color='red', linestyle='--', label="Hard Brake Threshold")
         ax3.set_ylim(bottom=0, top=6)
         ax3.set_xlabel("Time (s)")
         ax3.set_ylabel("TTC (s)")
@@ -100,8 +102,8 @@ class SimulatorGUI:
         ax4.plot(time_data, required_decel_data, color="green", linestyle='--', 
                 label="Required Decel")
         ax4.plot(time_data, applied_decel_data, color="red", label="Applied Decel")
-        ax4.axhline(y=-3.0, color='orange', linestyle=':', label="Soft Brake Limit")
-        ax4.axhline(y=-6.0, color='red', linestyle=':', label="Hard Brake Limit")
+        ax4.axhline(y=params.max_soft_brake, color='orange', linestyle=':', label="Soft Brake Limit")
+        ax4.axhline(y=params.max_full_brake, color='red', linestyle=':', label="Hard Brake Limit")
         ax4.set_ylim(top=1, bottom=-10)
         ax4.set_xlabel("Time (s)")
         ax4.set_ylabel("Decel (m/s²)")
@@ -0,0 +1,116 @@
+import numpy as np
+from scipy.special import expit
+from scipy.stats import norm
+
+# Acquisition criteria for picking the next scenarios to simulate, higher score = more worth simulating
+# 'entropy'     - predictive entropy of P(collision), largest at p = 0.5
+# 'variance'    - posterior variance of the latent function (pure exploration)
+# 'straddle'    - kappa * sd - |mean| of the latent function: uncertain and close to the pass/fail boundary
+# 'boundary_ei' - expected improvement of the boundary estimate (Ranjan et al. contour EI, level 0, band alpha * sd)
+CRITERIA = ('entropy', 'variance', 'straddle', 'boundary_ei')
+
+kappa = 1.96  # straddle width in latent standard deviations
+alpha = 1.96  # boundary_ei band half width in latent standard deviations
+
+
+def predictive_entropy(collision_probs):
+    """Entropy (nats) of the collision / no collision prediction, 0 for certain predictions, log 2 at p = 0.5"""
+    p = np.clip(np.asarray(collision_probs, dtype=float), 1e-12, 1 - 1e-12)
+    return -(p * np.log(p) + (1 - p) * np.log(1 - p))
+
+
+def straddle(mean, var):
+    return kappa * np.sqrt(var) - np.abs(mean)
+
+
+def boundary_expected_improvement(mean, var):
+    """E[max(0, eps² - f²)] for f ~ N(mean, var) and eps = alpha * sd, in closed form"""
+    sd = np.sqrt(np.maximum(var, 1e-300))
+    eps = alpha * sd
+    u1 = (-eps - mean) / sd
+    u2 = (eps - mean) / sd
+    mass = norm.cdf(u2) - norm.cdf(u1)
+    pdf1, pdf2 = norm.pdf(u1), norm.pdf(u2)
+    return ((eps ** 2 - mean ** 2) * mass - 2 * mean * sd * (pdf1 - pdf2)
+            - var * (mass - (u2 * pdf2 - u1 * pdf1)))
+
+
+def probit_probability(mean, var):
+    """P(collision) with the latent uncertainty integrated out (probit approximation, as RFFGPClassifier)"""
+    return expit(mean / np.sqrt(1 + np.pi * var / 8))
+
+
+def score_latent(mean, var, criterion='straddle'):
+    """Acquisition scores from the latent posterior mean and variance"""
+    if criterion == 'entropy':
+        return predictive_entropy(probit_probability(mean, var))
+    if criterion == 'variance':
+        return np.asarray(var, dtype=float)
+    if criterion == 'straddle':
+        return straddle(mean, var)
+    if criterion == 'boundary_ei':
+        return boundary_expected_improvement(mean, var)
+    raise ValueError(f"Unknown acquisition criterion '{criterion}', expected one of {CRITERIA}")
+
+
+def has_latent(model):
+    base = getattr(model, 'base_estimator_', None)
+    return hasattr(model, 'predict_latent') or hasattr(base, 'latent_mean_and_variance')
+
+
+def latent_moments(model, X):
+    """
+    Latent posterior mean and variance of a fitted classifier: RFFGPClassifier.predict_latent or, for sklearn's
+    binary GaussianProcessClassifier, the Laplace latent moments of its base estimator.
+    """
+    if hasattr(model, 'predict_latent'):
+        return model.predict_latent(X)
+    if has_latent(model):
+        return model.base_estimator_.latent_mean_and_variance(np.asarray(X, dtype=float))
+    raise TypeError(f"{type(model).__name__} has no latent posterior, only the 'entropy' criterion is available")
+
+
+def acquisition_scores(model, X, criterion='straddle', top_k=None, chunk_size=50000):
+    """
+    Acquisition scores for a pool of candidate scenarios, computed in chunks of chunk_size rows.
+
+    With top_k and a model with predict_latent_bound (RFFGPClassifier), only candidates that can still be among
+    the top_k best are scored exactly and the rest get -inf: every criterion grows with the latent variance and
+    falls with |mean|, so the cheap latent bounds give a score bound. Candidates are scored exactly in order of
+    that bound until the next bound is below the k-th best exact score, which skips the expensive variance for
+    the confidently predicted bulk of a large pool.
+    """
+    if criterion not in CRITERIA:
+        raise ValueError(f"Unknown acquisition criterion '{criterion}', expected one of {CRITERIA}")
+    X = np.asarray(X, dtype=float)
+    scores = np.full(len(X), -np.inf)
+
+    if top_k is None or top_k >= len(X) or not hasattr(model, 'predict_latent_bound'):
+        for start in range(0, len(X), chunk_size):
+            chunk = X[start:start + chunk_size]
+            if criterion == 'entropy' and not has_latent(model):
+                scores[start:start + len(chunk)] = predictive_entropy(model.predict_proba(chunk)[:, 1])
+            else:
+                scores[start:start + len(chunk)] = score_latent(*latent_moments(model, chunk), criterion)
+        return scores
+
+    bound = np.empty(len(X))
+    for start in range(0, len(X), chunk_size):
+        chunk = X[start:start + chunk_size]
+        bound[start:start + len(chunk)] = score_latent(*model.predict_latent_bound(chunk), criterion)
+    order = np.argsort(-bound)
+    done = 0
+    while done < len(X):
+        rows = order[done:done + max(2 * top_k, 1000)]
+        scores[rows] = score_latent(*latent_moments(model, X[rows]), criterion)
+        done += len(rows)
+        if done >= top_k and done < len(X) and bound[order[done]] < np.partition(scores[order[:done]], -top_k)[-top_k]:
+            break
+    return scores
+
+
+def select_top(model, X, k, criterion='straddle', chunk_size=50000):
+    """Indices of the k best candidates, best first"""
+    scores = acquisition_scores(model, X, criterion, top_k=k, chunk_size=chunk_size)
+    top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k] if len(scores) > k else np.arange(len(scores))
+    return top[np.argsort(-scores[top])]
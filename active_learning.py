@@ -0,0 +1,183 @@
+### Part 3: Closed-loop active learning of the AEB pass/fail boundary ###
+# Automates the manual loop of probalistic_model.py: every round samples a pool of candidate scenarios,
+# scores them with an acquisition criterion of the GP surrogate (acquisition.py), selects a diverse batch of
+# uncertain borderline scenarios, simulates them, updates the surrogate with the results and checks whether the
+# predictions have converged.
+
+### INPUT:
+# 1. training_data.csv - initial simulation results
+### OUTPUT:
+# 1. CSV/active_learning_results.csv - every scenario simulated by the loop (result_sink format, resumable)
+# 2. CSV/active_learning_checkpoint.pkl - surrogate model and loop state after the last finished round
+
+import os
+import pickle
+import numpy as np
+import pandas as pd
+
+import LHS_filter
+from LHS_filter import generate_lhs_samples, filter_samples, simulate_batch, simulate_parallel
+from acquisition import acquisition_scores
+from batch_sim import params_from_samples
+from result_sink import ResultSink, read_results, scenario_keys
+from surrogate import RFFGPClassifier
+
+# Model features, speeds in kph (the columns of the simulation result files)
+FEATURES = ['ego_start_x', 'ego_speed', 'target_start_x', 'target_speed', 'target_decel', 'target_decel_trigger']
+
+training_data_path = 'training_data.csv'
+results_path = 'CSV/active_learning_results.csv'
+checkpoint_path = 'CSV/active_learning_checkpoint.pkl'
+
+num_rounds = 20        # maximum number of rounds
+pool_size = 25000      # candidates sampled per round (LHS_filter sampling settings, after the scenario filters)
+batch_size = 50        # scenarios simulated per round
+candidates_factor = 10 # the batch is picked for diversity among the candidates_factor*batch_size best scored candidates
+acquisition_criterion = 'straddle'  # 'entropy', 'variance', 'straddle' or 'boundary_ei' (see acquisition.py)
+retune_every = 5       # refit with hyperparameter tuning on all data every n rounds, partial_fit otherwise
+eval_pool_size = 5000  # fixed scenario pool used to measure how much the predictions still change
+
+# Convergence: stop once fewer than `convergence_tol` of the eval pool predictions flip for `patience` rounds in a row
+convergence_tol = 0.005
+patience = 3
+
+# simulation engine: 'batch' (vectorized) or 'parallel' (scalar loop on a process pool)
+sim_engine = 'batch'
+
+
+def sample_candidates(num_samples):
+    """LHS samples that pass the LHS_filter scenario filters, with the result file column names"""
+    df_samples = filter_samples(generate_lhs_samples(num_samples, save_csv=False))
+    return df_samples.rename(columns={'ego_start_speed': 'ego_speed', 'target_start_speed': 'target_speed'})
+
+
+def to_samples(df_configs):
+    """Back to the LHS sample column names used by the simulate_* functions of LHS_filter"""
+    return df_configs.rename(columns={'ego_speed': 'ego_start_speed', 'target_speed': 'target_start_speed'})
+
+
+def select_diverse(X, scores, k, candidates_factor=10):
+    """
+    Greedy batch selection: among the candidates_factor*k best scored rows, repeatedly take the row with the
+    best score discounted by its closeness to the rows already taken, so the batch does not pile up in one spot.
+    X is standardized per column; returns the indices of the selected rows.
+    """
+    X = np.asarray(X, dtype=float)
+    top = np.argsort(scores)[::-1][:candidates_factor * k]
+    Z = (X[top] - X[top].mean(axis=0)) / np.where(X[top].std(axis=0) > 0, X[top].std(axis=0), 1.)
+    top_scores = np.asarray(scores, dtype=float)[top]
+    # The discount shrinks a score towards 0, which only penalizes closeness for non-negative scores ('straddle'
+    # scores can be negative), so the scores are shifted to start at 0 (candidates that were never scored stay out)
+    scored = np.isfinite(top_scores)
+    if scored.any():
+        top_scores = np.where(scored, top_scores - top_scores[scored].min(), -np.inf)
+
+    # Distances are discounted on the scale of the typical spacing between candidates
+    radius = np.median(np.sqrt(((Z[:, None, :] - Z[None, :min(len(Z), 200), :]) ** 2).sum(-1))) / 2 if len(Z) > 1 else 1.
+    min_distance = np.full(len(top), np.inf)
+    selected = []
+    for _ in range(min(k, len(top))):
+        discount = 1 - np.exp(-(min_distance / radius) ** 2)
+        value = np.where(np.isinf(min_distance), top_scores, top_scores * discount)
+        value[~scored] = -np.inf
+        value[selected] = -np.inf
+        if not np.isfinite(value).any():
+            break  # every scored candidate is taken
+        best = int(np.argmax(value))
+        selected.append(best)
+        min_distance = np.minimum(min_distance, np.sqrt(((Z - Z[best]) ** 2).sum(axis=1)))
+    return top[selected]
+
+
+def simulate(df_configs, sink):
+    """Simulate the selected scenarios into the result sink"""
+    df_samples = to_samples(df_configs)
+    if sim_engine == 'parallel':
+        simulate_parallel(df_samples, sink)
+    else:
+        simulate_batch(df_samples, sink)
+
+
+def load_training_data():
+    """Initial training data plus everything the loop simulated so far"""
+    frames = [pd.read_csv(training_data_path)]
+    if os.path.exists(results_path):
+        frames.append(read_results(results_path).drop(columns=['scenario_key']))
+    df = pd.concat(frames, ignore_index=True)
+    return df[FEATURES].to_numpy(dtype=float), df['collision_occurred'].astype(int).to_numpy()
+
+
+def save_checkpoint(state):
+    # Write to a temporary file first so an interrupted save never corrupts the last checkpoint
+    with open(checkpoint_path + '.tmp', 'wb') as f:
+        pickle.dump(state, f)
+    os.replace(checkpoint_path + '.tmp', checkpoint_path)
+
+
+def main():
+    os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
+
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, 'rb') as f:
+            state = pickle.load(f)
+        # Refit on everything on disk, results simulated after the last checkpoint are not lost
+        state['model'].fit(*load_training_data())
+        print(f"Resuming active learning after round {state['round']}")
+    else:
+        X, y = load_training_data()
+        model = RFFGPClassifier(random_state=42).fit(X, y, tune=True)
+        eval_pool = sample_candidates(eval_pool_size)[FEATURES].to_numpy(dtype=float)
+        state = {'round': 0, 'model': model, 'eval_pool': eval_pool, 'eval_predictions': model.predict(eval_pool),
+                 'stable_rounds': 0, 'history': []}
+        save_checkpoint(state)
+
+    model = state['model']
+    with ResultSink(results_path, flush_every=batch_size) as sink:
+        while state['round'] < num_rounds and state['stable_rounds'] < patience:
+            round_number = state['round'] + 1
+
+            # sample -> predict -> select
+            df_pool = sample_candidates(pool_size)
+            df_pool = df_pool[[not sink.done(config) for config in LHS_filter.configs_from_samples(to_samples(df_pool))]]
+            X_pool = df_pool[FEATURES].to_numpy(dtype=float)
+            # Only the candidates that can make the top candidates_factor*batch_size are scored exactly
+            scores = acquisition_scores(model, X_pool, acquisition_criterion, top_k=candidates_factor * batch_size)
+            selected = select_diverse(X_pool, scores, batch_size, candidates_factor)
+            df_batch = df_pool.iloc[selected]
+
+            # simulate -> retrain
+            simulate(df_batch, sink)
+            sink.flush()
+            # The results of this batch, found by scenario key (row offsets are not reliable once the file holds
+            # duplicate scenarios, which a resumed sink counts once)
+            batch_keys = set(scenario_keys(params_from_samples(to_samples(df_batch))))
+            df_new = read_results(results_path)
+            df_new = df_new[df_new['scenario_key'].isin(batch_keys)].drop_duplicates('scenario_key')
+            X_new = df_new[FEATURES].to_numpy(dtype=float)
+            y_new = df_new['collision_occurred'].astype(int).to_numpy()
+            if round_number % retune_every == 0:
+                model.fit(*load_training_data(), tune=True)
+            else:
+                model.partial_fit(X_new, y_new)
+
+            # convergence check on the fixed evaluation pool
+            eval_predictions = model.predict(state['eval_pool'])
+            flipped = np.mean(eval_predictions != state['eval_predictions'])
+            state['stable_rounds'] = state['stable_rounds'] + 1 if flipped < convergence_tol else 0
+            state['eval_predictions'] = eval_predictions
+            state['history'].append({'round': round_number, 'simulated': len(df_new), 'collisions': int(y_new.sum()),
+                                     'mean_score': float(scores[selected].mean()),
+                                     'flipped': float(flipped)})
+            state['round'] = round_number
+            save_checkpoint(state)
+
+            print(f"Round {round_number}: simulated {len(df_new)} scenarios ({int(y_new.sum())} collisions), "
+                  f"{flipped:.2%} of the evaluation predictions changed")
+
+    if state['stable_rounds'] >= patience:
+        print(f"Converged after {state['round']} rounds")
+    print(f"Results saved to '{results_path}', model and loop state to '{checkpoint_path}'")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+import numpy as np
+from AEB_algo import (
+    TARGET_FINAL_DISTANCE,
+    SOFT_BRAKE_TTC, FULL_BRAKE_TTC,
+    MAX_SOFT_BRAKE, MAX_FULL_BRAKE, SYSTEM_LATENCY
+)
+from ACC_algo import (
+    DESIRED_TIME_GAP, MAX_ACCEL, MAX_DECEL,
+    MIN_FOLLOWING_DISTANCE, DETECTION_RANGE
+)
+from batch_sim import CAR_LENGTH
+from termination import TerminationCriteria, NOT_SETTLED
+
+# Jumps stop this many time steps short of a computed event time: an event within the margin of a step boundary
+# is a tie the closed form event time cannot resolve, so the steps around it are taken one at a time
+EVENT_MARGIN = 1e-3
+
+
+def _commands(distance, ego_v, target_v, cruise_speed):
+    """ACC and AEB commands of one step (the same formulas as batch_sim.run_aeb_batch)"""
+    follow_accel = (distance - (ego_v * DESIRED_TIME_GAP + MIN_FOLLOWING_DISTANCE)) / DESIRED_TIME_GAP
+    cruise_accel = (cruise_speed - ego_v) / DESIRED_TIME_GAP
+    acc_command = np.clip(np.where(distance < DETECTION_RANGE, follow_accel, cruise_accel), MAX_DECEL, MAX_ACCEL)
+
+    relative_speed = ego_v - target_v
+    closing = relative_speed > 0
+    ttc = np.divide(distance, relative_speed, out=np.full(distance.shape, np.inf), where=closing)
+
+    required_decel = np.zeros(distance.shape)
+    braking = closing & (distance > TARGET_FINAL_DISTANCE)
+    required_decel[braking] = -(relative_speed[braking] ** 2) / (2 * (distance[braking] - TARGET_FINAL_DISTANCE))
+
+    max_allowed_decel = np.where(ttc <= FULL_BRAKE_TTC, MAX_FULL_BRAKE,
+                                 np.where(ttc <= SOFT_BRAKE_TTC, MAX_SOFT_BRAKE, 0.))
+    applied_decel = np.where(required_decel < 0, np.maximum(required_decel, max_allowed_decel), max_allowed_decel)
+    return acc_command, applied_decel
+
+
+def first_crossing(f0, f1, f2):
+    """
+    Earliest time t > 0 at which f(t) = f0 + f1*t + f2*t²/2 reaches zero, for f0 > 0 (vectorized).
+    Returns 0 where f0 <= 0 and inf where f never reaches zero.
+    """
+    f0, f1, f2 = np.broadcast_arrays(*[np.asarray(v, dtype=float) for v in (f0, f1, f2)])
+    a = 0.5 * f2
+    disc = f1 * f1 - 4 * a * f0
+    # numerically stable quadratic roots: q/a and f0/q
+    q = -0.5 * (f1 + np.copysign(np.sqrt(np.maximum(disc, 0)), f1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        root_1 = np.where(a != 0, q / a, np.inf)
+        root_2 = np.where(q != 0, f0 / q, np.inf)
+    root_1 = np.where(root_1 > 0, root_1, np.inf)
+    root_2 = np.where(root_2 > 0, root_2, np.inf)
+    t = np.where(disc < 0, np.inf, np.minimum(root_1, root_2))
+    return np.where(f0 <= 0, 0., t)
+
+
+def time_to_event(distance, target_ahead, ego_v, target_v, target_accel, trigger_distance):
+    """
+    Time until the next event of quiet scenarios (constant ego speed, constant target input, AEB idle):
+    contact, the soft brake TTC threshold, the target decel trigger (nan once triggered), a DETECTION_RANGE
+    crossing, the following command of a stopped ego turning positive and the target stopping.
+    """
+    # Gap d(t) = d0 + rate*t + curvature*t²/2 (the sign flips when the ego drives ahead of the target),
+    # each event is the first root of a quadratic in t
+    sign = np.where(target_ahead, 1., -1.)
+    relative_speed = ego_v - target_v
+    rate = -sign * relative_speed
+    curvature = sign * target_accel
+
+    def gap_reaches(level):
+        return first_crossing(distance - level, rate, curvature)
+
+    # contact and TTC brake threshold (relative_speed changes at -target_accel)
+    t_event = np.minimum(gap_reaches(0.),
+                         first_crossing(distance - SOFT_BRAKE_TTC * relative_speed,
+                                        rate + SOFT_BRAKE_TTC * target_accel, curvature))
+    # target decel trigger
+    untriggered = ~np.isnan(trigger_distance)
+    t_event = np.minimum(t_event, np.where(untriggered, gap_reaches(np.nan_to_num(trigger_distance)), np.inf))
+    # ACC mode switch of a moving ego (a moving ego is only quiet while cruising) and the following command of a
+    # stopped ego turning positive as the gap opens beyond MIN_FOLLOWING_DISTANCE
+    moving = ego_v > 0
+    following = distance < DETECTION_RANGE
+    t_event = np.minimum(t_event, np.where(moving & ~following, gap_reaches(DETECTION_RANGE), np.inf))
+    t_event = np.minimum(t_event, np.where(~moving & following,
+                                           first_crossing(MIN_FOLLOWING_DISTANCE - distance, -rate, -curvature),
+                                           np.inf))
+    # target stops
+    braking = target_accel < 0
+    t_stop = np.full(distance.shape, np.inf)
+    t_stop[braking] = target_v[braking] / -target_accel[braking]
+    return np.minimum(t_event, t_stop)
+
+
+def _stretch(x, v, a, length, dt):
+    """
+    Positions and speeds of one car over `length` steps of constant input a (the tick of the batch engine), as
+    N x (max(length) + 1) arrays with column j = step j of each stretch (columns past the length are unused).
+    The steps are running sums, and np.cumsum adds in order, so every value is bit for bit the one of the step by
+    step loop. The speed clamp at 0 commutes with the sum as the input is never positive once the car stops.
+    """
+    width = length.max()
+    speed = np.maximum(np.cumsum(np.column_stack([v, np.repeat((a * dt)[:, None], width, axis=1)]), axis=1), 0)
+    position = np.cumsum(np.column_stack([x, (speed[:, :-1] + speed[:, 1:]) * dt / 2.]), axis=1)
+    return position, speed
+
+
+def run_aeb_analytic(params, dt=0.1, num_steps=200, early_termination=False):
+    """
+    Event skipping version of batch_sim.run_aeb_batch (ACC + AEB, straight line scenarios).
+
+    Both cars drive along one lane with zero steering, so between controller updates the kinematic
+    bicycle model is constant acceleration motion. Whenever a scenario is quiet - AEB idle, the ego
+    speed frozen (coasting without an ACC command or stopped) and the target at a constant input - every
+    command is known in closed form until the next event: the target decel trigger, a TTC brake threshold,
+    a DETECTION_RANGE crossing, the ACC following command of a stopped ego turning positive or the
+    target stopping.
+    The event times are roots of quadratics, and the scenario jumps straight to the step of the first
+    of them. All other steps (braking, ACC following, latency) are taken one at a time exactly like
+    the batch engine. A jump only finds where the stretch ends in closed form, the positions and speeds
+    over it are the running sums of the batch tick (_stretch), so the results match batch_sim exactly.
+    An event within EVENT_MARGIN steps of a step boundary (a tie, common with grid valued LHS samples,
+    e.g. a gap of exactly the trigger distance) ends the jump one step early.
+
+    Every scenario keeps its own step counter, so the number of loop iterations is the number of non-quiet
+    steps instead of num_steps. That does not make it faster than batch_sim: ACC following, braking and
+    latency steps are still taken one at a time, most scenarios spend the bulk of their steps there, and
+    the stretches cost their steps in _stretch anyway. The sweep scripts therefore use batch_sim; this
+    engine is kept as an exact check of the event analysis that screening.py builds on.
+
+    Args:
+        params: N x 6 array, columns as in batch_sim.PARAM_COLUMNS (speeds in m/s)
+        dt: controller time step (seconds)
+        num_steps: maximum number of steps per scenario
+        early_termination: stop scenarios whose outcome is settled (see termination.TerminationCriteria)
+
+    Returns:
+        dict of length-N arrays: collision_occurred, impact_speed (kph), aeb_triggered, speed_reduction (kph)
+    """
+    params = np.atleast_2d(np.asarray(params, dtype=float))
+    n = params.shape[0]
+
+    # Results, written when a scenario finishes
+    collision_occurred = np.zeros(n, dtype=bool)
+    impact_speed = np.zeros(n)
+    aeb_triggered = np.zeros(n, dtype=bool)
+    final_ego_v = np.zeros(n)
+
+    # Only unfinished scenarios are simulated, `rows` maps them back to the input order
+    rows = np.arange(n)
+    step = np.zeros(n, dtype=int)
+    ego_x = params[:, 0].copy()
+    ego_v = params[:, 1].copy()
+    target_x = params[:, 2].copy()
+    target_v = params[:, 3].copy()
+    target_decel = params[:, 4].copy()
+    target_decel_trigger = params[:, 5].copy()
+    cruise_speed = (params[:, 1] * 3.6) / 3.6
+
+    ego_a = np.zeros(n)
+    target_a = np.zeros(n)
+    commanded_deceleration = np.zeros(n)
+    command_time = np.full(n, -np.inf)
+    triggered = np.zeros(n, dtype=bool)
+
+    while rows.size:
+        current_time = step * dt
+        distance = np.maximum(np.abs(target_x - ego_x) - CAR_LENGTH, 0.)
+
+        # Controller step, as in the batch engine
+        target_a = np.where(distance <= target_decel_trigger, target_decel, target_a)
+        acc_command, applied_decel = _commands(distance, ego_v, target_v, cruise_speed)
+
+        changed = applied_decel != commanded_deceleration
+        commanded_deceleration = np.where(changed, applied_decel, commanded_deceleration)
+        command_time = np.where(changed, current_time, command_time)
+
+        use_aeb = applied_decel < acc_command
+        final_command = np.where(use_aeb, applied_decel, acc_command)
+        triggered |= use_aeb & (np.abs(applied_decel) > 0.1)
+
+        gate_open = current_time >= command_time + SYSTEM_LATENCY
+        ego_a = np.where(gate_open, final_command, ego_a)
+
+        # Quiet scenarios: the AEB is idle, the ego speed cannot change and the cars are apart
+        ego_frozen = (np.maximum(ego_v + ego_a * dt, 0) == ego_v) & ((ego_v == 0) | (final_command == ego_a))
+        following = distance < DETECTION_RANGE
+        # A moving ego that follows the target is never quiet: its command depends on the gap, and a gap that
+        # holds still in closed form can drift by rounding in the stepped positions and move the command off 0
+        quiet = ((applied_decel == 0) & (commanded_deceleration == 0) & gate_open & ego_frozen & (distance > 0) &
+                 ((ego_v == 0) | ~following))
+
+        # A stopped target with a non-positive input stays where it is
+        accel = np.where((target_v == 0) & (target_a <= 0), 0., target_a)
+
+        jump = np.ones(rows.size, dtype=int)
+        q = np.flatnonzero(quiet)
+        if q.size:
+            t_event = time_to_event(distance[q], target_x[q] >= ego_x[q], ego_v[q], target_v[q], accel[q],
+                                    np.where(target_a[q] != target_decel[q], target_decel_trigger[q], np.nan))
+            # Steps k+1 .. k+jump-1 are quiet as well, step k+jump is simulated normally again
+            steps_to_event = np.ceil(np.minimum(t_event / dt, num_steps) - EVENT_MARGIN)
+            jump[q] = np.clip(steps_to_event, 1, num_steps - step[q])
+
+        # Single steps, exactly like the batch engine
+        new_ego_v = np.maximum(ego_v + ego_a * dt, 0)
+        new_target_v = np.maximum(target_v + target_a * dt, 0)
+        new_ego_x = ego_x + (ego_v + new_ego_v) * dt / 2.
+        new_target_x = target_x + (target_v + new_target_v) * dt / 2.
+
+        skip = np.flatnonzero(jump > 1)
+        if skip.size:
+            # The whole stretch at once; the ego speed stays put
+            length = jump[skip]
+            ego_xs, _ = _stretch(ego_x[skip], ego_v[skip], np.zeros(skip.size), length, dt)
+            target_xs, target_vs = _stretch(target_x[skip], target_v[skip], target_a[skip], length, dt)
+            end, last = length[:, None], length[:, None] - 1
+            new_ego_x[skip] = np.take_along_axis(ego_xs, end, axis=1)[:, 0]
+            new_ego_v[skip] = ego_v[skip]
+            new_target_x[skip] = np.take_along_axis(target_xs, end, axis=1)[:, 0]
+            new_target_v[skip] = np.take_along_axis(target_vs, end, axis=1)[:, 0]
+
+            # The ego input after the stretch is the command of its last step (the gate stays open)
+            last_distance = np.maximum(np.abs(np.take_along_axis(target_xs, last, axis=1)[:, 0] -
+                                              np.take_along_axis(ego_xs, last, axis=1)[:, 0]) - CAR_LENGTH, 0.)
+            last_acc, last_aeb = _commands(last_distance, ego_v[skip], np.take_along_axis(target_vs, last, axis=1)[:, 0],
+                                           cruise_speed[skip])
+            ego_a[skip] = np.where(last_aeb < last_acc, last_aeb, last_acc)
+
+        ego_x, ego_v, target_x, target_v = new_ego_x, new_ego_v, new_target_x, new_target_v
+        step = step + jump
+
+        # Check for collision
+        hit = np.abs(target_x - ego_x) <= CAR_LENGTH
+        done = hit | (step >= num_steps)
+
+        # Stop scenarios once the outcome can no longer change
+        if early_termination:
+            distance = np.maximum(np.abs(target_x - ego_x) - CAR_LENGTH, 0.)
+            done |= TerminationCriteria(cruise_speed=cruise_speed).settled(
+                distance, ego_v, target_v, ego_a, target_a, target_x >= ego_x) != NOT_SETTLED
+
+        if done.any():
+            # Record the finished scenarios and drop them from the simulated state
+            finished = rows[done]
+            collision_occurred[rows[hit]] = True
+            impact_speed[rows[hit]] = np.abs(ego_v[hit] - target_v[hit]) * 3.6  # Convert to kph
+            aeb_triggered[finished] = triggered[done]
+            final_ego_v[finished] = ego_v[done]
+
+            keep = ~done
+            rows, step = rows[keep], step[keep]
+            ego_x, ego_v, target_x, target_v = ego_x[keep], ego_v[keep], target_x[keep], target_v[keep]
+            target_decel, target_decel_trigger, cruise_speed = target_decel[keep], target_decel_trigger[keep], cruise_speed[keep]
+            ego_a, target_a = ego_a[keep], target_a[keep]
+            commanded_deceleration, command_time, triggered = commanded_deceleration[keep], command_time[keep], triggered[keep]
+
+    initial_speed = params[:, 1] * 3.6  # Convert to kph
+    final_speed = final_ego_v * 3.6     # Convert to kph
+
+    return {
+        'collision_occurred': collision_occurred,
+        'impact_speed': impact_speed,
+        'aeb_triggered': aeb_triggered,
+        'speed_reduction': initial_speed - final_speed
+    }
@@ -0,0 +1,178 @@
+import numpy as np
+from AEB_algo import BatchAEBController
+from ACC_algo import BatchACCController
+from termination import TerminationCriteria, NOT_SETTLED
+
+# Column order of the scenario parameter array (speeds in m/s, same units as the run_aeb_simulation config)
+PARAM_COLUMNS = ['ego_start_x', 'ego_speed', 'target_start_x', 'target_speed', 'target_decel', 'target_decel_trigger']
+
+CAR_LENGTH = 4.  # agents.Car is 4m x 2m; both cars drive along the same lane with heading 0
+
+# Simulation state at the start of a step, one array per entry (run_aeb_batch start_state and on_step):
+# the vehicles, the AEB triggered flag of the sim loop and the BatchAEBController state
+STATE_KEYS = ['step', 'ego_x', 'ego_v', 'target_x', 'target_v', 'ego_a', 'target_a', 'triggered',
+              *BatchAEBController.STATE_KEYS]
+
+
+def params_from_samples(df_samples):
+    """Build the N x 6 parameter array from an LHS sample DataFrame (speeds in kph)"""
+    return np.column_stack([
+        df_samples['ego_start_x'].to_numpy(dtype=float),
+        df_samples['ego_start_speed'].to_numpy(dtype=float) / 3.6,  # Convert from kph to m/s
+        df_samples['target_start_x'].to_numpy(dtype=float),
+        df_samples['target_start_speed'].to_numpy(dtype=float) / 3.6,  # Convert from kph to m/s
+        df_samples['target_decel'].to_numpy(dtype=float),
+        df_samples['target_decel_trigger'].to_numpy(dtype=float),
+    ])
+
+
+def run_aeb_batch(params, dt=0.1, num_steps=200, early_termination=False, start_state=None, on_step=None,
+                  aeb_params=None, acc_params=None):
+    """
+    Vectorized version of Combined_SIM_LOOP.run_aeb_simulation (ACC + AEB, no visualization).
+
+    All N scenarios are advanced in lockstep as NumPy arrays. Every step follows the scalar loop:
+    target decel trigger -> ACC command -> AEB command -> arbitration -> latency gated control -> tick -> collision check.
+    A scenario stops as soon as it collides, exactly like the `break` in the scalar loop, and finished
+    scenarios are dropped from the arrays so the remaining steps only cost what is still running.
+
+    Args:
+        params: N x 6 array, columns as in PARAM_COLUMNS (speeds in m/s)
+        dt: simulation time step (seconds)
+        num_steps: maximum number of steps per scenario
+        early_termination: freeze scenarios whose outcome is settled (see termination.TerminationCriteria),
+            speed_reduction is then measured at termination time
+        start_state: continue the scenarios from the middle of a run instead of their initial conditions, a dict
+            of length-N arrays with the STATE_KEYS entries ('step' = first step to simulate, per scenario)
+        on_step: called at the start of every step (before the target decel trigger) as on_step(rows, state),
+            rows = indices of the running scenarios, state = dict of their STATE_KEYS arrays plus 'distance'.
+            It may return a boolean mask of the running scenarios to stop after this step (e.g. because they are
+            continued elsewhere), their results are then those of the stopped state
+        aeb_params, acc_params: controller calibration (AEB_algo.AEBParams, ACC_algo.ACCParams, the module
+            constants by default), single values or per-scenario arrays
+
+    Returns:
+        dict of length-N arrays: collision_occurred, impact_speed (kph), aeb_triggered, speed_reduction (kph) and
+        the AEB activation times fcw_time, soft_brake_time, hard_brake_time (s, nan if never activated)
+    """
+    params = np.atleast_2d(np.asarray(params, dtype=float))
+    n = params.shape[0]
+
+    # Results, written when a scenario finishes
+    collision_occurred = np.zeros(n, dtype=bool)
+    impact_speed = np.zeros(n)
+    aeb_triggered = np.zeros(n, dtype=bool)
+    final_ego_v = np.zeros(n)
+    activation_time = {event: np.full(n, np.nan) for event, _ in BatchAEBController.EVENTS}
+
+    # Only unfinished scenarios are simulated, `rows` maps them back to the input order
+    rows = np.arange(n)
+    ego_x = params[:, 0].copy()
+    ego_v = params[:, 1].copy()
+    target_x = params[:, 2].copy()
+    target_v = params[:, 3].copy()
+    target_decel = params[:, 4].copy()
+    target_decel_trigger = params[:, 5].copy()
+
+    # Controllers, the ACC cruise speed is set in kph like ACCController.set_desired_cruise_speed
+    acc = BatchACCController(params[:, 1] * 3.6, acc_params)
+    aeb = BatchAEBController(n, aeb_params)
+
+    # Vehicle inputs (Entity.inputAcceleration)
+    ego_a = np.zeros(n)
+    target_a = np.zeros(n)
+    triggered = np.zeros(n, dtype=bool)
+
+    # Step of every scenario, they all start at 0 unless a start state says otherwise
+    step = np.zeros(n, dtype=int)
+    if start_state is not None:
+        step = np.asarray(start_state['step'], dtype=int).copy()
+        ego_x, ego_v = start_state['ego_x'].astype(float), start_state['ego_v'].astype(float)
+        target_x, target_v = start_state['target_x'].astype(float), start_state['target_v'].astype(float)
+        ego_a, target_a = start_state['ego_a'].astype(float), start_state['target_a'].astype(float)
+        triggered = start_state['triggered'].astype(bool)
+        aeb.set_state(start_state)
+
+    for j in range(num_steps - (step.min() if n else 0)):
+        k = step + j
+        current_time = k * dt
+        distance = np.maximum(np.abs(target_x - ego_x) - CAR_LENGTH, 0.)
+        stop = None
+        if on_step is not None:
+            stop = on_step(rows, {'step': k, 'ego_x': ego_x, 'ego_v': ego_v, 'target_x': target_x, 'target_v': target_v,
+                           'ego_a': ego_a, 'target_a': target_a, 'triggered': triggered,
+                           **{key: getattr(aeb, key) for key in aeb.STATE_KEYS}, 'distance': distance})
+
+        # Trigger deceleration if within specified distance (the control stays set afterwards)
+        target_a = np.where(distance <= target_decel_trigger, target_decel, target_a)
+
+        # ACC and AEB commands
+        acc_command = acc.acc_control_loop(distance, ego_v)
+        applied_decel = aeb.calculate_control(distance, ego_v, target_v, current_time)['applied_decel']
+
+        # Arbitration: AEB wins when it is more aggressive than ACC
+        use_aeb = applied_decel < acc_command
+        final_command = np.where(use_aeb, applied_decel, acc_command)
+        triggered |= use_aeb & (np.abs(applied_decel) > 0.1)
+
+        # Apply control after latency
+        ego_a = np.where(current_time >= aeb.command_time + aeb.params.system_latency, final_command, ego_a)
+
+        # Tick (kinematic bicycle model with zero steering and heading reduces to this)
+        new_ego_v = np.maximum(ego_v + ego_a * dt, 0)
+        new_target_v = np.maximum(target_v + target_a * dt, 0)
+        ego_x = ego_x + (ego_v + new_ego_v) * dt / 2.
+        target_x = target_x + (target_v + new_target_v) * dt / 2.
+        ego_v = new_ego_v
+        target_v = new_target_v
+
+        # Check for collision
+        hit = np.abs(target_x - ego_x) <= CAR_LENGTH
+        done = hit | (k + 1 >= num_steps)  # scenarios that started later run out of steps earlier
+
+        # Stop scenarios once the outcome can no longer change
+        if early_termination:
+            distance = np.maximum(np.abs(target_x - ego_x) - CAR_LENGTH, 0.)
+            settled = TerminationCriteria(acc.desired_cruise_speed / 3.6, aeb.params.system_latency,
+                                          acc.params.min_following_distance, acc.params.detection_range).settled(
+                distance, ego_v, target_v, ego_a, target_a, target_x >= ego_x) != NOT_SETTLED
+            done = done | settled
+        if stop is not None:
+            done = done | stop
+
+        if done.any():
+            # Record the finished scenarios and drop them from the simulated state
+            finished = rows[done]
+            collision_occurred[rows[hit]] = True
+            impact_speed[rows[hit]] = np.abs(ego_v[hit] - target_v[hit]) * 3.6  # Convert to kph
+            aeb_triggered[finished] = triggered[done]
+            final_ego_v[finished] = ego_v[done]
+            for event, _ in BatchAEBController.EVENTS:
+                activation_time[event][finished] = getattr(aeb, f"{event}_time")[done]
+
+            keep = ~done
+            rows = rows[keep]
+            ego_x, ego_v, target_x, target_v = ego_x[keep], ego_v[keep], target_x[keep], target_v[keep]
+            target_decel, target_decel_trigger = target_decel[keep], target_decel_trigger[keep]
+            ego_a, target_a, step, triggered = ego_a[keep], target_a[keep], step[keep], triggered[keep]
+            acc.take(keep)
+            aeb.take(keep)
+            if not rows.size:
+                break
+
+    # Scenarios that ran for all steps
+    aeb_triggered[rows] = triggered
+    final_ego_v[rows] = ego_v
+    for event, _ in BatchAEBController.EVENTS:
+        activation_time[event][rows] = getattr(aeb, f"{event}_time")
+
+    initial_speed = params[:, 1] * 3.6  # Convert to kph
+    final_speed = final_ego_v * 3.6     # Convert to kph
+
+    return {
+        'collision_occurred': collision_occurred,
+        'impact_speed': impact_speed,
+        'aeb_triggered': aeb_triggered,
+        'speed_reduction': initial_speed - final_speed,
+        **{f"{event}_time": times for event, times in activation_time.items()}
+    }
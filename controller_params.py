@@ -0,0 +1,28 @@
+import numpy as np
+
+
+class ControllerParams:
+    """
+    Base of the controller calibrations (AEB_algo.AEBParams, ACC_algo.ACCParams): a fixed set of named entries,
+    FIELDS, each a single value or (in the batch controllers) an array with one value per scenario.
+    """
+    FIELDS = ()
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def replace(self, **changes):
+        """Copy with some entries changed"""
+        return type(self)(**{**self.as_dict(), **changes})
+
+    def take(self, index):
+        """Copy with the per-scenario entries reduced to the selected scenarios (mask or index array)"""
+        return type(self)(**{field: value[index] if np.ndim(value) else value
+                             for field, value in self.as_dict().items()})
+
+    def __eq__(self, other):
+        return type(other) is type(self) and all(np.array_equal(value, getattr(other, field))
+                                                 for field, value in self.as_dict().items())
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{k}={v!r}' for k, v in self.as_dict().items())})"
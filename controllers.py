@@ -0,0 +1,172 @@
+import numpy as np
+from AEB_algo import AEBParams
+from ACC_algo import ACCParams
+from batch_sim import run_aeb_batch, STATE_KEYS
+
+
+class ControllerVariant:
+    """
+    A named AEB + ACC calibration (AEB_algo.AEBParams and ACC_algo.ACCParams, the module constants by default).
+    A variant is one calibration for all scenarios, its entries are single values (run_variants builds the
+    per-scenario arrays itself).
+    """
+    def __init__(self, name, aeb=None, acc=None, description=''):
+        self.name = name
+        self.aeb = aeb if aeb is not None else AEBParams()
+        self.acc = acc if acc is not None else ACCParams()
+        self.description = description
+        for params in (self.aeb, self.acc):
+            arrays = [field for field, value in params.as_dict().items() if np.ndim(value)]
+            if arrays:
+                raise ValueError(f"Controller variant '{name}': {type(params).__name__} entries must be single "
+                                 f"values, got arrays for {', '.join(arrays)}")
+
+    def trunk_key(self):
+        """
+        Variants with the same key drive identical trajectories until the TTC reaches one of their AEB thresholds:
+        before that every AEB command is 0 and the ego follows the ACC, which depends on the ACC calibration only
+        (the system latency is part of the key as it also bounds early termination)
+        """
+        return tuple(self.acc.as_dict().values()) + (self.aeb.system_latency,)
+
+    def __repr__(self):
+        return f"ControllerVariant({self.name!r}, {self.aeb!r}, {self.acc!r})"
+
+
+# Registry of controller calibrations, see register_variant and get_variant
+VARIANTS = {}
+
+
+def register_variant(variant):
+    """Add a calibration to the registry (replacing one of the same name) and return it"""
+    VARIANTS[variant.name] = variant
+    return variant
+
+
+def get_variant(variant):
+    """Registered variant by name (ControllerVariant objects are passed through)"""
+    if isinstance(variant, ControllerVariant):
+        return variant
+    if variant not in VARIANTS:
+        raise ValueError(f"Unknown controller variant '{variant}', registered: {', '.join(VARIANTS)}")
+    return VARIANTS[variant]
+
+
+register_variant(ControllerVariant('baseline', description='AEB_algo and ACC_algo module constants'))
+register_variant(ControllerVariant(
+    'llm_gui', AEBParams(fcw_ttc=2.5, soft_brake_ttc=1.7, full_brake_ttc=1.0, max_full_brake=-6.0),
+    description='thresholds of the LLM_scn_gen plots: later FCW and soft brake, hard brake at 1.0 s limited to -6 m/s²'))
+
+
+def stack_params(params, counts):
+    """Per-scenario params for blocks of scenarios: params[i] for the next counts[i] rows (e.g. one block per variant)"""
+    values = [param.as_dict() for param in params]
+    return type(params[0])(**{field: np.repeat([value[field] for value in values], counts)
+                              for field in params[0].FIELDS})
+
+
+def run_variants(params, variants=('baseline',), dt=0.1, num_steps=200, early_termination=False,
+                 return_stats=False):
+    """
+    run_aeb_batch of the same scenarios (N x 6 params, batch_sim.PARAM_COLUMNS) under several controller
+    calibrations in one pass. Returns {variant name: run_aeb_batch result}.
+
+    Variants with the same trunk_key share their trajectories up to divergence:
+    1. every scenario is simulated once as a trunk, with the calibration of the first variant of the group
+    2. at the first step where the TTC reaches the largest threshold of the group (FCW, soft or hard brake of any
+       variant), the scenario stops in the trunk and forks: one copy per variant continues from the trunk state
+    3. the forks of all variants run together in one batch, with per-scenario AEB params
+    Scenarios that never fork take the trunk result for every variant. Until the fork no variant has an AEB
+    command or an activation event, so the results are exactly those of separate run_aeb_batch calls.
+
+    With return_stats=True also returns counts of the simulated scenario steps (trunk and forks) and of the
+    steps separate runs per variant would have taken (the trunks once per variant).
+    """
+    params = np.atleast_2d(np.asarray(params, dtype=float))
+    n = params.shape[0]
+    variants = [get_variant(variant) for variant in variants]
+    groups = {}
+    for variant in variants:
+        groups.setdefault(variant.trunk_key(), []).append(variant)
+
+    results = {}
+    stats = {'scenarios': n, 'variants': len(variants), 'forks': 0, 'trunk_steps': 0, 'fork_steps': 0,
+             'separate_steps': 0}
+
+    def count_steps(counter):
+        def on_step(rows, state):
+            stats[counter] += rows.size
+        return on_step
+
+    for members in groups.values():
+        first = members[0]
+        if len(members) == 1:
+            results[first.name] = run_aeb_batch(params, dt, num_steps, early_termination, aeb_params=first.aeb,
+                                                acc_params=first.acc, on_step=count_steps('trunk_steps'))
+            continue
+
+        fork_ttc = max(max(variant.aeb.fcw_ttc, variant.aeb.soft_brake_ttc, variant.aeb.full_brake_ttc)
+                       for variant in members)
+        fork_rows, fork_states = [], []
+        trunk_steps = stats['trunk_steps']
+
+        def capture_forks(rows, state):
+            stats['trunk_steps'] += rows.size
+            # TTC as the controllers compute it at this step
+            closing = state['ego_v'] - state['target_v']
+            ttc = np.divide(state['distance'], closing, out=np.full(rows.size, np.inf), where=closing > 0)
+            fork = ttc <= fork_ttc
+            if fork.any():
+                fork_rows.append(rows[fork])
+                fork_states.append({key: state[key][fork].copy() for key in STATE_KEYS})
+            return fork
+
+        trunk = run_aeb_batch(params, dt, num_steps, early_termination, aeb_params=first.aeb, acc_params=first.acc,
+                              on_step=capture_forks)
+        stats['separate_steps'] += (stats['trunk_steps'] - trunk_steps) * (len(members) - 1)
+        group_results = {variant.name: {key: values.copy() for key, values in trunk.items()} for variant in members}
+
+        if fork_rows:
+            rows = np.concatenate(fork_rows)
+            start_state = {key: np.concatenate([states[key] for states in fork_states]) for key in STATE_KEYS}
+            copies = len(members)
+            stats['forks'] += rows.size * copies
+            forks = run_aeb_batch(np.tile(params[rows], (copies, 1)), dt, num_steps, early_termination,
+                                  start_state={key: np.tile(values, copies) for key, values in start_state.items()},
+                                  on_step=count_steps('fork_steps'),
+                                  aeb_params=stack_params([variant.aeb for variant in members], [rows.size] * copies),
+                                  acc_params=first.acc)
+            for i, variant in enumerate(members):
+                for key, values in forks.items():
+                    group_results[variant.name][key][rows] = values[i * rows.size:(i + 1) * rows.size]
+        results.update(group_results)
+
+    # results in the order the variants were given
+    results = {variant.name: results[variant.name] for variant in variants}
+    if return_stats:
+        stats['steps'] = stats['trunk_steps'] + stats['fork_steps']
+        stats['separate_steps'] += stats['steps']
+        return results, stats
+    return results
+
+
+if __name__ == "__main__":
+    import time
+    import pandas as pd
+    from samplers import ScenarioSampler
+    from LHS_filter import param_ranges
+    from batch_sim import params_from_samples
+
+    # Calibration study: the registered variants on the same LHS scenarios
+    params = params_from_samples(ScenarioSampler(param_ranges, seed=0).sample(20000))
+    start = time.perf_counter()
+    results, stats = run_variants(params, list(VARIANTS), return_stats=True)
+    elapsed = time.perf_counter() - start
+    summary = pd.DataFrame({name: {'collision_rate': result['collision_occurred'].mean(),
+                                   'mean_impact_speed_kph': result['impact_speed'][result['collision_occurred']].mean(),
+                                   'aeb_trigger_rate': result['aeb_triggered'].mean(),
+                                   'fcw_rate': np.isfinite(result['fcw_time']).mean()}
+                            for name, result in results.items()}).T
+    print(summary)
+    print(f"{len(params)} scenarios x {len(results)} variants in {elapsed:.2f}s, {stats['steps']} scenario steps "
+          f"simulated instead of {stats['separate_steps']} for separate runs")
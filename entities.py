@@ -1,12 +1,15 @@
 import numpy as np
+import math
 from geometry import Point, Rectangle, Circle, Ring
 from typing import Union
 import copy
 
+# Entries of the state vector of a movable entity (Entity.get_state / set_state, World.snapshot)
+STATE_FIELDS = ('x', 'y', 'heading', 'vx', 'vy', 'acceleration', 'angular_velocity', 'inputSteering', 'inputAcceleration')
 
 class Entity:
     def __init__(self, center: Point, heading: float, movable: bool = True, friction: float = 0):
-        self.center = center # this is x, y
+        self.center = Point(center.x, center.y) # this is x, y (own copy, tick updates it in place)
         self.heading = heading
         self.movable = movable
         self.color = 'ghost white'
@@ -35,7 +38,7 @@ class Entity:
             # only for this function, we assume
             # (i) the longer side of the rectangle is always the nominal direction of the car
             # (ii) the center of mass is the same as the geometric center of the RectangleEntity.
-            return np.maximum(self.size.x, self.size.y) / 2.
+            return max(self.size.x, self.size.y) / 2.
         elif isinstance(self, CircleEntity):
             return self.radius
         elif isinstance(self, RingEntity):
@@ -52,15 +55,13 @@ class Entity:
             # Jason Kong, Mark Pfeiffer, Georg Schildbach, Francesco Borrelli
             lr = self.rear_dist
             lf = lr # we assume the center of mass is the same as the geometric center of the entity
-            beta = np.arctan(lr / (lf + lr) * np.tan(self.inputSteering))
+            beta = math.atan(lr / (lf + lr) * math.tan(self.inputSteering))
             
             new_angular_velocity = speed * self.inputSteering # this is not needed and used for this model, but let's keep it for consistency (and to avoid if-else statements)
             new_acceleration = self.inputAcceleration - self.friction
-            new_speed = np.clip(speed + new_acceleration * dt, self.min_speed, self.max_speed)
-            new_heading = heading + ((speed + new_speed)/lr)*np.sin(beta)*dt/2.
+            new_speed = min(max(speed + new_acceleration * dt, self.min_speed), self.max_speed)
+            new_heading = heading + ((speed + new_speed)/lr)*math.sin(beta)*dt/2.
             angle = (heading + new_heading)/2. + beta
-            new_center = self.center + (speed + new_speed)*Point(np.cos(angle), np.sin(angle))*dt / 2.
-            new_velocity = Point(new_speed * np.cos(new_heading), new_speed * np.sin(new_heading))
             
             '''
             # Point-mass dynamics based on
@@ -80,9 +81,11 @@ class Entity:
             
             '''
             
-            self.center = new_center
-            self.heading = np.mod(new_heading, 2*np.pi) # wrap the heading angle between 0 and +2pi
-            self.velocity = new_velocity
+            # update center and velocity in place (plain floats, no temporary Points)
+            self.center.set(self.center.x + (speed + new_speed)*math.cos(angle)*dt / 2.,
+                            self.center.y + (speed + new_speed)*math.sin(angle)*dt / 2.)
+            self.heading = new_heading % (2*math.pi) # wrap the heading angle between 0 and +2pi
+            self.velocity.set(new_speed * math.cos(new_heading), new_speed * math.sin(new_heading))
             self.acceleration = new_acceleration
             self.angular_velocity = new_angular_velocity
             
@@ -106,7 +109,30 @@ class Entity:
         raise NotImplementedError
         
     def copy(self):
-        return copy.deepcopy(self)
+        # shallow copy with its own Points and geometry, instead of a deepcopy of the whole object graph
+        new = copy.copy(self)
+        for name, value in vars(new).items():
+            if isinstance(value, Point):
+                setattr(new, name, Point(value.x, value.y))
+        new.obj = None
+        new.buildGeometry()
+        return new
+        
+    def get_state(self) -> tuple:
+        # kinematic state and control inputs of a movable entity as plain floats, in STATE_FIELDS order
+        return (self.center.x, self.center.y, self.heading, self.velocity.x, self.velocity.y, self.acceleration,
+                self.angular_velocity, self.inputSteering, self.inputAcceleration)
+        
+    def set_state(self, state):
+        x, y, heading, vx, vy, acceleration, angular_velocity, steering, accel = state
+        self.center.set(x, y)
+        self.velocity.set(vx, vy)
+        self.heading = heading
+        self.acceleration = acceleration
+        self.angular_velocity = angular_velocity
+        self.inputSteering = steering
+        self.inputAcceleration = accel
+        self.buildGeometry()
         
     @property
     def x(self):
@@ -145,18 +171,27 @@ class RectangleEntity(Entity):
         
     @property
     def corners(self):
-        ec = self.edge_centers
-        c = np.array([self.center.x, self.center.y])
-        corners = []
-        corners.append(Point(*(ec[1] + ec[0] - c)))
-        corners.append(Point(*(ec[2] + ec[1] - c)))
-        corners.append(Point(*(ec[3] + ec[2] - c)))
-        corners.append(Point(*(ec[0] + ec[3] - c)))
-        return corners
+        return [Point(x, y) for x, y in self.corner_coords()]
+        
+    def corner_coords(self):
+        # corners as plain float tuples, ordered like edge_centers: (front, left), (left, rear), (rear, right), (right, front)
+        x = self.center.x
+        y = self.center.y
+        c = math.cos(self.heading)
+        s = math.sin(self.heading)
+        wx, wy = self.size.x / 2. * c, self.size.x / 2. * s # half length along the heading
+        hx, hy = -self.size.y / 2. * s, self.size.y / 2. * c # half width to the left
+        return ((x + wx + hx, y + wy + hy),
+                (x - wx + hx, y - wy + hy),
+                (x - wx - hx, y - wy - hy),
+                (x + wx - hx, y + wy - hy))
         
     def buildGeometry(self):
-        C = self.corners
-        self.obj = Rectangle(*C[:-1])
+        (x1, y1), (x2, y2), (x3, y3), _ = self.corner_coords()
+        if getattr(self, 'obj', None) is None:
+            self.obj = Rectangle(Point(x1, y1), Point(x2, y2), Point(x3, y3))
+        else:
+            self.obj.update(x1, y1, x2, y2, x3, y3) # reuse the Rectangle (and its cached edges)
         
 class CircleEntity(Entity):
     def __init__(self, center: Point, heading: float, radius: float, movable: bool = True, friction: float = 0):
@@ -165,7 +200,11 @@ class CircleEntity(Entity):
         self.buildGeometry()
         
     def buildGeometry(self):
-        self.obj = Circle(self.center, self.radius)
+        if getattr(self, 'obj', None) is None:
+            self.obj = Circle(self.center, self.radius)
+        else:
+            self.obj.m = self.center
+            self.obj.r = self.radius
                     
 class RingEntity(Entity):
     def __init__(self, center: Point, heading: float, inner_radius: float, outer_radius: float, movable: bool = True, friction: float = 0):
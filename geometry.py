@@ -1,8 +1,11 @@
 import numpy as np
+import math
 from typing import Union
 
 
 class Point:
+    __slots__ = ('x', 'y')
+    
     def __init__(self, x: float, y: float):
         self.x = float(x)
         self.y = float(y)
@@ -10,13 +13,30 @@ class Point:
     def __str__(self):
         return 'Point(' + str(self.x) + ', ' + str(self.y) + ')'
         
+    def set(self, x: float, y: float) -> 'Point': # in-place update, avoids allocating a new Point
+        self.x = float(x)
+        self.y = float(y)
+        return self
+        
     def __add__(self, other: 'Point') -> 'Point':
         return Point(self.x + other.x, self.y + other.y)
         
     def __sub__(self, other: 'Point') -> 'Point':
         return Point(self.x - other.x, self.y - other.y)
+        
+    def __iadd__(self, other: 'Point') -> 'Point':
+        self.x += other.x
+        self.y += other.y
+        return self
+        
+    def __isub__(self, other: 'Point') -> 'Point':
+        self.x -= other.x
+        self.y -= other.y
+        return self
     
     def norm(self, p: int = 2) -> float:
+        if p == 2:
+            return math.hypot(self.x, self.y)
         return (self.x ** p + self.y ** p)**(1./p)
         
     def dot(self, other: 'Point') -> float:
@@ -28,9 +48,17 @@ class Point:
     def __rmul__(self, other: float) -> 'Point':
         return self.__mul__(other)
         
+    def __imul__(self, other: float) -> 'Point':
+        self.x *= other
+        self.y *= other
+        return self
+        
     def __truediv__(self, other: float) -> 'Point':
         return self.__mul__(1./other)
         
+    def __itruediv__(self, other: float) -> 'Point':
+        return self.__imul__(1./other)
+        
         
     def isInside(self, other: Union['Line', 'Rectangle', 'Circle', 'Ring']) -> bool:
         if isinstance(other, Line):
@@ -40,12 +68,13 @@ class Point:
         
         elif isinstance(other, Rectangle):
             # Based on https://stackoverflow.com/a/2763387
-            AB = Line(other.c1, other.c2)
-            AM = Line(other.c1, self)
-            BC = Line(other.c2, other.c3)
-            BM = Line(other.c2, self)
+            a, b, c = other.c1, other.c2, other.c3
+            ABx, ABy = b.x - a.x, b.y - a.y
+            BCx, BCy = c.x - b.x, c.y - b.y
+            AB_AM = ABx * (self.x - a.x) + ABy * (self.y - a.y)
+            BC_BM = BCx * (self.x - b.x) + BCy * (self.y - b.y)
         
-            return 0 <= AB.dot(AM) <= AB.dot(AB) and 0 <= BC.dot(BM) <= BC.dot(BC)
+            return 0 <= AB_AM <= ABx * ABx + ABy * ABy and 0 <= BC_BM <= BCx * BCx + BCy * BCy
             
         elif isinstance(other, Circle):
             return self.distanceTo(other.m) <= other.r
@@ -72,26 +101,23 @@ class Point:
                     
     def distanceTo(self, other: Union['Point', 'Line', 'Rectangle', 'Circle', 'Ring']) -> float:
         if isinstance(other, Point):
-            return (self - other).norm(p = 2)
+            return math.hypot(self.x - other.x, self.y - other.y)
     
         elif isinstance(other, Line):
             # Based on https://math.stackexchange.com/a/330329
-            s2_minus_s1 = other.p2 - other.p1
-            that = (self - other.p1).dot(s2_minus_s1) / s2_minus_s1.dot(s2_minus_s1)
-            tstar = np.minimum(1, np.maximum(0, that))
-            return (other.p1 + tstar * s2_minus_s1 - self).norm(p = 2)
+            return pointSegmentDistance(self.x, self.y, other.p1.x, other.p1.y, other.p2.x, other.p2.y)
         
         elif isinstance(other, Rectangle):
             if self.isInside(other): return 0
             E = other.edges
-            return np.min([self.distanceTo(e) for e in E])
+            return min([self.distanceTo(e) for e in E])
         
         elif isinstance(other, Circle):
-            return np.maximum(0, self.distanceTo(other.m) - other.r)
+            return max(0, self.distanceTo(other.m) - other.r)
             
         elif isinstance(other, Ring):
             d = self.distanceTo(other.m)
-            return np.max([r_inner - d, d - r_outer, 0])
+            return max(other.r_inner - d, d - other.r_outer, 0)
             
         else:
             try:
@@ -101,13 +127,24 @@ class Point:
             print('Something went wrong!')
             raise
         
+'''
+Distance from point (px, py) to the segment (x1, y1)-(x2, y2), on plain floats
+'''
+def pointSegmentDistance(px: float, py: float, x1: float, y1: float, x2: float, y2: float) -> float:
+    dx = x2 - x1
+    dy = y2 - y1
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0: return math.hypot(px - x1, py - y1)
+    tstar = min(1., max(0., ((px - x1) * dx + (py - y1) * dy) / length_sq))
+    return math.hypot(x1 + tstar * dx - px, y1 + tstar * dy - py)
+
 '''
 Given three colinear points p, q, r, the function checks if 
 point q lies on line segment 'pr' 
 '''
 def onSegment(p: Point, q: Point, r: Point) -> bool:
-    return (q.x <= np.maximum(p.x, r.x) and q.x >= np.minimum(p.x, r.x) and 
-        q.y <= np.maximum(p.y, r.y) and q.y >= np.minimum(p.y, r.y)) 
+    return (q.x <= max(p.x, r.x) and q.x >= min(p.x, r.x) and 
+        q.y <= max(p.y, r.y) and q.y >= min(p.y, r.y)) 
   
 '''
 To find orientation of ordered triplet (p, q, r). 
@@ -123,7 +160,41 @@ def orientation(p: Point, q: Point, r: Point) -> int:
     return 1 if val > 0 else 2 # clock or counterclock wise 
         
         
+'''
+Separating axis test for two (oriented) rectangles. The candidate axes are the edge directions of both
+rectangles; they overlap (touching included) unless the corner projections on one of the axes are disjoint.
+'''
+def rectanglesOverlap(a: 'Rectangle', b: 'Rectangle') -> bool:
+    A = ((a.c1.x, a.c1.y), (a.c2.x, a.c2.y), (a.c3.x, a.c3.y), (a.c4.x, a.c4.y))
+    B = ((b.c1.x, b.c1.y), (b.c2.x, b.c2.y), (b.c3.x, b.c3.y), (b.c4.x, b.c4.y))
+    for P in (A, B):
+        for (x1, y1), (x2, y2) in ((P[0], P[1]), (P[1], P[2])):
+            ax, ay = x2 - x1, y2 - y1
+            projA = [x * ax + y * ay for x, y in A]
+            projB = [x * ax + y * ay for x, y in B]
+            if max(projA) < min(projB) or max(projB) < min(projA): return False
+    return True
+
+'''
+Minimum distance between two (oriented) rectangles: 0 if they overlap, otherwise the smallest
+corner-to-edge distance in either direction (exact for disjoint convex polygons).
+'''
+def rectangleDistance(a: 'Rectangle', b: 'Rectangle') -> float:
+    if rectanglesOverlap(a, b): return 0.
+    A = ((a.c1.x, a.c1.y), (a.c2.x, a.c2.y), (a.c3.x, a.c3.y), (a.c4.x, a.c4.y))
+    B = ((b.c1.x, b.c1.y), (b.c2.x, b.c2.y), (b.c3.x, b.c3.y), (b.c4.x, b.c4.y))
+    d = math.inf
+    for P, Q in ((A, B), (B, A)):
+        for i in range(4):
+            x1, y1 = Q[i]
+            x2, y2 = Q[(i + 1) % 4]
+            for px, py in P:
+                d = min(d, pointSegmentDistance(px, py, x1, y1, x2, y2))
+    return d
+
 class Line:
+    __slots__ = ('p1', 'p2')
+    
     def __init__(self, p1: Point, p2: Point):
         self.p1 = p1
         self.p2 = p2
@@ -198,54 +269,72 @@ class Line:
             
         elif isinstance(other, Line):
             if self.intersectsWith(other): return 0.
-            return np.min([self.p1.distanceTo(other.p1), self.p1.distanceTo(other.p2), self.p2.distanceTo(other.p1), self.p2.distanceTo(other.p2)])
+            return min(self.p1.distanceTo(other.p1), self.p1.distanceTo(other.p2), self.p2.distanceTo(other.p1), self.p2.distanceTo(other.p2))
             
         elif isinstance(other, Rectangle):
             if self.intersectsWith(other): return 0.
             other_edges = other.edges
-            return np.min([self.distanceTo(e) for e in other_edges])
+            return min([self.distanceTo(e) for e in other_edges])
             
         elif isinstance(other, Circle):
-            return np.maximum(0, other.m.distanceTo(self) - other.r)
+            return max(0, other.m.distanceTo(self) - other.r)
             
         elif isinstance(other, Ring):
             if self.intersectsWith(other): return 0.
             p1m = self.p1.distanceTo(other.m)
             if p1m < other.r_inner: # the line is inside the ring
                 p2m = self.p2.distanceTo(other.m)
-                return other.r_inner - np.maximum(p1m, p2m)
+                return other.r_inner - max(p1m, p2m)
             else: # the line is completely outside
-                return np.maximum(0, other.m.distanceTo(self) - other.r_outer)   
+                return max(0, other.m.distanceTo(self) - other.r_outer)   
                 
         raise NotImplementedError
 
 class Rectangle:
+    __slots__ = ('c1', 'c2', 'c3', 'c4', '_edges')
+    
     def __init__(self, c1: Point, c2: Point, c3: Point): # 3 points are enough to represent a rectangle
         self.c1 = c1
         self.c2 = c2
         self.c3 = c3
         self.c4 = c3 + c1 - c2
+        self._edges = None
         
     def __str__(self):
         return 'Rectangle(' + str(self.c1) +  ', ' + str(self.c2) +  ', ' + str(self.c3) +  ', ' + str(self.c4) + ')'
         
+    def update(self, x1: float, y1: float, x2: float, y2: float, x3: float, y3: float) -> 'Rectangle':
+        # moves the corners in place, the cached edges share the corner Points so they stay valid
+        self.c1.set(x1, y1)
+        self.c2.set(x2, y2)
+        self.c3.set(x3, y3)
+        self.c4.set(x3 + x1 - x2, y3 + y1 - y2)
+        return self
+        
     @property
     def edges(self):
-        e1 = Line(self.c1, self.c2)
-        e2 = Line(self.c2, self.c3)
-        e3 = Line(self.c3, self.c4)
-        e4 = Line(self.c4, self.c1)
-        return [e1, e2, e3, e4]
+        if self._edges is None:
+            self._edges = [Line(self.c1, self.c2), Line(self.c2, self.c3), Line(self.c3, self.c4), Line(self.c4, self.c1)]
+        return self._edges
 
     @property
     def corners(self):
         return [self.c1, self.c2, self.c3, self.c4]
         
+    @property
+    def aabb(self): # axis aligned bounding box (xmin, ymin, xmax, ymax)
+        xs = (self.c1.x, self.c2.x, self.c3.x, self.c4.x)
+        ys = (self.c1.y, self.c2.y, self.c3.y, self.c4.y)
+        return (min(xs), min(ys), max(xs), max(ys))
+        
     def intersectsWith(self, other: Union['Line', 'Rectangle', 'Circle', 'Ring']) -> bool:
         if isinstance(other, Line):
             return other.intersectsWith(self)
             
-        elif isinstance(other, Rectangle) or isinstance(other, Circle) or isinstance(other, Ring):
+        elif isinstance(other, Rectangle):
+            return rectanglesOverlap(self, other)
+            
+        elif isinstance(other, Circle) or isinstance(other, Ring):
             E = self.edges
             for e in E:
                 if e.intersectsWith(other): return True
@@ -261,15 +350,20 @@ class Rectangle:
         if isinstance(other, Point) or isinstance(other, Line):
             return other.distanceTo(self)
 
-        elif isinstance(other, Rectangle) or isinstance(other, Circle) or isinstance(other, Ring):
+        elif isinstance(other, Rectangle):
+            return rectangleDistance(self, other)
+            
+        elif isinstance(other, Circle) or isinstance(other, Ring):
             if self.intersectsWith(other): return 0.
             E = self.edges
-            return np.min([e.distanceTo(other) for e in E])
+            return min([e.distanceTo(other) for e in E])
 
         raise NotImplementedError # TODO: implement the other cases
         
     
 class Circle:
+    __slots__ = ('m', 'r')
+    
     def __init__(self, m: Point, r: float):
         self.m = m
         self.r = r
@@ -277,6 +371,10 @@ class Circle:
     def __str__(self):
         return 'Circle(' + str(self.m) +  ', radius = ' + str(self.r) + ')'
         
+    @property
+    def aabb(self): # axis aligned bounding box (xmin, ymin, xmax, ymax)
+        return (self.m.x - self.r, self.m.y - self.r, self.m.x + self.r, self.m.y + self.r)
+        
     def intersectsWith(self, other: Union['Line', 'Rectangle', 'Circle', 'Ring']):
         if isinstance(other, Line) or isinstance(other, Rectangle):
             return other.intersectsWith(self)
@@ -297,17 +395,19 @@ class Circle:
             return other.distanceTo(self)
             
         elif isinstance(other, Circle):
-            return np.maximum(0, self.m.distanceTo(other.m) - self.r - other.r)
+            return max(0, self.m.distanceTo(other.m) - self.r - other.r)
             
         elif isinstance(other, Ring):
             if self.intersectsWith(other): return 0.
             d = self.m.distanceTo(other.m)
-            return np.maximum(other.r_inner - d, d - other.r_outer) - self.r
+            return max(other.r_inner - d, d - other.r_outer) - self.r
             
         raise NotImplementedError
             
             
 class Ring:
+    __slots__ = ('m', 'r_inner', 'r_outer')
+    
     def __init__(self, m: Point, r_inner: float, r_outer: float):
         self.m = m
         assert r_inner < r_outer
@@ -317,6 +417,10 @@ class Ring:
     def __str__(self):
         return 'Ring(' + str(self.m) +  ', inner radius = ' + str(self.r_inner) +  ', outer radius = ' + str(self.r_outer) + ')'
         
+    @property
+    def aabb(self): # axis aligned bounding box (xmin, ymin, xmax, ymax)
+        return (self.m.x - self.r_outer, self.m.y - self.r_outer, self.m.x + self.r_outer, self.m.y + self.r_outer)
+        
     def intersectsWith(self, other: Union['Line', 'Rectangle', 'Circle', 'Ring']):
         if isinstance(other, Line) or isinstance(other, Rectangle) or isinstance(other, Circle):
             return other.intersectsWith(self)
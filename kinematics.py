@@ -0,0 +1,138 @@
+import math
+import numpy as np
+from entities import Entity, RectangleEntity
+
+try:  # the compiled kernel is optional, the NumPy kernel computes the same step
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Columns of an agent state array (N x 6), see bicycle_step
+X, Y, HEADING, SPEED, STEERING, ACCEL = range(6)
+STATE_COLUMNS = ('x', 'y', 'heading', 'speed', 'steering', 'accel')
+# Columns of the derived array returned by bicycle_step
+VX, VY, ACCELERATION, ANGULAR_VELOCITY = range(4)
+
+# World.tick steps the dynamic agents with the array kernel from this many simple vehicles on, below it
+# gathering and scattering the agent states costs more than the scalar Entity.tick
+array_tick_min_agents = 64
+
+
+def _bicycle_step_numpy(state, lr, friction, min_speed, max_speed, dt):
+    speed = state[:, SPEED]
+    heading = state[:, HEADING]
+    steering = state[:, STEERING]
+    beta = np.arctan(lr / (lr + lr) * np.tan(steering))
+
+    new_acceleration = state[:, ACCEL] - friction
+    new_speed = np.minimum(np.maximum(speed + new_acceleration * dt, min_speed), max_speed)
+    new_heading = heading + ((speed + new_speed) / lr) * np.sin(beta) * dt / 2.
+    angle = (heading + new_heading) / 2. + beta
+
+    derived = np.empty((len(state), 4))
+    derived[:, VX] = new_speed * np.cos(new_heading)
+    derived[:, VY] = new_speed * np.sin(new_heading)
+    derived[:, ACCELERATION] = new_acceleration
+    derived[:, ANGULAR_VELOCITY] = speed * steering
+    state[:, X] += (speed + new_speed) * np.cos(angle) * dt / 2.
+    state[:, Y] += (speed + new_speed) * np.sin(angle) * dt / 2.
+    state[:, HEADING] = new_heading % (2 * np.pi)
+    state[:, SPEED] = new_speed
+    return derived
+
+
+def _bicycle_step_loop(state, lr, friction, min_speed, max_speed, dt):
+    # same step as _bicycle_step_numpy, written per agent for numba
+    derived = np.empty((state.shape[0], 4))
+    for i in range(state.shape[0]):
+        speed = state[i, SPEED]
+        heading = state[i, HEADING]
+        beta = math.atan(lr[i] / (lr[i] + lr[i]) * math.tan(state[i, STEERING]))
+
+        new_acceleration = state[i, ACCEL] - friction[i]
+        new_speed = min(max(speed + new_acceleration * dt, min_speed[i]), max_speed[i])
+        new_heading = heading + ((speed + new_speed) / lr[i]) * math.sin(beta) * dt / 2.
+        angle = (heading + new_heading) / 2. + beta
+
+        derived[i, VX] = new_speed * math.cos(new_heading)
+        derived[i, VY] = new_speed * math.sin(new_heading)
+        derived[i, ACCELERATION] = new_acceleration
+        derived[i, ANGULAR_VELOCITY] = speed * state[i, STEERING]
+        state[i, X] += (speed + new_speed) * math.cos(angle) * dt / 2.
+        state[i, Y] += (speed + new_speed) * math.sin(angle) * dt / 2.
+        state[i, HEADING] = new_heading % (2 * math.pi)
+        state[i, SPEED] = new_speed
+    return derived
+
+
+_bicycle_step_compiled = njit(cache=True)(_bicycle_step_loop) if njit is not None else None
+
+
+def bicycle_step(state, lr, friction, min_speed, max_speed, dt):
+    """
+    One kinematic bicycle step (the dynamics of Entity.tick) for N agents at once.
+
+    state is an N x 6 float array (STATE_COLUMNS) and is updated in place: position, heading (wrapped to
+    [0, 2pi)) and speed move one step, steering and accel are the control inputs. lr (rear axle distance),
+    friction, min_speed and max_speed are length-N arrays. Returns an N x 4 array with the new velocity,
+    acceleration and angular velocity of every agent. Uses numba when it is installed.
+    """
+    if _bicycle_step_compiled is not None:
+        return _bicycle_step_compiled(state, lr, friction, min_speed, max_speed, float(dt))
+    return _bicycle_step_numpy(state, lr, friction, min_speed, max_speed, dt)
+
+
+def is_simple_vehicle(agent):
+    """Movable rectangle agents with the plain Entity.tick dynamics (e.g. Car), the ones bicycle_step can step"""
+    return agent.movable and isinstance(agent, RectangleEntity) and type(agent).tick is Entity.tick
+
+
+def rectangle_corners(state, length, width):
+    """
+    Corners of N rectangles (N x 8: c1, c2, c3, c4 as x, y pairs) in the order of RectangleEntity.corner_coords
+    and Rectangle.update, for the positions and headings of a state array
+    """
+    c, s = np.cos(state[:, HEADING]), np.sin(state[:, HEADING])
+    wx, wy = length / 2. * c, length / 2. * s  # half length along the heading
+    hx, hy = -width / 2. * s, width / 2. * c   # half width to the left
+    x, y = state[:, X], state[:, Y]
+    corners = np.empty((len(state), 8))
+    corners[:, 0], corners[:, 1] = x + wx + hx, y + wy + hy
+    corners[:, 2], corners[:, 3] = x - wx + hx, y - wy + hy
+    corners[:, 4], corners[:, 5] = x - wx - hx, y - wy - hy
+    corners[:, 6] = corners[:, 4] + corners[:, 0] - corners[:, 2]
+    corners[:, 7] = corners[:, 5] + corners[:, 1] - corners[:, 3]
+    return corners
+
+
+def gather_states(agents):
+    """
+    State array (STATE_COLUMNS) of a list of simple vehicles and their parameters as arrays: lr, friction,
+    min_speed, max_speed, length and width
+    """
+    state = np.array([(agent.center.x, agent.center.y, agent.heading, agent.speed,
+                       agent.inputSteering, agent.inputAcceleration) for agent in agents], dtype=float)
+    params = np.array([(agent.rear_dist, agent.friction, agent.min_speed, agent.max_speed, agent.size.x, agent.size.y)
+                       for agent in agents], dtype=float)
+    return state, params.T.copy()
+
+
+def scatter_states(agents, state, derived, corners):
+    """Write the stepped states and rectangle corners back to the agents (plain floats, no temporary Points)"""
+    for agent, (x, y, heading, _, _, _), (vx, vy, acceleration, angular_velocity), (x1, y1, x2, y2, x3, y3, x4, y4) \
+            in zip(agents, state.tolist(), derived.tolist(), corners.tolist()):
+        center, velocity, obj = agent.center, agent.velocity, agent.obj
+        center.x, center.y = x, y
+        velocity.x, velocity.y = vx, vy
+        agent.heading = heading
+        agent.acceleration = acceleration
+        agent.angular_velocity = angular_velocity
+        obj.c1.x, obj.c1.y, obj.c2.x, obj.c2.y = x1, y1, x2, y2
+        obj.c3.x, obj.c3.y, obj.c4.x, obj.c4.y = x3, y3, x4, y4
+
+
+def tick_agents(agents, dt):
+    """Entity.tick for a list of simple vehicles, with one bicycle_step call for all of them"""
+    state, (lr, friction, min_speed, max_speed, length, width) = gather_states(agents)
+    derived = bicycle_step(state, lr, friction, min_speed, max_speed, dt)
+    scatter_states(agents, state, derived, rectangle_corners(state, length, width))
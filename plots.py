@@ -1,14 +1,15 @@
 import matplotlib.pyplot as plt
-from AEB_algo import FCW_TTC, SOFT_BRAKE_TTC, FULL_BRAKE_TTC, MAX_SOFT_BRAKE, MAX_FULL_BRAKE, TARGET_FINAL_DISTANCE
 
 def create_aeb_plots(time_data, distance_data, speed_data, ttc_data, required_decel_data, 
                     applied_decel_data, aeb_controller, target_speed_data):
     plt.figure(figsize=(10, 15))
+    params = aeb_controller.params  # thresholds of the controller that ran the scenario
 
     # Distance plot
     plt.subplot(5, 1, 1)
     plt.plot(time_data, distance_data, label="Distance to Target (m)")
-    plt.axhline(y=TARGET_FINAL_DISTANCE, color='r', linestyle='--', label="Target Stopping Distance (3m)")
+    plt.axhline(y=params.target_final_distance, color='r', linestyle='--',
+                label=f"Target Stopping Distance ({params.target_final_distance:g}m)")
     plt.xlabel("Time (s)")
     plt.ylabel("Distance to Target (m)")
     plt.legend()
@@ -39,9 +40,9 @@ def create_aeb_plots(time_data, distance_data, speed_data, ttc_data, required_de
     # TTC plot
     plt.subplot(5, 1, 3)
     plt.plot(time_data, ttc_data, color="green", label="TTC (s)")
-    plt.axhline(y=FCW_TTC, color='blue', linestyle='--', label="FCW Threshold")
-    plt.axhline(y=SOFT_BRAKE_TTC, color='orange', linestyle='--', label="Soft Brake Threshold")
-    plt.axhline(y=FULL_BRAKE_TTC, color='red', linestyle='--', label="Hard Brake Threshold")
+    plt.axhline(y=params.fcw_ttc, color='blue', linestyle='--', label="FCW Threshold")
+    plt.axhline(y=params.soft_brake_ttc, color='orange', linestyle='--', label="Soft Brake Threshold")
+    plt.axhline(y=params.full_brake_ttc, color='red', linestyle='--', label="Hard Brake Threshold")
     plt.ylim(bottom=0, top=6)
     plt.xlabel("Time (s)")
     plt.ylabel("Time-to-Collision (s)")
@@ -53,8 +54,8 @@ def create_aeb_plots(time_data, distance_data, speed_data, ttc_data, required_de
     plt.plot(time_data, required_decel_data, color="green", linestyle='--', 
             label="Required Decel (minimum needed)")
     plt.plot(time_data, applied_decel_data, color="red", label="Applied Decel (actual)")
-    plt.axhline(y=MAX_SOFT_BRAKE, color='orange', linestyle=':', label="Soft Brake Limit")
-    plt.axhline(y=MAX_FULL_BRAKE, color='red', linestyle=':', label="Hard Brake Limit")
+    plt.axhline(y=params.max_soft_brake, color='orange', linestyle=':', label="Soft Brake Limit")
+    plt.axhline(y=params.max_full_brake, color='red', linestyle=':', label="Hard Brake Limit")
     plt.ylim(top=1, bottom=-10)
     plt.xlabel("Time (s)")
     plt.ylabel("Deceleration (mph/s)")
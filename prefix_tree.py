@@ -0,0 +1,92 @@
+import numpy as np
+from batch_sim import run_aeb_batch, STATE_KEYS
+
+# Columns of the batch_sim parameter array that fix the initial state of a scenario. Scenarios that share them
+# run the same trajectory until their target decel trigger fires (target_decel and the trigger only act then).
+INITIAL_COLUMNS = [0, 1, 2, 3]  # ego_start_x, ego_speed, target_start_x, target_speed
+DECEL, TRIGGER = 4, 5
+
+# Below this many scenarios per initial state on average (e.g. LHS designs, where almost every scenario has its own
+# initial state) the trunks only add steps, and the scenarios are simulated by plain run_aeb_batch
+min_scenarios_per_group = 2.
+
+
+def run_prefix_tree(params, dt=0.1, num_steps=200, early_termination=False, return_stats=False):
+    """
+    run_aeb_batch with shared prefixes: the same results, with fewer simulated steps on sweeps whose scenarios
+    share initial states (e.g. grids of target_decel x target_decel_trigger per initial condition).
+
+    1. the scenarios are grouped by initial state and one trunk per group (a target that never brakes) is
+       simulated in a batch
+    2. every scenario forks off its trunk at the step where the trunk distance first reaches its trigger, with
+       the trunk state of that step. Scenarios that never fork (no target decel, or the trunk finished first)
+       take the trunk result
+    3. forks of the same group, step and target_decel continue identically (the trigger has fired for all of
+       them), so each distinct fork is simulated once, all forks together in one batch from their start states
+
+    With return_stats=True also returns counts of the groups, branches and simulated scenario steps.
+    """
+    params = np.atleast_2d(np.asarray(params, dtype=float))
+    n = params.shape[0]
+    initial, group = np.unique(params[:, INITIAL_COLUMNS], axis=0, return_inverse=True)
+    group = group.ravel()
+    if n < min_scenarios_per_group * len(initial):
+        steps = [0]
+        result = run_aeb_batch(params, dt, num_steps, early_termination,
+                               on_step=lambda rows, state: steps.__setitem__(0, steps[0] + rows.size))
+        if return_stats:
+            return result, {'scenarios': n, 'groups': len(initial), 'branches': 0, 'steps': steps[0],
+                            'trunk_steps': 0, 'fork_steps': 0}
+        return result
+
+    # Trunks: a target decel of 0 never changes the target, a negative trigger never fires
+    trunk_params = np.column_stack([initial, np.zeros(len(initial)), np.full(len(initial), -1.)])
+
+    # Scenarios that can fork, checked against their trunk at the start of every step (before the trigger)
+    pending = np.flatnonzero(params[:, DECEL] != 0)
+    fork_rows, fork_states = [], []
+    steps = {'trunk': 0}
+
+    def capture_forks(rows, state):
+        nonlocal pending
+        steps['trunk'] += rows.size
+        if not pending.size:
+            return
+        position = np.full(len(initial), -1)
+        position[rows] = np.arange(rows.size)
+        trunk = position[group[pending]]
+        fork = trunk >= 0
+        fork[fork] = state['distance'][trunk[fork]] <= params[pending[fork], TRIGGER]
+        if fork.any():
+            fork_rows.append(pending[fork])
+            fork_states.append({key: state[key][trunk[fork]].copy() for key in STATE_KEYS})
+            pending = pending[~fork]
+
+    trunk_result = run_aeb_batch(trunk_params, dt, num_steps, early_termination, on_step=capture_forks)
+    result = {key: values[group] for key, values in trunk_result.items()}
+    steps['forks'] = 0
+    num_branches = 0
+
+    if fork_rows:
+        rows = np.concatenate(fork_rows)
+        start_state = {key: np.concatenate([states[key] for states in fork_states]) for key in STATE_KEYS}
+        # one branch per distinct (group, fork step, target_decel)
+        branch_keys = np.column_stack([group[rows], start_state['step'], params[rows, DECEL]])
+        _, first, branch = np.unique(branch_keys, axis=0, return_index=True, return_inverse=True)
+        branch = branch.ravel()
+        num_branches = len(first)
+
+        def count_steps(branch_rows, state):
+            steps['forks'] += branch_rows.size
+
+        branch_result = run_aeb_batch(params[rows[first]], dt, num_steps, early_termination,
+                                      start_state={key: values[first] for key, values in start_state.items()},
+                                      on_step=count_steps)
+        for key, values in branch_result.items():
+            result[key][rows] = values[branch]
+
+    if return_stats:
+        return result, {'scenarios': n, 'groups': len(initial), 'branches': num_branches,
+                        'steps': steps['trunk'] + steps['forks'], 'trunk_steps': steps['trunk'],
+                        'fork_steps': steps['forks']}
+    return result
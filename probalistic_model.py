@@ -9,11 +9,27 @@
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib import cm
 
 from sklearn.gaussian_process import GaussianProcessClassifier
 from sklearn.gaussian_process.kernels import RBF, ConstantKernel as C
+from surrogate import RFFGPClassifier
+from acquisition import acquisition_scores
+from surface import plot_surfaces
+
+# surrogate model for step 2:
+# 'sklearn' - exact GaussianProcessClassifier, its O(n³) fit is fine for a few hundred scenarios
+# 'rff' - approximate random Fourier feature GP classifier (surrogate.py), scales to tens of thousands of
+#         scenarios and can be updated with new results through partial_fit
+surrogate_model = 'sklearn'
+
+# uncertainty score for step 4 (acquisition.py): 'entropy', 'variance', 'straddle' or 'boundary_ei'
+# (the latent criteria need the 'rff' model or scikit-learn >= 1.7 for the exact GP classifier)
+acquisition_criterion = 'entropy'
+
+# decision surface plots: the other features are held at their mean, or averaged over the training
+# scenarios with marginalize_surfaces = True (slower, evaluated once per model thanks to the cache)
+plot_dir = 'plots'
+marginalize_surfaces = False
 
 # Step 1: Load and Prepare Initial Dataset
 # Load the results data from csv file
@@ -30,16 +46,21 @@ y = df_results['collision_occurred']
 
 
 # Step 2: Train the Initial Gaussian Process Model
-# Define the kernel for the Gaussian Process (combining Constant and RBF kernels)
-# Constant kernel scales the output, while RBF controls smoothness
-kernel = C(1.0) * RBF(length_scale=5.0)
-
-# Initialize the Gaussian Process Classifier with the defined kernel
-# Setting random_state ensures reproducibility
-gp_model = GaussianProcessClassifier(kernel=kernel, random_state=42)
-
-# Train the model on the initial dataset (the 99 filtered scenarios)
-gp_model.fit(X, y)
+if surrogate_model == 'rff':
+    # Length scale and amplitude are picked by Laplace evidence, later results can be added with gp_model.partial_fit
+    gp_model = RFFGPClassifier(random_state=42)
+    gp_model.fit(X, y, tune=True)
+else:
+    # Define the kernel for the Gaussian Process (combining Constant and RBF kernels)
+    # Constant kernel scales the output, while RBF controls smoothness
+    kernel = C(1.0) * RBF(length_scale=5.0)
+
+    # Initialize the Gaussian Process Classifier with the defined kernel
+    # Setting random_state ensures reproducibility
+    gp_model = GaussianProcessClassifier(kernel=kernel, random_state=42)
+
+    # Train the model on the initial dataset (the 99 filtered scenarios)
+    gp_model.fit(X, y)
 
 # Step 3: Generate new configuration dataset using Latin Hypercube Sampling (LHS)
 from scipy.stats import qmc
@@ -51,12 +72,15 @@ new_configs = new_configs.rename(columns={
     'ego_start_speed': 'ego_speed',
     'target_start_speed': 'target_speed'
 })
+# the model only sees the scenario parameters, scenario_id stays with the configs for the saved file
+X_new = new_configs[X.columns]
 
 print("\nStep 1: Predicting collision probabilities using GP model...")
-collision_probs = gp_model.predict_proba(new_configs)[:, 1]  # Probability of collision
+collision_probs = gp_model.predict_proba(X_new)[:, 1]  # Probability of collision
 
 print("\nStep 2: Calculating uncertainty scores...")
-uncertainty = np.abs(collision_probs - 0.5)
+# Higher = more uncertain, so the largest scores are the scenarios most worth simulating
+uncertainty = acquisition_scores(gp_model, X_new, acquisition_criterion)
 
 print("\nStep 3: Filtering scenarios with probability between 0.4-0.5...")
 # Create a mask for scenarios with probability between 0.4 and 0.5
@@ -87,85 +111,15 @@ for i, (idx, row) in enumerate(high_uncertainty_configs.iterrows()):
     print(f"Parameters: {row['ego_start_x']:.1f},{row['ego_speed']:.1f},{row['target_start_x']:.1f},{row['target_speed']:.1f},{row['target_decel']:.1f},{row['target_decel_trigger']:.1f}")
     print()
 
-def plot_gp_2D(gp_model, X, feature1_idx, feature2_idx, feature_names=None):
-    """
-    Create a 2D visualization of the GP model predictions
-    
-    Args:
-        gp_model: Trained GaussianProcessClassifier
-        X: Original training data
-        feature1_idx: Index of first feature to plot
-        feature2_idx: Index of second feature to plot
-        feature_names: List of feature names
-    """
-    # Use feature names if provided, otherwise use indices
-    if feature_names is None:
-        feature_names = [f'Feature {i}' for i in range(X.shape[1])]
-    
-    # Create mesh grid
-    x1_min, x1_max = X[:, feature1_idx].min() - 1, X[:, feature1_idx].max() + 1
-    x2_min, x2_max = X[:, feature2_idx].min() - 1, X[:, feature2_idx].max() + 1
-    xx1, xx2 = np.meshgrid(np.linspace(x1_min, x1_max, 100),
-                          np.linspace(x2_min, x2_max, 100))
-    
-    # Prepare query points
-    X_query = np.zeros((xx1.ravel().shape[0], X.shape[1]))
-    # Use mean values for non-plotted dimensions
-    for i in range(X.shape[1]):
-        if i not in [feature1_idx, feature2_idx]:
-            X_query[:, i] = X[:, i].mean()
-    X_query[:, feature1_idx] = xx1.ravel()
-    X_query[:, feature2_idx] = xx2.ravel()
-    
-    # Get predictions
-    Z = gp_model.predict_proba(X_query)[:, 1]
-    Z = Z.reshape(xx1.shape)
-    
-    # Create plot
-    plt.figure(figsize=(10, 8))
-    plt.contourf(xx1, xx2, Z, levels=np.linspace(0, 1, 11), cmap=cm.RdYlBu)
-    plt.colorbar(label='Collision Probability')
-    
-    # Plot training points
-    plt.scatter(X[:, feature1_idx], X[:, feature2_idx], c='black', marker='x', label='Training Points')
-    
-    plt.xlabel(feature_names[feature1_idx])
-    plt.ylabel(feature_names[feature2_idx])
-    plt.title(f'GP Model Predictions: {feature_names[feature1_idx]} vs {feature_names[feature2_idx]}')
-    plt.legend()
-    plt.show()
-
-# After training your GP model, create visualizations for different feature pairs
-feature_names = ['Ego Start X', 'Ego Speed', 'Target Start X', 'Target Speed', 
-                'Target Decel', 'Target Decel Trigger']
-
-# Plot ego speed vs target speed
-plot_gp_2D(gp_model, X.values, 1, 3, feature_names)
-
-# Plot initial distance vs target deceleration
-plot_gp_2D(gp_model, X.values, 2, 4, feature_names)
-
-# Plot target speed vs deceleration trigger
-plot_gp_2D(gp_model, X.values, 3, 5, feature_names)
-
-# Most important feature relationships for collision prediction
-feature_names = ['Ego Start X', 'Ego Speed', 'Target Start X', 'Target Speed', 
-                'Target Decel', 'Target Decel Trigger']
-
-# 1. Initial Distance vs Ego Speed
-# (Initial distance = Target Start X - Ego Start X)
-initial_distance = X['target_start_x'] - X['ego_start_x']
-X_with_distance = X.copy()
-X_with_distance['initial_distance'] = initial_distance
-plot_gp_2D(gp_model, X_with_distance.values, -1, 1, feature_names + ['Initial Distance'])
-
-# 2. Relative Speed vs Target Decel
-# (Relative Speed = Ego Speed - Target Speed)
-relative_speed = X['ego_speed'] - X['target_speed']
-X_with_rel_speed = X.copy()
-X_with_rel_speed['relative_speed'] = relative_speed
-plot_gp_2D(gp_model, X_with_rel_speed.values, -1, 4, feature_names + ['Relative Speed'])
-
-# 3. Target Decel vs Decel Trigger Distance
-plot_gp_2D(gp_model, X.values, 4, 5, feature_names)
-
+# Step 6: Plot the GP decision surface for the most important feature pairs (saved as images in plot_dir)
+# Grid predictions are cached per model and slice (surface.py), so re-running with an unchanged model is fast
+surface_pairs = [
+    ('ego_speed', 'target_speed'),
+    ('target_start_x', 'target_decel'),
+    ('target_speed', 'target_decel_trigger'),
+    ('initial_distance', 'ego_speed'),      # initial distance = target start x - ego start x
+    ('relative_speed', 'target_decel'),     # relative speed = ego speed - target speed
+    ('target_decel', 'target_decel_trigger'),
+]
+plot_surfaces(gp_model, X, surface_pairs, out_dir=plot_dir, marginalize=marginalize_surfaces)
+print(f"\nGP decision surfaces saved to '{plot_dir}'")
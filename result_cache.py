@@ -0,0 +1,131 @@
+import hashlib
+import importlib
+import json
+import os
+import pickle
+import sqlite3
+import time
+
+from result_sink import KEY_PARAMS, scenario_key
+
+# Modules whose constants (UPPER_CASE numbers and strings) change simulation results, see simulator_fingerprint
+FINGERPRINT_MODULES = ('AEB_algo', 'ACC_algo')
+# Bump when the simulation dynamics change in a way the module constants do not show
+CACHE_VERSION = 1
+
+cache_path = 'CSV/result_cache.sqlite'
+
+
+def simulator_fingerprint(modules=FINGERPRINT_MODULES):
+    """Hash of the controller constants, cached results of other constants are never reused"""
+    constants = {}
+    for name in modules:
+        module = importlib.import_module(name)
+        constants[name] = {key: value for key, value in vars(module).items()
+                           if key.isupper() and isinstance(value, (int, float, str))}
+    constants['version'] = CACHE_VERSION
+    return hashlib.sha1(json.dumps(constants, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def config_key(config, namespace=''):
+    """
+    Canonical cache key of a config: the quantized scenario_key of the scenario parameters plus any other
+    config entries (e.g. a speed profile), within a namespace (simulation function, its arguments and the
+    simulator fingerprint)
+    """
+    extra = {name: value for name, value in config.items() if name not in KEY_PARAMS}
+    text = f"{namespace}|{scenario_key(config)}|{json.dumps(extra, sort_keys=True, default=str) if extra else ''}"
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Persistent cache of simulation results in a SQLite file.
+
+    Results are keyed by config_key within a namespace that holds the simulation function, its keyword
+    arguments and the simulator_fingerprint, so changing a controller constant never returns stale results
+    while changes elsewhere (plotting, filters) keep the cache valid. At most `max_entries` results are kept,
+    the least recently used are evicted. `hits`, `misses` and `evictions` count the lookups of this instance.
+
+    Usage:
+        cache = ResultCache('results.sqlite')
+        namespace = cache.namespace('Combined_SIM_LOOP', 'run_aeb_simulation', {'visualize': False})
+        cached = cache.get_many([config_key(config, namespace) for config in configs])
+    """
+    def __init__(self, path=cache_path, max_entries=1000000, fingerprint_modules=FINGERPRINT_MODULES):
+        self.path = path
+        self.max_entries = max_entries
+        self.fingerprint = simulator_fingerprint(fingerprint_modules)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS results '
+                                '(key TEXT PRIMARY KEY, value BLOB NOT NULL, last_used REAL NOT NULL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+        self.connection.commit()
+
+    def namespace(self, sim_module, sim_function, sim_kwargs=None):
+        """Key namespace of one simulation function with fixed keyword arguments"""
+        kwargs = json.dumps(sim_kwargs or {}, sort_keys=True, default=str)
+        return f"{sim_module}.{sim_function}|{kwargs}|{self.fingerprint}"
+
+    def get_many(self, keys):
+        """Cached results for a list of keys, {key: result} for the keys that are in the cache"""
+        found = {}
+        keys = list(keys)
+        for start in range(0, len(keys), 500):  # stay below SQLite's bound parameter limit
+            batch = keys[start:start + 500]
+            rows = self.connection.execute(
+                f"SELECT key, value FROM results WHERE key IN ({','.join('?' * len(batch))})", batch).fetchall()
+            found.update((key, pickle.loads(value)) for key, value in rows)
+        if found:
+            now = time.time()
+            self.connection.executemany('UPDATE results SET last_used = ? WHERE key = ?', [(now, key) for key in found])
+            self.connection.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def put_many(self, items):
+        """Store (key, result) pairs and evict the least recently used results beyond max_entries"""
+        now = time.time()
+        self.connection.executemany('INSERT OR REPLACE INTO results (key, value, last_used) VALUES (?, ?, ?)',
+                                    [(key, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), now)
+                                     for key, result in items])
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            self.connection.execute('DELETE FROM results WHERE key IN '
+                                    '(SELECT key FROM results ORDER BY last_used LIMIT ?)', (excess,))
+            self.evictions += excess
+        self.connection.commit()
+
+    def put(self, key, result):
+        self.put_many([(key, result)])
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'entries': len(self), 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.}
+
+    def clear(self):
+        self.connection.execute('DELETE FROM results')
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,178 @@
+import glob
+import hashlib
+import os
+import time
+import numpy as np
+import pandas as pd
+
+try:  # Parquet output is optional, chunked CSV is always available
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Column types of a simulation result file (speeds in kph, impact_speed as a number instead of '12.3 kph')
+RESULT_COLUMNS = {
+    'ego_start_x': 'float64',
+    'ego_speed': 'float64',
+    'target_start_x': 'float64',
+    'target_speed': 'float64',
+    'target_decel': 'float64',
+    'target_decel_trigger': 'float64',
+    'collision_occurred': 'bool',
+    'impact_speed': 'float64',
+    'aeb_triggered': 'bool',
+    'speed_reduction': 'float64',
+    'scenario_key': 'str',
+}
+
+# Scenario parameters that identify a run_aeb_simulation config (speeds in m/s)
+KEY_PARAMS = ['ego_start_x', 'ego_speed', 'target_start_x', 'target_speed', 'target_decel', 'target_decel_trigger']
+KEY_LENGTH = 16
+KEY_DECIMALS = 6  # configs that agree to this many decimals are the same scenario
+
+
+def scenario_key(config):
+    """Stable hash of a run_aeb_simulation config dictionary, used to skip scenarios that are already done"""
+    values = ','.join(f"{round(float(config[name]), KEY_DECIMALS) + 0.:.{KEY_DECIMALS}f}" for name in KEY_PARAMS)
+    return hashlib.sha1(values.encode()).hexdigest()[:KEY_LENGTH]
+
+
+def scenario_keys(params):
+    """scenario_key for every row of an N x 6 parameter array (columns as in batch_sim.PARAM_COLUMNS)"""
+    return [scenario_key(dict(zip(KEY_PARAMS, row))) for row in np.atleast_2d(params)]
+
+
+class ResultSink:
+    """
+    Streams simulation results to disk in typed chunks instead of keeping them all in memory.
+
+    Rows are buffered and appended every `flush_every` rows or `flush_interval` seconds. A '.parquet' path
+    is written as a directory of Parquet part files (needs pyarrow), anything else as one CSV file. With
+    resume=True the keys already on disk are loaded, so an interrupted sweep can skip finished scenarios
+    (see `done`); a CSV row cut off by a crash is dropped.
+
+    Usage:
+        with ResultSink('results.csv') as sink:
+            for config in configs:
+                if not sink.done(config):
+                    sink.add(row_for(config), config)
+    """
+    def __init__(self, path, flush_every=500, flush_interval=30., resume=True):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.parquet = path.endswith('.parquet')
+        if self.parquet and pq is None:
+            raise ImportError("Writing Parquet results requires pyarrow, use a .csv path instead")
+
+        self.completed = set()
+        self.buffer = []
+        self.last_flush = time.time()
+        self.rows_written = 0
+
+        if resume:
+            self._load_completed()
+        else:
+            self._remove_existing()
+
+    # --- resume support ---
+    def _part_files(self):
+        return sorted(glob.glob(os.path.join(self.path, 'part-*.parquet')))
+
+    def _load_completed(self):
+        if self.parquet:
+            for part in self._part_files():
+                self.completed.update(pq.read_table(part, columns=['scenario_key']).column(0).to_pylist())
+            self.rows_written = len(self.completed)
+            return
+        if not os.path.exists(self.path):
+            return
+        self._truncate_partial_row()
+        for chunk in pd.read_csv(self.path, usecols=['scenario_key'], dtype={'scenario_key': str}, chunksize=100000):
+            keys = chunk['scenario_key'].dropna()
+            self.completed.update(keys[keys.str.len() == KEY_LENGTH])
+        self.rows_written = len(self.completed)
+
+    def _truncate_partial_row(self):
+        # A crash during a write can leave half a line at the end of the file, cut it so new rows start cleanly
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            end = data.rfind(b'\n') + 1
+            if end != len(data):
+                f.truncate(end)
+
+    def _remove_existing(self):
+        if self.parquet:
+            for part in self._part_files():
+                os.remove(part)
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+
+    # --- writing ---
+    def done(self, config):
+        """True if the scenario of this config is already in the results"""
+        return scenario_key(config) in self.completed
+
+    def add(self, row, config):
+        """Add one formatted result row (dictionary with the RESULT_COLUMNS values) for a config"""
+        key = scenario_key(config)
+        self.buffer.append(dict(row, scenario_key=key))
+        self.completed.add(key)
+        if len(self.buffer) >= self.flush_every or time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def add_frame(self, df_rows, keys):
+        """Add a DataFrame of formatted result rows, keys as returned by scenario_keys"""
+        df_rows = df_rows.assign(scenario_key=list(keys))
+        self.buffer.extend(df_rows.to_dict('records'))
+        self.completed.update(keys)
+        if len(self.buffer) >= self.flush_every or time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Append the buffered rows to disk"""
+        self.last_flush = time.time()
+        if not self.buffer:
+            return
+        df_chunk = pd.DataFrame(self.buffer, columns=list(RESULT_COLUMNS)).astype(RESULT_COLUMNS)
+        self.buffer = []
+
+        if self.parquet:
+            os.makedirs(self.path, exist_ok=True)
+            part = os.path.join(self.path, f"part-{len(self._part_files()):05d}.parquet")
+            # Write to a temporary name first so a crash never leaves a truncated part file behind
+            pq.write_table(pa.Table.from_pandas(df_chunk, preserve_index=False), part + '.tmp')
+            os.replace(part + '.tmp', part)
+        else:
+            header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            with open(self.path, 'a', newline='') as f:
+                df_chunk.to_csv(f, header=header, index=False)
+                f.flush()
+                os.fsync(f.fileno())
+        self.rows_written += len(df_chunk)
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_results(path, chunksize=None):
+    """
+    Read a result file written by ResultSink with its column types.
+    With chunksize, returns an iterator of DataFrames so large result sets can be processed in constant memory.
+    """
+    if path.endswith('.parquet'):
+        if pq is None:
+            raise ImportError("Reading Parquet results requires pyarrow")
+        parts = sorted(glob.glob(os.path.join(path, 'part-*.parquet')))
+        frames = (pq.read_table(part).to_pandas() for part in parts)
+        if chunksize is not None:
+            return frames
+        return pd.concat(list(frames), ignore_index=True) if parts else pd.DataFrame(columns=list(RESULT_COLUMNS))
+    return pd.read_csv(path, dtype=RESULT_COLUMNS, chunksize=chunksize)
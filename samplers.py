@@ -0,0 +1,152 @@
+import warnings
+import numpy as np
+import pandas as pd
+from scipy.spatial.distance import pdist
+from scipy.stats import qmc
+
+# Space filling designs on the unit cube:
+# 'lhs'         - Latin hypercube
+# 'lhs-maximin' - best of maximin_candidates Latin hypercubes by the smallest distance between two points
+# 'lhs-cd'      - Latin hypercube optimized for centered discrepancy (scipy 'random-cd', slow beyond a few 1000 points)
+# 'sobol'       - scrambled Sobol sequence
+# 'halton'      - scrambled Halton sequence
+# 'random'      - plain Monte Carlo
+METHODS = ('lhs', 'lhs-maximin', 'lhs-cd', 'sobol', 'halton', 'random')
+
+maximin_candidates = 10
+max_maximin_points = 5000        # maximin needs all pairwise distances, larger designs are split into blocks of this size
+max_discrepancy_points = 5000    # discrepancy is O(n²), larger sample sets are measured on a subsample
+
+
+def scenario_constraints(df_samples):
+    """
+    Mask of the LHS samples (speeds in kph) that make realistic, critical AEB scenarios:
+    1. the ego vehicle starts behind the target
+    2. the ego is faster than the target, or the target decelerates (otherwise the ego never catches up)
+    3. the initial TTC is between 3 and 20 s
+    4. the relative speed is at most 65 (compared in m/s, as the original filter did)
+    """
+    ego_x, target_x = df_samples['ego_start_x'].to_numpy(), df_samples['target_start_x'].to_numpy()
+    ego_speed, target_speed = df_samples['ego_start_speed'].to_numpy(), df_samples['target_start_speed'].to_numpy()
+    initial_gap = target_x - ego_x
+    relative_speed = (ego_speed - target_speed) / 3.6
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ttc = np.where(relative_speed > 0, initial_gap / relative_speed, np.inf)
+    return ((ego_x <= target_x)
+            & ((ego_speed >= target_speed) | (df_samples['target_decel'].to_numpy() < 0))
+            & (ttc >= 3) & (ttc <= 20)
+            & (relative_speed <= 65))
+
+
+def discrepancy(unit_samples, method='CD', seed=0):
+    """Discrepancy of unit cube samples (scipy.stats.qmc.discrepancy), lower = more uniform"""
+    if len(unit_samples) > max_discrepancy_points:
+        idx = np.random.default_rng(seed).choice(len(unit_samples), max_discrepancy_points, replace=False)
+        unit_samples = unit_samples[idx]
+    return qmc.discrepancy(unit_samples, method=method)
+
+
+class ScenarioSampler:
+    """
+    Draws scenario parameters from a space filling design, rounded to the parameter step sizes.
+
+    With constraints (a function DataFrame -> boolean mask, e.g. scenario_constraints), sample(n) returns n
+    feasible samples: the design is drawn in vectorized blocks sized by the observed acceptance rate and the
+    infeasible rows are rejected, so every returned sample is worth simulating. Sobol and Halton blocks continue
+    the same sequence; LHS designs are not extensible, so each block is a new design.
+
+    After sampling, `draws`, `acceptance_rate` and `discrepancy_` (centered discrepancy of the accepted points
+    in the unit cube) describe the last call. The index of the returned samples is the draw number, a stable id
+    that survives any later row filtering.
+    """
+    def __init__(self, param_ranges, method='lhs', constraints=None, seed=None, block_factor=1.2):
+        if method not in METHODS:
+            raise ValueError(f"Unknown sampling method '{method}', expected one of {METHODS}")
+        self.param_ranges = param_ranges
+        self.method = method
+        self.constraints = constraints
+        self.block_factor = block_factor  # extra draws per block on top of the expected need
+        self.rng = np.random.default_rng(seed)
+        self.lower = np.array([low for low, high, step in param_ranges.values()], dtype=float)
+        self.upper = np.array([high for low, high, step in param_ranges.values()], dtype=float)
+        self.steps = np.array([step for low, high, step in param_ranges.values()], dtype=float)
+        self.sequence = None
+        self.draws = 0
+        self.acceptance_rate = 1.
+        self.discrepancy_ = np.nan
+        self.rejected_ = None
+
+    def unit_samples(self, n):
+        """n points of the design in the unit cube"""
+        d = len(self.param_ranges)
+        if self.method == 'random':
+            return self.rng.random((n, d))
+        if self.method in ('sobol', 'halton'):
+            if self.sequence is None:
+                self.sequence = (qmc.Sobol if self.method == 'sobol' else qmc.Halton)(d=d, seed=self.rng)
+            with warnings.catch_warnings():
+                # Sobol balance is only exact for powers of 2, the points are still low discrepancy
+                warnings.simplefilter('ignore', UserWarning)
+                return self.sequence.random(n)
+        if self.method == 'lhs-cd':
+            return qmc.LatinHypercube(d=d, optimization='random-cd', seed=self.rng).random(n)
+        if self.method == 'lhs-maximin' and n > 1:
+            # one maximin design per block of at most max_maximin_points (consecutive blocks of the constrained
+            # sampling loop are separate designs anyway)
+            blocks = np.array_split(np.arange(n), int(np.ceil(n / max_maximin_points)))
+            return np.concatenate([self.maximin_design(len(block)) for block in blocks])
+        return qmc.LatinHypercube(d=d, seed=self.rng).random(n)
+
+    def maximin_design(self, n):
+        """Best of maximin_candidates Latin hypercubes of n points by their smallest pairwise distance"""
+        d = len(self.param_ranges)
+        designs = [qmc.LatinHypercube(d=d, seed=self.rng).random(n) for _ in range(maximin_candidates)]
+        return max(designs, key=lambda design: pdist(design).min()) if n > 1 else designs[0]
+
+    def scale(self, unit_samples):
+        """Unit cube -> parameter ranges, rounded to the nearest valid step"""
+        scaled = qmc.scale(unit_samples, self.lower, self.upper)
+        scaled = np.round((scaled - self.lower) / self.steps) * self.steps + self.lower
+        return pd.DataFrame(scaled, columns=list(self.param_ranges))
+
+    def sample(self, n, keep_rejected=False):
+        """
+        n samples (all feasible if there are constraints) as a DataFrame with the param_ranges columns, indexed by
+        draw number (the position in the design). With keep_rejected=True, `rejected_` holds the rejected draws
+        up to the last accepted one, so accepted and rejected rows together are every draw that was used.
+        """
+        if n == 0:
+            self.draws = 0
+            self.discrepancy_ = np.nan
+            self.rejected_ = pd.DataFrame(columns=list(self.param_ranges)) if keep_rejected else None
+            return pd.DataFrame(columns=list(self.param_ranges), dtype=float)
+        accepted_units, accepted, rejected = [], [], []
+        self.draws = 0
+        found = 0
+        rate = self.acceptance_rate  # start from the rate of the previous call
+        while found < n:
+            if self.constraints is None:
+                block = n - found  # every draw is accepted: exactly n points, one whole design
+            else:
+                block = max(int(np.ceil((n - found) / max(rate, 1e-3) * self.block_factor)), 16)
+            units = self.unit_samples(block)
+            df = self.scale(units)
+            df.index = pd.RangeIndex(self.draws, self.draws + block)
+            mask = self.constraints(df) if self.constraints is not None else np.ones(len(df), dtype=bool)
+            self.draws += block
+            found += int(mask.sum())
+            rate = max(found, 1) / self.draws
+            accepted_units.append(units[mask])
+            accepted.append(df[mask])
+            if keep_rejected:
+                rejected.append(df[~mask])
+            if self.draws > 1000 * n + 100000:
+                raise RuntimeError(f"Only {found} of {n} samples satisfy the constraints after {self.draws} draws")
+        self.acceptance_rate = found / self.draws
+        units = np.concatenate(accepted_units)[:n]
+        self.discrepancy_ = discrepancy(units, seed=0) if len(units) > 1 else np.nan
+        df_samples = pd.concat(accepted).iloc[:n]
+        if keep_rejected:
+            last = df_samples.index[-1] if len(df_samples) else -1
+            self.rejected_ = pd.concat(rejected).loc[lambda df: df.index < last]
+        return df_samples
@@ -0,0 +1,75 @@
+from world import World
+from agents import Painting
+from geometry import Point
+
+
+# Road layouts: functions that add the static agents of a scene to a World
+def straight_road(w):
+    """Two lane road with grass, road edges, dashed lane markings and a pedestrian crosswalk at x = 124"""
+    w.add(Painting(Point(60, 33.7), Point(800, 20), 'dark green'))  # Upper grass
+    w.add(Painting(Point(60, 6.3), Point(800, 20), 'dark green'))   # Lower grass
+    w.add(Painting(Point(60, 20), Point(800, 7.4), 'gray80'))  # Main road surface
+    w.add(Painting(Point(60, 23.7), Point(800, 0.3), 'white'))  # Upper road edge
+    w.add(Painting(Point(60, 16.3), Point(800, 0.3), 'white'))  # Lower road edge
+
+    for i in range(40):  # yellow dashed lane markings
+        x_pos = 10 + (i * 12)  # 12m total spacing (3m dash + 9m gap)
+        w.add(Painting(Point(x_pos, 20), Point(2, 0.2), 'yellow'))  # 3m long dashes
+
+    # Add pedestrian crosswalk
+    crosswalk_x = 124
+    crosswalk_width = 2  # 2m wide crosswalk
+    crosswalk_stripes = 6  # Number of stripes
+
+    for i in range(crosswalk_stripes):
+        stripe_y = 17 + (i * 1.23)  # Evenly space stripes across road width (7.4m)
+        w.add(Painting(Point(crosswalk_x, stripe_y), Point(crosswalk_width, 0.5), 'white'))
+
+
+SCENES = {
+    'straight_road': straight_road,
+}
+
+
+class ScenePool:
+    """
+    Headless worlds with their road layout already built, reused across simulation runs.
+
+    acquire() hands out an idle world of the requested scene (building one only when none is idle) and
+    release() resets it, dropping the dynamic agents and the time but keeping the static agents and their
+    cached collision boxes, so thousands of short runs build each road layout once per process instead of once
+    per run. Worlds with a visualizer are never pooled, they are built on acquire and closed on release.
+    """
+    def __init__(self, max_idle=4):
+        self.max_idle = max_idle  # idle worlds kept per scene and world settings
+        self.idle = {}
+        self.built = 0
+
+    def acquire(self, scene, dt, width=100, height=100, ppm=8, headless=True):
+        key = (scene, dt, width, height, ppm)
+        if headless and self.idle.get(key):
+            return self.idle[key].pop()
+        w = World(dt, width=width, height=height, ppm=ppm, headless=headless)
+        SCENES[scene](w)
+        w.scene_key = key
+        self.built += 1
+        return w
+
+    def release(self, w):
+        if not w.headless:
+            w.close()
+            return
+        w.reset()
+        idle = self.idle.setdefault(w.scene_key, [])
+        if len(idle) < self.max_idle:
+            idle.append(w)
+
+    def clear(self):
+        for worlds in self.idle.values():
+            for w in worlds:
+                w.close()
+        self.idle = {}
+
+
+# Pool of the sim loops, one per process (the sweep worker processes each get their own)
+scene_pool = ScenePool()
@@ -0,0 +1,107 @@
+import numpy as np
+from AEB_algo import FCW_TTC, SOFT_BRAKE_TTC, FULL_BRAKE_TTC, MAX_SOFT_BRAKE, MAX_FULL_BRAKE, SYSTEM_LATENCY
+from ACC_algo import MAX_DECEL
+from analytic_sim import first_crossing
+from batch_sim import CAR_LENGTH, params_from_samples
+
+# Screening outcomes
+SIMULATE = 0           # the outcome depends on the controllers, the scenario has to be simulated
+NO_AEB = 1             # the TTC can never drop to SOFT_BRAKE_TTC: no AEB braking and no collision
+CERTAIN_COLLISION = 2  # even the hardest braking the controllers could ever apply cannot avoid the collision
+OUTCOMES = {SIMULATE: 'simulate', NO_AEB: 'no_aeb', CERTAIN_COLLISION: 'certain_collision'}
+
+
+def ttc_time(params, ttc_threshold):
+    """
+    Earliest time at which the TTC can drop to ttc_threshold (or the cars touch), inf if never (vectorized).
+
+    The arbitration of the sim loops takes the smaller of the AEB command (never positive) and the ACC command,
+    so the ego never accelerates. The worst case is then an ego that never brakes: any braking keeps the gap
+    larger, the closing speed lower and the target decel trigger later. In that worst case the gap is piecewise
+    quadratic (target at constant speed, braking after the trigger, stopped), and gap - threshold * closing
+    speed reaching zero is a root of each piece. Continuous time triggers are never later than the stepped ones,
+    so no simulated run reaches the threshold earlier.
+    """
+    ego_x, ego_v, target_x, target_v, target_decel, trigger = np.atleast_2d(params).T
+    gap = target_x - ego_x - CAR_LENGTH
+    closing = ego_v - target_v
+
+    # phase 1: target at constant speed until the gap reaches the trigger distance
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t_trigger = np.where(gap <= trigger, 0., np.where(closing > 0, (gap - trigger) / closing, np.inf))
+    reach_1 = first_crossing(gap - ttc_threshold * closing, -closing, 0.)
+    earliest = np.where(reach_1 <= t_trigger, reach_1, np.inf)
+
+    # phase 2: target braking from the trigger until it stops
+    gap_2 = np.where(t_trigger > 0, trigger, gap)
+    braking = target_decel < 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t_stop = np.where(braking, target_v / -target_decel, np.inf)
+    reach_2 = first_crossing(gap_2 - ttc_threshold * closing, ttc_threshold * target_decel - closing, target_decel)
+    earliest = np.minimum(earliest, np.where(reach_2 <= t_stop, t_trigger + reach_2, np.inf))
+
+    # phase 3: target stopped, the ego closes in at its own speed
+    with np.errstate(invalid='ignore'):
+        gap_3 = gap_2 - closing * t_stop + 0.5 * target_decel * t_stop ** 2
+    reach_3 = first_crossing(np.where(braking, gap_3 - ttc_threshold * ego_v, 1.), -ego_v, 0.)
+    return np.minimum(earliest, np.where(braking, t_trigger + t_stop + reach_3, np.inf))
+
+
+def certain_collision(params, dt=0.1, num_steps=200):
+    """
+    True where the ego collides even when braking as hard as the controllers ever could (vectorized).
+
+    Until the full brake command can take effect the ego decelerates at most at MAX_SOFT_BRAKE (the ACC and
+    soft AEB limits), and the full brake command needs the TTC at FULL_BRAKE_TTC (never earlier than
+    ttc_time says) plus SYSTEM_LATENCY. This best case is stepped with the tick of the sim loops, with a target
+    that only brakes if the decel trigger already holds at step 0 (a later trigger depends on the ego). Every
+    real run has an ego at least as far ahead and a target at most as far ahead at every step, so its gap is
+    never larger. The first step with a closed gap is also a collision in the real run as long as the ego
+    moves less than two car lengths per step.
+    """
+    params = np.atleast_2d(params)
+    ego_x, ego_v, target_x, target_v, target_decel, trigger = [column.copy() for column in params.T]
+    gap = target_x - ego_x - CAR_LENGTH
+    target_a = np.where(gap <= trigger, target_decel, 0.)
+    valid = (gap > 0) & (ego_v * dt < 2 * CAR_LENGTH)
+    collides = np.zeros(len(gap), dtype=bool)
+    # first step that can run on a full brake command (one step early, so step rounding never makes it later)
+    full_brake_step = np.ceil(ttc_time(params, FULL_BRAKE_TTC) / dt - 1e-9) + round(SYSTEM_LATENCY / dt) - 1
+
+    for k in range(num_steps):
+        ego_a = np.where(k >= full_brake_step, MAX_FULL_BRAKE, min(MAX_SOFT_BRAKE, MAX_DECEL))
+        new_ego_v = np.maximum(ego_v + ego_a * dt, 0)
+        new_target_v = np.maximum(target_v + target_a * dt, 0)
+        ego_x = ego_x + (ego_v + new_ego_v) * dt / 2.
+        target_x = target_x + (target_v + new_target_v) * dt / 2.
+        ego_v, target_v = new_ego_v, new_target_v
+        collides |= target_x - ego_x <= CAR_LENGTH
+        if not (ego_v[valid & ~collides] > 0).any():
+            break  # every remaining best case ego has stopped short of the target
+    return valid & collides
+
+
+def screen(params, dt=0.1, num_steps=200):
+    """
+    Pre-simulation screening of straight line target_decel_trigger scenarios (N x 6 params, batch_sim.PARAM_COLUMNS).
+
+    Returns a dict of length-N arrays:
+        outcome: SIMULATE, NO_AEB or CERTAIN_COLLISION
+        fcw_possible: the TTC can reach FCW_TTC (False = the scenario cannot even produce a warning)
+    """
+    params = np.atleast_2d(np.asarray(params, dtype=float))
+    horizon = num_steps * dt
+    # The bounds assume the ego starts behind the target, anything else is simulated
+    behind = params[:, 2] - params[:, 0] > CAR_LENGTH
+
+    outcome = np.full(len(params), SIMULATE)
+    no_aeb = behind & (ttc_time(params, SOFT_BRAKE_TTC) > horizon)
+    outcome[no_aeb] = NO_AEB
+    candidates = np.flatnonzero(behind & ~no_aeb)
+    outcome[candidates[certain_collision(params[candidates], dt, num_steps)]] = CERTAIN_COLLISION
+    return {'outcome': outcome, 'fcw_possible': ~behind | (ttc_time(params, FCW_TTC) <= horizon)}
+
+
+def screen_samples(df_samples, dt=0.1, num_steps=200):
+    """screen() for an LHS sample DataFrame (speeds in kph), returns the outcome per row"""
+    return screen(params_from_samples(df_samples), dt, num_steps)['outcome']
@@ -0,0 +1,355 @@
+import copy
+import numpy as np
+from geometry import Point, Rectangle
+from world import World
+from kinematics import (bicycle_step, rectangle_corners, is_simple_vehicle,
+                        X, Y, HEADING, SPEED, STEERING, ACCEL, VX, VY, ACCELERATION, ANGULAR_VELOCITY)
+
+# Rows of the vehicle parameter array of a SoAWorld (one column per vehicle)
+LR, FRICTION, MIN_SPEED, MAX_SPEED, LENGTH, WIDTH = range(6)
+
+
+class StatePoint(Point):
+    """Point whose x and y are two columns of one row of a state array (a view, writes go to the array)"""
+    __slots__ = ('array', 'row', 'i', 'j')
+
+    def __init__(self, array, row, i, j):
+        self.array, self.row, self.i, self.j = array, row, i, j
+
+    @property
+    def x(self):
+        return self.array.item(self.row, self.i)
+
+    @x.setter
+    def x(self, value):
+        self.array[self.row, self.i] = value
+
+    @property
+    def y(self):
+        return self.array.item(self.row, self.j)
+
+    @y.setter
+    def y(self, value):
+        self.array[self.row, self.j] = value
+
+
+def _column(array, col):
+    def get(self):
+        return getattr(self._world, array).item(self._row, col)
+
+    def set(self, value):
+        getattr(self._world, array)[self._row, col] = value
+    return property(get, set)
+
+
+def _param(row):
+    def get(self):
+        return self._world.params.item(row, self._row)
+
+    def set(self, value):
+        self._world.params[row, self._row] = value
+    return property(get, set)
+
+
+class VehicleView:
+    """
+    Mixin of the vehicles of a SoAWorld: the kinematic state, control inputs and rectangle corners of the
+    vehicle are read from and written to its row of the world arrays, so the Entity API (center, velocity,
+    heading, set_control, distanceTo, ...) keeps working while the world steps all vehicles as arrays.
+    The size of a vehicle is fixed when it is added.
+    """
+    heading = _column('state', HEADING)
+    inputSteering = _column('state', STEERING)
+    inputAcceleration = _column('state', ACCEL)
+    acceleration = _column('derived', ACCELERATION)
+    angular_velocity = _column('derived', ANGULAR_VELOCITY)
+    friction = _param(FRICTION)
+    min_speed = _param(MIN_SPEED)
+    max_speed = _param(MAX_SPEED)
+
+    @property
+    def center(self):
+        return self._center
+
+    @center.setter
+    def center(self, point):
+        self._center.x, self._center.y = point.x, point.y
+
+    @property
+    def velocity(self):
+        return self._velocity
+
+    @velocity.setter
+    def velocity(self, point):
+        self._velocity.x, self._velocity.y = point.x, point.y
+
+    def buildGeometry(self):
+        self._world._update_corners(slice(self._row, self._row + 1))
+
+    def copy(self):
+        # a plain entity with the current state, not a second view of the same row
+        new = copy.copy(self)
+        self._world._detach(new)
+        return new
+
+
+_view_classes = {}
+
+
+def view_class(cls):
+    """VehicleView subclass of an entity class, created once per class"""
+    if cls not in _view_classes:
+        _view_classes[cls] = type(f"SoA{cls.__name__}", (VehicleView, cls), {})
+    return _view_classes[cls]
+
+
+def rectangles_overlap(A, B):
+    """Vectorized geometry.rectanglesOverlap for corner arrays A, B of shape (..., 4, 2)"""
+    overlap = np.ones(np.broadcast_shapes(A.shape, B.shape)[:-2], dtype=bool)
+    for P in (A, B):
+        for k in (0, 1):
+            axis = P[..., k + 1, :] - P[..., k, :]
+            proj_a = np.einsum('...cd,...d->...c', A, axis)
+            proj_b = np.einsum('...cd,...d->...c', B, axis)
+            overlap &= ~((proj_a.max(-1) < proj_b.min(-1)) | (proj_b.max(-1) < proj_a.min(-1)))
+    return overlap
+
+
+def rectangle_distances(A, B):
+    """Vectorized geometry.rectangleDistance for corner arrays A, B of shape (..., 4, 2)"""
+    A, B = np.broadcast_arrays(A, B)
+    d = np.full(A.shape[:-2], np.inf)
+    for P, Q in ((A, B), (B, A)):
+        start, end = Q, np.roll(Q, -1, axis=-2)  # the 4 edges of Q
+        edge = end - start
+        length_sq = (edge ** 2).sum(-1)[..., None, :]  # (..., 1, 4)
+        rel = P[..., :, None, :] - start[..., None, :, :]  # (..., point, edge, 2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t = np.clip((rel * edge[..., None, :, :]).sum(-1) / length_sq, 0., 1.)
+        t = np.where(length_sq == 0, 0., t)
+        closest = start[..., None, :, :] + t[..., None] * edge[..., None, :, :]
+        d = np.minimum(d, np.hypot(*np.moveaxis(closest - P[..., :, None, :], -1, 0)).min(axis=(-2, -1)))
+    return np.where(rectangles_overlap(A, B), 0., d)
+
+
+def corner_array(entity):
+    """(4, 2) corners of a rectangle entity"""
+    obj = entity.obj
+    return np.array([(obj.c1.x, obj.c1.y), (obj.c2.x, obj.c2.y), (obj.c3.x, obj.c3.y), (obj.c4.x, obj.c4.y)])
+
+
+class SoAWorld(World):
+    """
+    World that keeps the kinematic state of its simple vehicles (kinematics.is_simple_vehicle, e.g. Car) in
+    contiguous arrays, one row per vehicle:
+        state   (N x 6, kinematics.STATE_COLUMNS), derived (N x 4: velocity, acceleration, angular velocity),
+        params  (6 x N: LR, FRICTION, MIN_SPEED, MAX_SPEED, LENGTH, WIDTH), corners (N x 8)
+    The vehicle objects become thin views of their rows (VehicleView). tick steps all vehicles with one
+    bicycle_step call, and distances and collisions between vehicles are array ops, which is what scenes with
+    hundreds of vehicles (e.g. the highway merging and congestion scenarios) need. Other dynamic agents
+    (pedestrians, custom entities) are ticked and collision checked one by one like in World.
+    """
+    def __init__(self, dt: float, width: float = 100, height: float = 100, ppm: int = 8, headless: bool = False,
+                 capacity: int = 64):
+        super(SoAWorld, self).__init__(dt, width, height, ppm, headless)
+        self.vehicles = []  # vehicle views, in row order
+        self.others = []    # dynamic agents that are not simple vehicles
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        n = len(getattr(self, 'vehicles', []))
+        arrays = {'state': (capacity, 6), 'derived': (capacity, 4), 'corners': (capacity, 8)}
+        for name, shape in arrays.items():
+            array = np.zeros(shape)
+            if n:
+                array[:n] = getattr(self, name)[:n]
+            setattr(self, name, array)
+        params = np.zeros((6, capacity))
+        if n:
+            params[:, :n] = self.params[:, :n]
+        self.params = params
+        for vehicle in self.vehicles:  # the point views hold the arrays they look at
+            vehicle._center.array = self.state
+            vehicle._velocity.array = self.derived
+            for corner in vehicle.obj.corners:
+                corner.array = self.corners
+
+    @property
+    def num_vehicles(self):
+        return len(self.vehicles)
+
+    def add(self, entity):
+        if entity.movable:
+            if is_simple_vehicle(entity):
+                self._add_vehicle(entity)
+            else:
+                self.others.append(entity)
+        super(SoAWorld, self).add(entity)
+
+    def _add_vehicle(self, entity):
+        row = len(self.vehicles)
+        if row == len(self.state):
+            self._allocate(2 * len(self.state))
+        self.state[row] = (entity.center.x, entity.center.y, entity.heading, 0., entity.inputSteering,
+                           entity.inputAcceleration)
+        self.derived[row] = (entity.velocity.x, entity.velocity.y, entity.acceleration, entity.angular_velocity)
+        self.params[:, row] = (entity.rear_dist, entity.friction, entity.min_speed, entity.max_speed,
+                               entity.size.x, entity.size.y)
+        for name in ('center', 'velocity', 'heading', 'inputSteering', 'inputAcceleration', 'acceleration',
+                     'angular_velocity', 'friction', 'min_speed', 'max_speed'):
+            del entity.__dict__[name]  # the class level views take over
+        entity.__class__ = view_class(type(entity))
+        entity._world, entity._row = self, row
+        entity._center = StatePoint(self.state, row, X, Y)
+        entity._velocity = StatePoint(self.derived, row, VX, VY)
+        entity.obj = Rectangle(*(StatePoint(self.corners, row, 2 * k, 2 * k + 1) for k in range(3)))
+        entity.obj.c4 = StatePoint(self.corners, row, 6, 7)
+        self.vehicles.append(entity)
+        self._update_corners(slice(row, row + 1))
+
+    def _update_corners(self, rows=slice(None)):
+        rows = slice(*rows.indices(len(self.vehicles)))
+        self.corners[rows] = rectangle_corners(self.state[rows], self.params[LENGTH, rows], self.params[WIDTH, rows])
+
+    def _detach(self, vehicle):
+        # back to a plain entity with its current state, e.g. when the world is reset or closed
+        state = {name: getattr(vehicle, name) for name in ('heading', 'inputSteering', 'inputAcceleration',
+                                                           'acceleration', 'angular_velocity', 'friction',
+                                                           'min_speed', 'max_speed')}
+        center, velocity = Point(vehicle.center.x, vehicle.center.y), Point(vehicle.velocity.x, vehicle.velocity.y)
+        vehicle.__class__ = type(vehicle).__bases__[1]
+        for name in ('_world', '_row', '_center', '_velocity', 'obj'):
+            del vehicle.__dict__[name]
+        vehicle.__dict__.update(state, center=center, velocity=velocity)
+        vehicle.buildGeometry()
+
+    def tick(self, dt: float = None):
+        dt = self.dt if dt is None else dt
+        n = len(self.vehicles)
+        if n:
+            state = self.state[:n]
+            # like Entity.tick, every step starts from the speed of the current velocity
+            state[:, SPEED] = np.hypot(self.derived[:n, VX], self.derived[:n, VY])
+            self.derived[:n] = bicycle_step(state, *self.params[:MAX_SPEED + 1, :n], dt)
+            self._update_corners()
+        for agent in self.others:
+            agent.tick(dt)
+        self.t += dt
+
+    def snapshot(self):
+        # the vehicle rows are copied as whole arrays, the other dynamic agents by state vector
+        n = len(self.vehicles)
+        others = np.array([agent.get_state() for agent in self.others], dtype=float)
+        return (self.t, tuple(self.vehicles), self.state[:n].copy(), self.derived[:n].copy(),
+                self.params[:, :n].copy(), tuple(self.others), others, tuple(self.dynamic_agents))
+
+    def restore(self, snapshot):
+        self.t, vehicles, state, derived, params, others, other_states, dynamic_agents = snapshot
+        n = len(vehicles)
+        if tuple(self.vehicles[:n]) != vehicles:
+            raise ValueError("The snapshot was taken of other vehicles (the world was reset since)")
+        for vehicle in self.vehicles[n:]:  # vehicles added after the snapshot
+            self._detach(vehicle)
+        self.vehicles = list(vehicles)
+        self.state[:n], self.derived[:n], self.params[:, :n] = state, derived, params
+        self._update_corners()
+        self.others = list(others)
+        for agent, agent_state in zip(others, other_states.tolist()):
+            agent.set_state(agent_state)
+        self.dynamic_agents = list(dynamic_agents)
+
+    def vehicle_corners(self):
+        """(N, 4, 2) corners of the vehicles, in row order"""
+        return self.corners[:len(self.vehicles)].reshape(-1, 4, 2)
+
+    def distances(self, agent):
+        """Distance (Entity.distanceTo) from a rectangle agent to every vehicle, inf for the agent itself"""
+        d = rectangle_distances(corner_array(agent)[None], self.vehicle_corners())
+        if getattr(agent, '_world', None) is self:
+            d[agent._row] = np.inf
+        return d
+
+    def vehicle_collision_pairs(self):
+        """
+        (K, 2) row pairs of colliding vehicles. Broad phase: sort and sweep along x over the bounding boxes,
+        narrow phase: vectorized separating axis test on the candidate pairs.
+        """
+        corners = self.vehicle_corners()
+        if len(corners) < 2:
+            return np.empty((0, 2), dtype=int)
+        lo, hi = corners.min(axis=1), corners.max(axis=1)
+        order = np.argsort(lo[:, 0], kind='stable')
+        # every box is paired with the later boxes (in xmin order) that start before it ends
+        ends = np.searchsorted(lo[order, 0], hi[order, 0], side='right')
+        counts = np.maximum(ends - np.arange(len(order)) - 1, 0)
+        first = np.repeat(np.arange(len(order)), counts)
+        second = first + 1 + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+        i, j = order[first], order[second]
+        candidates = (lo[i, 1] <= hi[j, 1]) & (lo[j, 1] <= hi[i, 1])
+        i, j = i[candidates], j[candidates]
+        hit = rectangles_overlap(corners[i], corners[j])
+        return np.stack([i[hit], j[hit]], axis=1)
+
+    def collision_exists(self, agent=None):
+        if self.others or (agent is not None and getattr(agent, '_world', None) is not self):
+            return super(SoAWorld, self).collision_exists(agent)  # mixed scenes use the scalar checks
+        if agent is not None:
+            if not agent.collidable:
+                return False
+            overlap = rectangles_overlap(corner_array(agent)[None], self.vehicle_corners())
+            overlap[agent._row] = False
+            collidable = np.array([vehicle.collidable for vehicle in self.vehicles], dtype=bool)
+            if (overlap & collidable).any():
+                return True
+            return self._static_collision(self.vehicle_corners()[agent._row:agent._row + 1], [agent])
+
+        collidable = np.array([vehicle.collidable for vehicle in self.vehicles], dtype=bool)
+        pairs = self.vehicle_collision_pairs()
+        if (collidable[pairs[:, 0]] & collidable[pairs[:, 1]]).any():
+            return True
+        return self._static_collision(self.vehicle_corners()[collidable],
+                                      [vehicle for vehicle in self.vehicles if vehicle.collidable])
+
+    def _static_collision(self, corners, vehicles):
+        # bounding box test against the collidable static agents, exact checks only on overlapping boxes
+        statics = self._static_collision_boxes()
+        if not statics or not vehicles:
+            return False
+        boxes = np.array([box for box, _, _ in statics])
+        lo, hi = corners.min(axis=1), corners.max(axis=1)
+        near = ((boxes[None, :, 0] <= hi[:, None, 0]) & (lo[:, None, 0] <= boxes[None, :, 2])
+                & (boxes[None, :, 1] <= hi[:, None, 1]) & (lo[:, None, 1] <= boxes[None, :, 3]))
+        return any(vehicles[v].collidesWith(statics[s][1]) for v, s in zip(*np.nonzero(near)))
+
+    def reset(self):
+        for vehicle in self.vehicles:
+            self._detach(vehicle)
+        super(SoAWorld, self).reset()
+        self.vehicles = []
+        self.others = []
+
+
+if __name__ == '__main__':
+    # Highway scale example: a few hundred cars on a multi lane road, World vs SoAWorld
+    import time
+    from agents import Car
+
+    def build(world_class, num_lanes=6, cars_per_lane=60):
+        w = world_class(0.1, width=3000, height=40, headless=True)
+        rng = np.random.default_rng(0)
+        for lane in range(num_lanes):
+            for k in range(cars_per_lane):
+                car = Car(Point(k * 30. + rng.uniform(0, 5), 5. + 3.5 * lane), 0.)
+                car.velocity = Point(rng.uniform(20, 30), 0)
+                car.set_control(0, rng.uniform(-1, 1))
+                w.add(car)
+        return w
+
+    for world_class in (World, SoAWorld):
+        w = build(world_class)
+        start = time.perf_counter()
+        for _ in range(100):
+            w.tick()
+            w.collision_exists()
+        print(f"{world_class.__name__}: {len(w.dynamic_agents)} cars, 100 steps with collision checks in "
+              f"{time.perf_counter() - start:.2f} s")
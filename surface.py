@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import pickle
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from matplotlib import cm
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# Model features, speeds in kph (the columns of the simulation result files)
+FEATURES = ['ego_start_x', 'ego_speed', 'target_start_x', 'target_speed', 'target_decel', 'target_decel_trigger']
+
+# Derived plot axes: name -> (feature, reference feature), value = feature - reference.
+# Setting a derived value moves the feature and keeps the reference, e.g. a larger initial distance moves the target.
+DERIVED = {
+    'initial_distance': ('target_start_x', 'ego_start_x'),
+    'relative_speed': ('ego_speed', 'target_speed'),
+}
+
+LABELS = {
+    'ego_start_x': 'Ego Start X', 'ego_speed': 'Ego Speed', 'target_start_x': 'Target Start X',
+    'target_speed': 'Target Speed', 'target_decel': 'Target Decel', 'target_decel_trigger': 'Target Decel Trigger',
+    'initial_distance': 'Initial Distance', 'relative_speed': 'Relative Speed',
+}
+
+cache_dir = 'CSV/surface_cache'
+chunk_size = 50000  # model queries per predict_proba call, bounds the memory of marginalized surfaces
+
+
+def model_fingerprint(model):
+    """Hash of the fitted model state, changes whenever the model is refit or updated"""
+    return hashlib.sha1(pickle.dumps(model)).hexdigest()[:16]
+
+
+class GPSurface:
+    """
+    Collision probability of a fitted classifier on a 2D slice of the scenario space.
+
+    The two plotted axes are features or DERIVED quantities. The other features are either fixed (to the
+    reference data mean, or to the values given in `fixed`) or, with marginalize=True, averaged over
+    `num_marginal` reference scenarios, so the surface shows the average collision probability instead of
+    the one of a single, possibly unrepresentative, slice.
+    """
+    def __init__(self, x_axis, y_axis, X_ref, resolution=100, bounds=None, fixed=None, marginalize=False,
+                 num_marginal=100, random_state=42):
+        X_ref = pd.DataFrame(X_ref, columns=FEATURES) if not isinstance(X_ref, pd.DataFrame) else X_ref[FEATURES]
+        self.x_axis, self.y_axis = x_axis, y_axis
+        self.resolution = resolution
+        self.marginalize = marginalize
+        # Axis ranges default to the reference data range with a margin of 1, like plot_gp_2D
+        bounds = bounds or {}
+        self.x = np.linspace(*bounds.get(x_axis, self._range(X_ref, x_axis)), resolution)
+        self.y = np.linspace(*bounds.get(y_axis, self._range(X_ref, y_axis)), resolution)
+
+        if marginalize:
+            rng = np.random.default_rng(random_state)
+            idx = rng.choice(len(X_ref), min(num_marginal, len(X_ref)), replace=False)
+            self.background = X_ref.to_numpy(dtype=float)[np.sort(idx)]
+        else:
+            background = X_ref.mean().to_dict()
+            background.update(fixed or {})
+            self.background = np.array([[background[name] for name in FEATURES]], dtype=float)
+
+    @staticmethod
+    def _range(X_ref, axis):
+        values = axis_values(X_ref, axis)
+        return values.min() - 1, values.max() + 1
+
+    def key(self, model):
+        """Cache key: model fingerprint plus the slice definition"""
+        spec = {'model': model_fingerprint(model), 'x_axis': self.x_axis, 'y_axis': self.y_axis,
+                'x': [self.x[0], self.x[-1]], 'y': [self.y[0], self.y[-1]], 'resolution': self.resolution,
+                'marginalize': self.marginalize, 'background': hashlib.sha1(self.background.tobytes()).hexdigest()}
+        return hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:20]
+
+    def queries(self, grid_rows):
+        """Model inputs for the given flat grid indices: every grid point combined with every background row"""
+        xx = np.repeat(self.x[grid_rows % self.resolution], len(self.background))
+        yy = np.repeat(self.y[grid_rows // self.resolution], len(self.background))
+        Q = np.tile(self.background, (len(grid_rows), 1))
+        set_axis(Q, self.x_axis, xx)
+        set_axis(Q, self.y_axis, yy)
+        return Q
+
+    def evaluate(self, model):
+        """Collision probability on the grid, shape (resolution, resolution), rows along the y axis"""
+        points = self.resolution ** 2
+        per_chunk = max(1, chunk_size // len(self.background))
+        Z = np.empty(points)
+        for start in range(0, points, per_chunk):
+            grid_rows = np.arange(start, min(start + per_chunk, points))
+            probs = model.predict_proba(pd.DataFrame(self.queries(grid_rows), columns=FEATURES))[:, 1]
+            Z[grid_rows] = probs.reshape(len(grid_rows), len(self.background)).mean(axis=1)
+        return Z.reshape(self.resolution, self.resolution)
+
+
+def axis_values(X, axis):
+    """Values of a feature or DERIVED axis for a feature DataFrame"""
+    if axis in DERIVED:
+        feature, reference = DERIVED[axis]
+        return (X[feature] - X[reference]).to_numpy(dtype=float)
+    return X[axis].to_numpy(dtype=float)
+
+
+def set_axis(Q, axis, values):
+    """Set a feature or DERIVED axis in a query array with FEATURES columns, in place"""
+    if axis in DERIVED:
+        feature, reference = DERIVED[axis]
+        Q[:, FEATURES.index(feature)] = Q[:, FEATURES.index(reference)] + values
+    else:
+        Q[:, FEATURES.index(axis)] = values
+
+
+class SurfaceCache:
+    """
+    Grid predictions keyed by model fingerprint and slice, kept in memory (the `max_items` most recent) and in
+    .npz files under `path`, so re-plotting an unchanged model is a file load instead of a model evaluation.
+    """
+    def __init__(self, path=cache_dir, max_items=32):
+        self.path = path
+        self.max_items = max_items
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _file(self, key):
+        return os.path.join(self.path, f"{key}.npz") if self.path else None
+
+    def get(self, surface, model):
+        """Grid predictions of a surface, evaluated only on a cache miss"""
+        key = surface.key(model)
+        if key in self.items:
+            self.items.move_to_end(key)
+            self.hits += 1
+            return self.items[key]
+        file = self._file(key)
+        if file and os.path.exists(file):
+            with np.load(file) as npz:
+                Z = npz['Z']
+            self.hits += 1
+        else:
+            Z = surface.evaluate(model)
+            self.misses += 1
+            if file:
+                os.makedirs(self.path, exist_ok=True)
+                np.savez_compressed(file + '.tmp.npz', Z=Z)
+                os.replace(file + '.tmp.npz', file)
+        self.items[key] = Z
+        if len(self.items) > self.max_items:
+            self.items.popitem(last=False)
+        return Z
+
+
+def render_surface(surface, Z, path, X_train=None):
+    """Draw a surface (and optionally the training points) to an image file, no display needed"""
+    fig = Figure(figsize=(10, 8))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    xx1, xx2 = np.meshgrid(surface.x, surface.y)
+    contour = ax.contourf(xx1, xx2, Z, levels=np.linspace(0, 1, 11), cmap=cm.RdYlBu)
+    fig.colorbar(contour, ax=ax, label='Mean Collision Probability' if surface.marginalize else 'Collision Probability')
+    if X_train is not None:
+        X_train = pd.DataFrame(X_train, columns=FEATURES) if not isinstance(X_train, pd.DataFrame) else X_train
+        ax.scatter(axis_values(X_train, surface.x_axis), axis_values(X_train, surface.y_axis),
+                   c='black', marker='x', label='Training Points')
+        ax.legend()
+    x_label, y_label = LABELS.get(surface.x_axis, surface.x_axis), LABELS.get(surface.y_axis, surface.y_axis)
+    ax.set_xlabel(x_label)
+    ax.set_ylabel(y_label)
+    ax.set_title(f'GP Model Predictions: {x_label} vs {y_label}')
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    fig.savefig(path)
+    return path
+
+
+def plot_surfaces(model, X_train, pairs, out_dir='plots', cache=None, **surface_options):
+    """Render one image per (x_axis, y_axis) pair to out_dir, grid predictions are reused through the cache"""
+    cache = SurfaceCache() if cache is None else cache
+    paths = []
+    for x_axis, y_axis in pairs:
+        surface = GPSurface(x_axis, y_axis, X_train, **surface_options)
+        suffix = '_marginal' if surface.marginalize else ''
+        path = os.path.join(out_dir, f"gp_{x_axis}_vs_{y_axis}{suffix}.png")
+        paths.append(render_surface(surface, cache.get(surface, model), path, X_train))
+    return paths
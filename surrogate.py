@@ -0,0 +1,165 @@
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve, solve_triangular
+from scipy.special import expit
+
+
+class RFFGPClassifier:
+    """
+    Approximate Gaussian process classifier for large, growing training sets.
+
+    The RBF kernel amplitude² * exp(-|x - x'|² / (2 length_scale²)) on standardized inputs is replaced by
+    n_features random Fourier features, which turns the GP classifier into a Bayesian logistic regression on
+    those features. Its Laplace posterior N(mean, precision⁻¹) costs O(n * n_features²) to fit instead of
+    the O(n³) of sklearn's GaussianProcessClassifier.
+
+    partial_fit updates the posterior with new labelled scenarios only (the previous posterior is the prior,
+    online Laplace), so retraining cost depends on the batch size, not the size of the training set.
+    fit(..., tune=True) picks the length scale and amplitude by Laplace evidence on a subsample, starting from
+    the current values (warm start), and refits the posterior on all data.
+
+    Drop-in for the parts of GaussianProcessClassifier the scripts use: fit, predict_proba, predict.
+    """
+    bound_rank = 64  # eigendirections used for the variance bound of predict_latent_bound
+
+    def __init__(self, n_features=512, length_scale=1.0, amplitude=3.0, max_iter=25, tol=1e-6,
+                 batch_size=10000, random_state=42):
+        self.n_features = n_features
+        self.length_scale = length_scale  # in units of the training data standard deviation
+        self.amplitude = amplitude        # prior standard deviation of the latent function
+        self.max_iter = max_iter
+        self.tol = tol
+        self.batch_size = batch_size      # rows per chunk for features and predictions
+        self.random_state = random_state
+        self.n_seen = 0
+
+    # --- features ---
+    def _init_features(self, X):
+        # Inputs are standardized once with the first training set, so later updates reuse the same features
+        self.x_mean_ = X.mean(axis=0)
+        self.x_std_ = np.where(X.std(axis=0) > 0, X.std(axis=0), 1.)
+        rng = np.random.default_rng(self.random_state)
+        self.omega_ = rng.standard_normal((X.shape[1], self.n_features))
+        self.phase_ = rng.uniform(0, 2 * np.pi, self.n_features)
+
+    def _features(self, X, length_scale=None, amplitude=None, dtype=np.float64):
+        length_scale = self.length_scale if length_scale is None else length_scale
+        amplitude = self.amplitude if amplitude is None else amplitude
+        Z = ((X - self.x_mean_) / self.x_std_).astype(dtype, copy=False)
+        # float32 features are several times faster (cos dominates) and good enough for screening
+        angles = Z @ (self.omega_ / length_scale).astype(dtype) + self.phase_.astype(dtype)
+        return amplitude * np.sqrt(2. / self.n_features) * np.cos(angles)
+
+    # --- Laplace posterior ---
+    def _laplace(self, Phi, y, prior_mean, prior_precision):
+        """Newton iterations for the MAP weights under a Gaussian prior, returns mean, precision and log likelihood"""
+        w = prior_mean.copy()
+        for _ in range(self.max_iter):
+            p = expit(Phi @ w)
+            grad = Phi.T @ (y - p) - prior_precision @ (w - prior_mean)
+            precision = prior_precision + (Phi.T * (p * (1 - p))) @ Phi
+            step = cho_solve(cho_factor(precision), grad)
+            w += step
+            if np.max(np.abs(step)) < self.tol:
+                break
+        f = Phi @ w
+        p = expit(f)
+        precision = prior_precision + (Phi.T * (p * (1 - p))) @ Phi
+        log_likelihood = np.sum(y * f - np.logaddexp(0, f))
+        return w, precision, log_likelihood
+
+    def _set_posterior(self, mean, precision):
+        self.mean_ = mean
+        self.precision_ = precision
+        # var = |L⁻¹ phi|² with precision = L L', with L⁻¹ precomputed a chunk of variances is one matrix product
+        self.chol_inv_ = solve_triangular(np.linalg.cholesky(precision), np.eye(len(precision)), lower=True)
+        # Upper bound of the variance from the bound_rank most constrained eigendirections of the precision:
+        # var = sum c_i² / l_i <= |phi|² / l_min - sum_top (c_i²) (1 / l_min - 1 / l_i), with c = U' phi
+        eigenvalues, eigenvectors = np.linalg.eigh(precision)
+        self.bound_scale_ = 1. / eigenvalues[0]
+        self.bound_basis_ = eigenvectors[:, -self.bound_rank:]
+        self.bound_weights_ = 1. / eigenvalues[0] - 1. / eigenvalues[-self.bound_rank:]
+
+    def log_evidence(self, X, y, length_scale, amplitude):
+        """Laplace approximation of the log marginal likelihood for one hyperparameter setting"""
+        Phi = self._features(X, length_scale, amplitude)
+        eye = np.eye(self.n_features)
+        w, precision, log_likelihood = self._laplace(Phi, y, np.zeros(self.n_features), eye)
+        _, logdet = np.linalg.slogdet(precision)
+        return log_likelihood - 0.5 * w @ w - 0.5 * logdet
+
+    def tune(self, X, y, factors=(0.7, 1.0, 1.4), max_samples=2000):
+        """Pick length_scale and amplitude by Laplace evidence on a grid around the current values"""
+        X, y = np.asarray(X, dtype=float), np.asarray(y, dtype=float)
+        if len(y) > max_samples:
+            idx = np.random.default_rng(self.random_state).choice(len(y), max_samples, replace=False)
+            X, y = X[idx], y[idx]
+        candidates = [(self.length_scale * a, self.amplitude * b) for a in factors for b in factors]
+        scores = [self.log_evidence(X, y, length_scale, amplitude) for length_scale, amplitude in candidates]
+        self.length_scale, self.amplitude = candidates[int(np.argmax(scores))]
+        return self.length_scale, self.amplitude
+
+    # --- public interface ---
+    def fit(self, X, y, tune=False):
+        """Fit the posterior on all data (features are redrawn and inputs restandardized)"""
+        X, y = np.asarray(X, dtype=float), np.asarray(y, dtype=float)
+        self._init_features(X)
+        if tune:
+            self.tune(X, y)
+        self.n_seen = 0
+        self._set_posterior(np.zeros(self.n_features), np.eye(self.n_features))
+        return self.partial_fit(X, y)
+
+    def partial_fit(self, X, y):
+        """Update the posterior with new labelled scenarios (hyperparameters stay fixed)"""
+        X, y = np.asarray(X, dtype=float), np.asarray(y, dtype=float)
+        if not hasattr(self, 'omega_'):
+            return self.fit(X, y)
+        mean, precision = self.mean_, self.precision_
+        for start in range(0, len(y), self.batch_size):
+            Phi = self._features(X[start:start + self.batch_size])
+            mean, precision, _ = self._laplace(Phi, y[start:start + self.batch_size], mean, precision)
+        self._set_posterior(mean, precision)
+        self.n_seen += len(y)
+        return self
+
+    def predict_latent(self, X):
+        """Posterior mean and variance of the latent function, computed in chunks of batch_size rows"""
+        X = np.asarray(X, dtype=float)
+        mean = np.empty(len(X))
+        var = np.empty(len(X))
+        for start in range(0, len(X), self.batch_size):
+            Phi = self._features(X[start:start + self.batch_size])
+            v = Phi @ self.chol_inv_.T
+            mean[start:start + len(Phi)] = Phi @ self.mean_
+            var[start:start + len(Phi)] = np.sum(v * v, axis=1)
+        return mean, var
+
+    def predict_latent_bound(self, X):
+        """
+        Cheap bounds for screening large candidate pools: a lower bound of |mean| (with the sign of the mean) and
+        an upper bound of the variance of the latent function, from float32 features and the low rank variance
+        bound. Several times faster than predict_latent, used by acquisition.py to skip hopeless candidates.
+        """
+        X = np.asarray(X, dtype=float)
+        mean = np.empty(len(X))
+        var = np.empty(len(X))
+        mean_weights = self.mean_.astype(np.float32)
+        basis = self.bound_basis_.astype(np.float32)
+        for start in range(0, len(X), self.batch_size):
+            Phi = self._features(X[start:start + self.batch_size], dtype=np.float32)
+            m = Phi @ mean_weights
+            C = Phi @ basis
+            # Margins cover the float32 rounding, so the bounds hold for the exact values
+            mean[start:start + len(Phi)] = np.sign(m) * np.maximum(np.abs(m) - 1e-4 * (1 + np.abs(m)), 0)
+            var[start:start + len(Phi)] = (np.sum(Phi * Phi, axis=1) * self.bound_scale_
+                                           - (C * C) @ self.bound_weights_) * 1.001 + 1e-6
+        return mean, var
+
+    def predict_proba(self, X):
+        """Class probabilities [P(no collision), P(collision)], latent uncertainty integrated with the probit approximation"""
+        mean, var = self.predict_latent(X)
+        p = expit(mean / np.sqrt(1 + np.pi * var / 8))
+        return np.column_stack([1 - p, p])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] > 0.5).astype(int)
@@ -0,0 +1,138 @@
+import importlib
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm # for progress bar
+from result_cache import config_key
+
+# Simulation function loaded once per worker process by _init_worker
+_sim_function = None
+
+
+def configs_from_samples(df_samples):
+    """Convert LHS sample rows (speeds in kph) to run_aeb_simulation config dictionaries (speeds in m/s)"""
+    configs = []
+    for row in df_samples.itertuples(index=False):
+        configs.append({
+            'ego_start_x': row.ego_start_x,
+            'ego_speed': row.ego_start_speed / 3.6,  # Convert from kph to m/s
+            'target_start_x': row.target_start_x,
+            'target_speed': row.target_start_speed / 3.6,  # Convert from kph to m/s
+            'target_decel': row.target_decel,
+            'target_decel_trigger': row.target_decel_trigger
+        })
+    return configs
+
+
+def to_kph(value):
+    """Combined_SIM_LOOP reports speeds as '12.3 kph' strings, AEB_SIM_LOOP as plain numbers"""
+    if isinstance(value, str):
+        value = value.replace('kph', '')
+    return float(value)
+
+
+def _init_worker(sim_module, sim_function):
+    # Import the simulation module (numpy, world, controllers, ...) once per worker instead of once per work unit
+    global _sim_function
+    module = importlib.import_module(sim_module)
+    _sim_function = getattr(module, sim_function)
+
+
+def _run_chunk(start, configs, sim_kwargs):
+    results = []
+    for config in configs:
+        try:
+            results.append(_sim_function(config, **sim_kwargs))
+        except Exception as e:
+            # A crashing scenario must not take the rest of the chunk down with it
+            results.append({'error': f"{type(e).__name__}: {e}"})
+    return start, results
+
+
+def _store(results, start, chunk_results, on_result, indices=None, cache=None, keys=None):
+    # indices maps chunk positions back to the input configs when cached configs were left out of the chunks
+    positions = range(start, start + len(chunk_results))
+    if indices is not None:
+        positions = indices[start:start + len(chunk_results)]
+    for position, result in zip(positions, chunk_results):
+        results[position] = result
+        if on_result is not None:
+            on_result(position, result)
+    if cache is not None:
+        cache.put_many([(keys[position], result) for position, result in zip(positions, chunk_results)
+                        if 'error' not in result])
+
+
+def run_sweep(configs, sim_module='Combined_SIM_LOOP', sim_function='run_aeb_simulation', sim_kwargs=None,
+              workers=None, chunk_size=None, desc="Running simulations", on_result=None, cache=None):
+    """
+    Run a simulation function over many scenario configs on a process pool.
+
+    Configs are split into chunks of consecutive scenarios, every worker imports the simulation module once
+    at start-up, and results are reassembled in the order of the input configs. A scenario that raises (or a
+    chunk whose worker dies) gets {'error': message} in place of its result dictionary.
+
+    Args:
+        configs: iterable of config dictionaries
+        sim_module: name of the module that holds the simulation function
+        sim_function: name of the simulation function, called as sim_function(config, **sim_kwargs)
+        sim_kwargs: extra keyword arguments for the simulation function
+        workers: number of worker processes (default: os.cpu_count()), 1 runs in the current process
+        chunk_size: number of scenarios per work unit (default: ~4 chunks per worker)
+        desc: progress bar description
+        on_result: optional callback on_result(index, result), called as soon as each result arrives
+            (e.g. to stream results to a result_sink.ResultSink)
+        cache: optional result_cache.ResultCache, cached scenarios are not simulated again and new results
+            (except errors) are added to it
+
+    Returns:
+        list of result dictionaries, one per config
+    """
+    configs = list(configs)
+    sim_kwargs = sim_kwargs or {}
+    workers = workers or os.cpu_count() or 1
+    results = [None] * len(configs)
+
+    indices = keys = None
+    if cache is not None:
+        namespace = cache.namespace(sim_module, sim_function, sim_kwargs)
+        keys = [config_key(config, namespace) for config in configs]
+        cached = cache.get_many(keys)
+        indices = [i for i, key in enumerate(keys) if key not in cached]
+        for i, key in enumerate(keys):
+            if key in cached:
+                results[i] = cached[key]
+                if on_result is not None:
+                    on_result(i, cached[key])
+        todo = [configs[i] for i in indices]
+    else:
+        todo = configs
+
+    if chunk_size is None:
+        chunk_size = max(1, -(-len(todo) // (workers * 4)))
+    chunks = [(start, todo[start:start + chunk_size]) for start in range(0, len(todo), chunk_size)]
+    if not chunks:
+        return results
+
+    with tqdm(total=len(todo), desc=desc) as progress:
+        if workers == 1:
+            _init_worker(sim_module, sim_function)
+            for start, chunk in chunks:
+                _, chunk_results = _run_chunk(start, chunk, sim_kwargs)
+                _store(results, start, chunk_results, on_result, indices, cache, keys)
+                progress.update(len(chunk_results))
+            return results
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(sim_module, sim_function)) as pool:
+            futures = {pool.submit(_run_chunk, start, chunk, sim_kwargs): (start, chunk) for start, chunk in chunks}
+            for future in as_completed(futures):
+                start, chunk = futures[future]
+                try:
+                    _, chunk_results = future.result()
+                except Exception as e:
+                    # The worker process died (e.g. BrokenProcessPool), mark the whole chunk as failed
+                    chunk_results = [{'error': f"{type(e).__name__}: {e}"}] * len(chunk)
+                _store(results, start, chunk_results, on_result, indices, cache, keys)
+                progress.update(len(chunk_results))
+
+    return results
@@ -0,0 +1,116 @@
+import numpy as np
+import math
+from AEB_algo import FCW_TTC, SYSTEM_LATENCY
+from ACC_algo import MIN_FOLLOWING_DISTANCE, DETECTION_RANGE
+
+# Reasons returned by TerminationCriteria.check
+NOT_SETTLED = 0
+EGO_STOPPED = 1      # the ego stopped behind the target and can never move again
+TARGET_OPENING = 2   # the target is at least as fast as the ego can ever get, so the gap never shrinks again
+REASONS = {NOT_SETTLED: None, EGO_STOPPED: 'ego_stopped', TARGET_OPENING: 'target_opening'}
+
+
+class TerminationCriteria:
+    """
+    Ends a longitudinal ACC/AEB run once its outcome is provably settled: from this state on the gap can
+    never shrink, so no collision (and no further AEB activation) can happen.
+
+    The criteria rely on the target never accelerating (its input is 0 or the target_decel) and speeds never
+    going negative, which holds for the target_decel_trigger scenarios of Combined_SIM_LOOP and AEB_SIM_LOOP.
+    Note that speed_reduction of a terminated run is measured at termination time.
+    """
+    def __init__(self, cruise_speed=None, system_latency=SYSTEM_LATENCY, min_following_distance=MIN_FOLLOWING_DISTANCE,
+                 detection_range=DETECTION_RANGE):
+        # cruise_speed: ACC cruise speed in m/s, None for AEB only loops where the ego can never accelerate
+        self.cruise_speed = cruise_speed
+        # controller calibration (AEBParams / ACCParams entries, single values or per-scenario arrays)
+        self.system_latency = system_latency
+        self.min_following_distance = min_following_distance
+        self.detection_range = detection_range
+
+    def ego_speed_bound(self, distance, ego_speed, ego_accel):
+        """Upper bound on any future ego speed (vectorized)"""
+        if self.cruise_speed is None:
+            return ego_speed
+        # Outside the detection range the ACC cruises, which approaches the cruise speed without overshoot;
+        # a positive input may still be held for up to the system latency before the next command is applied.
+        # Inside the range the following controller can push the ego past any speed, so there is no bound.
+        cruise_bound = np.maximum(ego_speed + np.maximum(ego_accel, 0) * self.system_latency, self.cruise_speed)
+        return np.where(distance >= self.detection_range, cruise_bound, np.inf)
+
+    def settled(self, distance, ego_speed, target_speed, ego_accel, target_accel, target_ahead=True):
+        """Vectorized check, returns NOT_SETTLED, EGO_STOPPED or TARGET_OPENING per scenario"""
+        distance, ego_speed, target_speed, ego_accel, target_accel = np.broadcast_arrays(
+            *[np.asarray(v, dtype=float) for v in (distance, ego_speed, target_speed, ego_accel, target_accel)])
+        # the criteria assume the ego drives behind the target; anything else is never settled early
+        target_ahead = np.asarray(target_ahead, dtype=bool)
+
+        if self.cruise_speed is None:
+            # AEB only: the ego never accelerates, so a stopped ego stays stopped
+            ego_stopped = ego_speed <= 0
+        else:
+            # ACC: a stopped ego only stays put behind a stopped target when the follow command is not positive
+            ego_stopped = ((ego_speed <= 0) & (ego_accel <= 0) & (target_speed <= 0) &
+                           (distance <= self.min_following_distance))
+
+        # A target that is not braking and at least as fast as the ego can ever be keeps the gap open
+        opening = (target_accel >= 0) & (target_speed >= self.ego_speed_bound(distance, ego_speed, ego_accel))
+
+        return np.where(target_ahead & ego_stopped, EGO_STOPPED,
+                        np.where(target_ahead & opening, TARGET_OPENING, NOT_SETTLED))
+
+    def check(self, distance, ego_speed, target_speed, ego_accel, target_accel, target_ahead=True):
+        """Scalar check on plain floats (same criteria as settled), returns the termination reason or None"""
+        if not target_ahead:
+            return None
+        if self.cruise_speed is None:
+            if ego_speed <= 0:
+                return REASONS[EGO_STOPPED]
+            ego_speed_bound = ego_speed
+        else:
+            if ego_speed <= 0 and ego_accel <= 0 and target_speed <= 0 and distance <= self.min_following_distance:
+                return REASONS[EGO_STOPPED]
+            if distance < self.detection_range:
+                return None
+            ego_speed_bound = max(ego_speed + max(ego_accel, 0) * self.system_latency, self.cruise_speed)
+        if target_accel >= 0 and target_speed >= ego_speed_bound:
+            return REASONS[TARGET_OPENING]
+        return None
+
+
+def time_to_close(gap, relative_speed, relative_accel=0.):
+    """Time until the gap closes by `gap` meters at constant relative acceleration (inf if it never does)"""
+    if gap <= 0:
+        return 0.
+    if relative_accel > 0:
+        return (-relative_speed + math.sqrt(relative_speed ** 2 + 2 * relative_accel * gap)) / relative_accel
+    if relative_speed > 0:
+        return gap / relative_speed  # ignores a negative relative acceleration, so this never overestimates
+    return math.inf
+
+
+def adaptive_steps(distance, relative_speed, relative_accel=0., trigger_distance=None, latency_pending=False,
+                   acc_following=False, max_steps=10, dt=0.1, safety=0.5, fcw_ttc=FCW_TTC,
+                   detection_range=DETECTION_RANGE):
+    """
+    Number of base time steps to take at once in adaptive-dt mode.
+
+    Takes large steps while nothing can happen soon and refines to single steps near the FCW threshold fcw_ttc
+    (and therefore the brake thresholds and contact), near the target decel trigger and the ACC detection_range,
+    and while a command waits out the system latency or the ACC follows the target (its command changes every
+    step). fcw_ttc and detection_range come from the controller params (AEBParams, ACCParams).
+    A step is at most `safety` times the time left until the nearest of these events, assuming constant
+    relative speed and acceleration.
+    """
+    if latency_pending or acc_following:
+        return 1
+
+    time_to_event = time_to_close(distance, relative_speed, relative_accel) - fcw_ttc
+    if trigger_distance is not None and distance > trigger_distance:
+        time_to_event = min(time_to_event, time_to_close(distance - trigger_distance, relative_speed, relative_accel))
+    if distance >= detection_range:
+        time_to_event = min(time_to_event, time_to_close(distance - detection_range, relative_speed, relative_accel))
+
+    if time_to_event <= 0:
+        return 1
+    return int(min(max(safety * time_to_event / dt, 1), max_steps))
@@ -0,0 +1,70 @@
+import numpy as np
+
+# Channels recorded by the sim loops, in the argument order of plots.create_aeb_plots
+# time (s), distance (m), speed (ego, mph), ttc (s, capped at 10), required_decel and applied_decel (m/s²), target_speed (kph)
+DEFAULT_CHANNELS = ('time', 'distance', 'speed', 'ttc', 'required_decel', 'applied_decel', 'target_speed')
+
+
+class TrajectoryRecorder:
+    """
+    Records per-step simulation signals into a preallocated NumPy structured array.
+
+    Only the configured channels are stored and only every `decimation`-th recorded step is kept. A disabled
+    recorder (enabled=False) stores nothing, the sim loops check `enabled` before computing the values at all.
+    The buffer grows by doubling if a run records more steps than `num_steps`.
+    """
+    def __init__(self, num_steps, channels=DEFAULT_CHANNELS, decimation=1, enabled=True, dtype=np.float64):
+        self.channels = tuple(channels)
+        self.decimation = decimation
+        self.enabled = enabled
+        self.data = np.zeros(-(-num_steps // decimation) if enabled else 0,
+                             dtype=[(name, dtype) for name in self.channels])
+        self.size = 0
+        self.steps = 0  # number of record() calls, including the decimated ones
+
+    def record(self, **values):
+        """Record one step; values are given per channel name, names that are not recorded are ignored"""
+        if not self.enabled:
+            return
+        step = self.steps
+        self.steps += 1
+        if step % self.decimation:
+            return
+        if self.size == len(self.data):
+            self.data = np.resize(self.data, max(2 * len(self.data), 16))
+        self.data[self.size] = tuple(values[name] for name in self.channels)
+        self.size += 1
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, channel):
+        """Recorded values of one channel"""
+        return self.data[channel][:self.size]
+
+    @property
+    def trace(self):
+        """Structured array of the recorded steps"""
+        return self.data[:self.size]
+
+    def as_lists(self):
+        """Channels as '<channel>_data' lists, the format of the plot_data the sim loops used to return"""
+        return {f"{name}_data": self[name].tolist() for name in self.channels}
+
+    def save(self, path):
+        """Save the recorded channels to a compressed .npz file"""
+        np.savez_compressed(path, decimation=self.decimation, **{name: self[name] for name in self.channels})
+
+    @classmethod
+    def load(cls, path):
+        """Load a recorder saved with save()"""
+        with np.load(path) as npz:
+            channels = [name for name in npz.files if name != 'decimation']
+            size = len(npz[channels[0]]) if channels else 0
+            decimation = int(npz['decimation'])
+            recorder = cls(max(size, 1) * decimation, channels=channels, decimation=decimation)
+            for name in channels:
+                recorder.data[name][:size] = npz[name]
+        recorder.size = size
+        recorder.steps = size * decimation
+        return recorder
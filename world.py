@@ -1,12 +1,13 @@
 from agents import Car, Pedestrian, RectangleBuilding
 from entities import Entity
+import kinematics
 from typing import Union
-from visualizer import Visualizer
-from graphics import Text, Point
+import heapq
 import os
+import numpy as np
 
 class World:
-    def __init__(self, dt: float, width: float = 100, height: float = 100, ppm: int = 8):
+    def __init__(self, dt: float, width: float = 100, height: float = 100, ppm: int = 8, headless: bool = False):
         self.dynamic_agents = []
         self.static_agents = []
         self.t = 0 # simulation time
@@ -14,25 +15,41 @@ class World:
         self.width = width # store width
         self.height = height # store height
         self.ppm = ppm # store ppm
+        self.headless = headless # no visualizer, render() and draw_text() do nothing
+        self._static_boxes = None # sorted bounding boxes of the collidable static agents, see _static_collision_boxes
         
-        # Get the name of the running script
-        current_file = os.path.basename(__file__)
-        
-        # Initialize visualizer with file name as window title
-        self.visualizer = Visualizer(width, height, ppm, window_title=current_file)
+        if headless:
+            self.visualizer = None
+        else:
+            # visualizer imports graphics, which imports tkinter and creates a Tk root, so only import it when rendering
+            from visualizer import Visualizer
+            
+            # Get the name of the running script
+            current_file = os.path.basename(__file__)
+            
+            # Initialize visualizer with file name as window title
+            self.visualizer = Visualizer(width, height, ppm, window_title=current_file)
         
     def add(self, entity: Entity):
         if entity.movable:
             self.dynamic_agents.append(entity)
         else:
             self.static_agents.append(entity)
+            self._static_boxes = None # rebuilt on the next collision check
         
-    def tick(self):
-        for agent in self.dynamic_agents:
-            agent.tick(self.dt)
-        self.t += self.dt
+    def tick(self, dt: float = None): # dt overrides the world time step for this tick only
+        dt = self.dt if dt is None else dt
+        agents = self.dynamic_agents
+        # many simple vehicles are stepped together by the array kernel, anything else agent by agent
+        if len(agents) >= kinematics.array_tick_min_agents and all(map(kinematics.is_simple_vehicle, agents)):
+            kinematics.tick_agents(agents, dt)
+        else:
+            for agent in agents:
+                agent.tick(dt)
+        self.t += dt
     
     def render(self):
+        if self.headless: return
         self.visualizer.create_window(bg_color = 'gray')
         self.visualizer.update_agents(self.agents)
         
@@ -40,38 +57,78 @@ class World:
     def agents(self):
         return self.static_agents + self.dynamic_agents
         
+    def _static_collision_boxes(self):
+        # static agents don't move, so their bounding boxes are computed once (sorted by xmin).
+        # Non-collidable statics (e.g. Painting road markings) are excluded up front.
+        if self._static_boxes is None:
+            boxes = [(a.obj.aabb, a, False) for a in self.static_agents if a.collidable]
+            boxes.sort(key=lambda b: b[0][0])
+            self._static_boxes = boxes
+        return self._static_boxes
+        
+    def candidate_pairs(self):
+        # Broad phase: sweep and prune along x over the bounding boxes of the collidable agents.
+        # Yields the pairs whose bounding boxes overlap; static-static pairs are never reported.
+        dynamic_boxes = [(a.obj.aabb, a, True) for a in self.dynamic_agents if a.collidable]
+        if not dynamic_boxes: return
+        dynamic_boxes.sort(key=lambda b: b[0][0])
+        
+        active = []
+        for box, agent, movable in heapq.merge(dynamic_boxes, self._static_collision_boxes(), key=lambda b: b[0][0]):
+            xmin, ymin, xmax, ymax = box
+            active = [b for b in active if b[0][2] >= xmin] # drop the boxes that end before this one starts
+            for other_box, other, other_movable in active:
+                if (movable or other_movable) and other_box[1] <= ymax and ymin <= other_box[3]:
+                    yield agent, other
+            active.append((box, agent, movable))
+        
     def collision_exists(self, agent = None):
         if agent is None:
-            for i in range(len(self.dynamic_agents)):
-                for j in range(i+1, len(self.dynamic_agents)):
-                    if self.dynamic_agents[i].collidable and self.dynamic_agents[j].collidable:
-                        if self.dynamic_agents[i].collidesWith(self.dynamic_agents[j]):
-                            return True
-                for j in range(len(self.static_agents)):
-                    if self.dynamic_agents[i].collidable and self.static_agents[j].collidable:
-                        if self.dynamic_agents[i].collidesWith(self.static_agents[j]):
-                            return True
+            for a, b in self.candidate_pairs():
+                if a.collidesWith(b):
+                    return True
             return False
             
         if not agent.collidable: return False
         
-        for i in range(len(self.agents)):
-            if self.agents[i] is not agent and self.agents[i].collidable and agent.collidesWith(self.agents[i]):
+        xmin, ymin, xmax, ymax = agent.obj.aabb
+        others = [other for other in self.dynamic_agents if other.collidable] + [b[1] for b in self._static_collision_boxes()]
+        for other in others:
+            if other is agent: continue
+            oxmin, oymin, oxmax, oymax = other.obj.aabb
+            if oxmin <= xmax and xmin <= oxmax and oymin <= ymax and ymin <= oymax and agent.collidesWith(other):
                 return True
         return False
     
     def close(self):
         self.reset()
         self.static_agents = []
-        if self.visualizer.window_created:
+        self._static_boxes = None
+        if not self.headless and self.visualizer.window_created:
             self.visualizer.close()
         
     def reset(self):
         self.dynamic_agents = []
         self.t = 0
     
+    def snapshot(self):
+        # compact copy of the dynamic state: the time, the dynamic agents and one state vector per agent
+        # (entities.STATE_FIELDS). Static agents never change, so they are not part of it
+        states = np.array([agent.get_state() for agent in self.dynamic_agents], dtype=float)
+        return (self.t, tuple(self.dynamic_agents), states)
+        
+    def restore(self, snapshot):
+        # back to the state of a snapshot, e.g. to run several branches from a shared prefix
+        self.t, agents, states = snapshot
+        self.dynamic_agents = list(agents)
+        for agent, state in zip(agents, states.tolist()):
+            agent.set_state(state)
+    
     def draw_text(self, text: str, position: tuple, size: int = 10, anchor: str = 'center'):
+        if self.headless: return
         if self.visualizer.window_created:
+            from graphics import Text, Point
+            
             # Create text object at the specified position
             text_obj = Text(Point(position[0], position[1]), text)
             text_obj.setSize(size)  # Set font size